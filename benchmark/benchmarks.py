@@ -0,0 +1,182 @@
+'''The QUASR benchmarks: each times one stage of the pipeline over the synthetic
+datasets of datasets.py in a fresh process, giving its throughput in reads or
+pileup positions per second and its peak memory, and compares them against a
+stored baseline.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib, json, multiprocessing, os, platform, sys
+import datasets
+from metrics import Metrics, peak_rss
+
+DatasetVersion = 1 # increase when the generators change, so old datasets are remade
+
+def generate_datasets(outdir, reads=20000, pileup_length=20000, depth=200, seed=1):
+	'''Writes the benchmark datasets to outdir, unless those of the same settings are
+	already there. Returns the dataset description: its settings and the number of
+	reads or positions in each dataset.'''
+	settings = {	'version': DatasetVersion, 'reads': reads, 'pileup_length': pileup_length,
+					'depth': depth, 'seed': seed }
+	description_file = os.path.join(outdir, 'datasets.json')
+	if os.path.exists(description_file):
+		with open(description_file, 'r') as infh:
+			description = json.load(infh)
+		if description['settings'] == settings:
+			print('[INFO]: Using the datasets already in "%s"' % outdir)
+			return description
+
+	def path(name):
+		return os.path.join(outdir, name)
+
+	print('[INFO]: Generating datasets in "%s"' % outdir)
+	segments = [('segment1', pileup_length // 2), ('segment2', pileup_length - pileup_length // 2)]
+	description = {	'settings': settings,
+					'single_reads': datasets.write_fastq(path('single.fq'), reads, seed=seed),
+					'paired_reads': 2 * datasets.write_fastq(path('paired.f.fq'), reads // 2, seed=seed + 1, mate_file=path('paired.r.fq')),
+					'sff_reads': datasets.write_sff(path('reads.sff'), reads // 4, seed=seed + 2),
+					'pileup_positions': datasets.write_pileup(path('pileup'), segments, depth, seed=seed + 3) }
+	with open(path('primers.txt'), 'w') as outfh:
+		outfh.write('\t'.join(datasets.Primers) + '\n')
+	with open(description_file, 'w') as outfh:
+		json.dump(description, outfh, indent=1)
+	return description
+
+def fastq_iterator_benchmark(datadir, outdir, description):
+	from fastq import fastq_iterator
+	with open(os.path.join(datadir, 'single.fq'), 'r') as infh:
+		return sum([1 for record in fastq_iterator(infh)])
+
+def qc_single_benchmark(datadir, outdir, description):
+	import qc
+	stats = qc.main(os.path.join(datadir, 'single.fq'), os.path.join(outdir, 'single.qc.fq'), ascii_offset=33, median_cutoff=20, length_cutoff=50)
+	return stats['total']
+
+def qc_paired_benchmark(datadir, outdir, description):
+	import qc
+	stats = qc.main(os.path.join(datadir, 'paired.f.fq'), os.path.join(outdir, 'paired.qc.f.fq'), os.path.join(datadir, 'paired.r.fq'), os.path.join(outdir, 'paired.qc.r.fq'), True, 33, 20, 50)
+	return 2 * stats['total']
+
+def sff_to_fastq_benchmark(datadir, outdir, description):
+	import sff_to_fastq
+	sff_to_fastq.main(os.path.join(datadir, 'reads.sff'), os.path.join(outdir, 'reads.fq'))
+	return description['sff_reads']
+
+def readset_pipeline_benchmark(datadir, outdir, description):
+	# The readset_parser.py pipeline: SFF to FASTQ, split by MID sequence and remove primers
+	import fastq_primer_remover, split_mids_by_sequence
+	from readset_pipeline import FastqSink, read_records, primer_stage, run_pipeline, sequence_mid_stage
+	with open(os.path.join(datadir, 'primers.txt'), 'r') as primerfh:
+		primers = fastq_primer_remover.parse_primerfile_to_regex(primerfh)
+	mid_list = [1, 2, 3, 4]
+	stages = [	sequence_mid_stage(mid_list, split_mids_by_sequence.RapidLibraryTags, {}),
+				primer_stage(primers, {}) ]
+	run_pipeline(read_records(os.path.join(datadir, 'reads.sff')), stages, lambda mid: [FastqSink(os.path.join(outdir, 'reads.MID%d.fq' % mid))])
+	return description['sff_reads']
+
+def count_read_bases_benchmark(datadir, outdir, description):
+	from pileup import PileupFile
+	with open(os.path.join(datadir, 'pileup.pileup'), 'r') as infh, open(os.path.join(datadir, 'pileup.fasta'), 'r') as ref_fh:
+		PileupFile(infh, ref_fh).count_read_bases()
+	return description['pileup_positions']
+
+def consensus_benchmark(datadir, outdir, description):
+	from pileup import PileupFile
+	from consensus import call_consensus, write_consensus
+	with open(os.path.join(datadir, 'pileup.pileup'), 'r') as infh, open(os.path.join(datadir, 'pileup.fasta'), 'r') as ref_fh:
+		pileup = PileupFile(infh, ref_fh)
+	consensus = call_consensus(pileup.count_read_bases(), pileup.return_pileup_depths())
+	with open(os.path.join(outdir, 'consensus.fasta'), 'w') as outfh:
+		write_consensus(outfh, consensus, pileup.return_segment_ranges())
+	return description['pileup_positions']
+
+def minority_benchmark(datadir, outdir, description):
+	from pileup import pileup_iterator
+	from minority import call_minorities, count_positions, write_minorities
+	with open(os.path.join(datadir, 'pileup.pileup'), 'r') as infh, open(os.path.join(datadir, 'pileup.fasta'), 'r') as ref_fh, open(os.path.join(outdir, 'minorities.txt'), 'w') as outfh:
+		write_minorities(outfh, call_minorities(count_positions(pileup_iterator(infh, ref_fh))))
+	return description['pileup_positions']
+
+# Name, function and the unit of its throughput, in the order they are run
+Benchmarks = (	('fastq_iterator', fastq_iterator_benchmark, 'reads'),
+				('qc_single', qc_single_benchmark, 'reads'),
+				('qc_paired', qc_paired_benchmark, 'reads'),
+				('sff_to_fastq', sff_to_fastq_benchmark, 'reads'),
+				('readset_pipeline', readset_pipeline_benchmark, 'reads'),
+				('count_read_bases', count_read_bases_benchmark, 'positions'),
+				('consensus', consensus_benchmark, 'positions'),
+				('minority_list', minority_benchmark, 'positions') )
+BenchmarkNames = [name for name, function, unit in Benchmarks]
+
+def _run_once(name, datadir, outdir, description):
+	# Runs in a worker process of its own, so peak memory is that of this benchmark alone
+	function, unit = [(f, u) for n, f, u in Benchmarks if n == name][0]
+	metrics = Metrics(program=name)
+	start_rss = peak_rss()
+	with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+		with metrics.stage(name) as stage:
+			records = function(datadir, outdir, description)
+	stage.count(records_in=records)
+	result = stage.as_dict()
+	result['unit'] = unit
+	result['rss_growth_kb'] = result['peak_rss_kb'] - start_rss if start_rss is not None else None
+	return result
+
+def run_benchmark(name, datadir, outdir, description, repeats=3):
+	'''Runs the benchmark called name repeats times, each in a fresh process, and
+	returns the fastest run's wall time, CPU time, records, throughput and peak
+	memory'''
+	context = multiprocessing.get_context('fork')
+	best = None
+	for repeat in range(repeats):
+		with context.Pool(1) as pool:
+			result = pool.apply(_run_once, (name, datadir, outdir, description))
+		if best is None or result['wall_time'] < best['wall_time']:
+			best = result
+	return {	'unit': best['unit'], 'records': best['records_in'],
+				'wall_time': best['wall_time'], 'cpu_time': best['cpu_time'],
+				'rate': best['records_per_second'], 'peak_rss_kb': best['peak_rss_kb'],
+				'rss_growth_kb': best['rss_growth_kb'] }
+
+def environment():
+	return {	'python': platform.python_version(), 'implementation': platform.python_implementation(),
+				'machine': platform.machine(), 'system': platform.system() }
+
+def compare(results, baseline, tolerance=0.2):
+	'''Compares results with those of baseline. Returns (name, rate change, memory
+	change, regressed) for each benchmark in both, with changes as fractions of the
+	baseline. A benchmark regressed if its throughput fell, or its peak memory grew,
+	by more than tolerance.'''
+	comparisons = []
+	for name, result in results['benchmarks'].items():
+		if name not in baseline['benchmarks']:
+			continue
+		old = baseline['benchmarks'][name]
+		rate_change = result['rate'] / old['rate'] - 1 if old['rate'] and result['rate'] else None
+		memory_change = result['peak_rss_kb'] / old['peak_rss_kb'] - 1 if old['peak_rss_kb'] and result['peak_rss_kb'] is not None else None
+		regressed = (rate_change is not None and rate_change < -tolerance) or (memory_change is not None and memory_change > tolerance)
+		comparisons.append((name, rate_change, memory_change, regressed))
+	return comparisons
+
+def write_results(outfile, results):
+	with open(outfile, 'w') as outfh:
+		json.dump(results, outfh, indent=1)
+		outfh.write('\n')
+
+def format_change(change):
+	return '%+.1f%%' % (change * 100) if change is not None else '-'
@@ -0,0 +1,168 @@
+'''Deterministic synthetic datasets for the QUASR benchmarks: Illumina single and
+paired-end FASTQ, 454 SFF files with key, MID tags and primers, and samtools
+pileups (with their reference) with mismatches, indels and deep coverage. The same
+seed and sizes always give the same files.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import random, struct
+
+# Mean Phred score at the start of a read, loss per base and spread for each error profile
+ErrorProfiles = {	'good': (38, 0.05, 3),
+					'typical': (34, 0.12, 5),
+					'poor': (28, 0.25, 8) }
+SffKey = 'TCAG'
+SffFlowChars = 'TACG' * 100
+Primers = ('GGTACCTTAGCA', 'CCATTAGGACTG') # 5' and 3' primer used in the SFF reads
+
+def random_sequence(rng, length):
+	return ''.join([rng.choice('ACGT') for i in range(length)])
+
+def read_qualities(rng, length, profile='typical'):
+	'''Returns the Phred scores of a read, falling away towards its 3' end'''
+	start, decay, spread = ErrorProfiles[profile]
+	return [min(41, max(2, int(rng.gauss(start - decay * i, spread)))) for i in range(length)]
+
+def add_errors(rng, sequence, phreds, n_rate=0.001):
+	# Substitutes bases with the probability given by their Phred score, and adds 'N's
+	bases = list(sequence)
+	for i, phred in enumerate(phreds):
+		if rng.random() < n_rate:
+			bases[i] = 'N'
+		elif rng.random() < 10 ** (-phred / 10):
+			bases[i] = rng.choice([b for b in 'ACGT' if b != bases[i]])
+	return ''.join(bases)
+
+def write_fastq(outfile, reads=10000, length=150, profile='typical', seed=1, ascii_offset=33, mate_file=None, mids=None):
+	'''Writes reads Illumina reads of the given length and error profile, sampled from
+	a random genome. If mate_file is given, a mate for each read is written to it
+	from the opposite strand 200-500 bases away. If mids is given, headers end in
+	"#<MID>/<read>" with one of them, as split_mids_by_header.py expects. Returns
+	the number of reads.'''
+	rng = random.Random(seed)
+	genome = random_sequence(rng, max(10000, 4 * length))
+	complement = str.maketrans('ACGT', 'TGCA')
+	outfh = open(outfile, 'w')
+	matefh = open(mate_file, 'w') if mate_file is not None else None
+	try:
+		for r in range(reads):
+			name = 'read%d#%d' % (r, rng.choice(mids)) if mids is not None else 'read%d' % r
+			start = rng.randint(0, len(genome) - length)
+			phreds = read_qualities(rng, length, profile)
+			sequence = add_errors(rng, genome[start:start+length], phreds)
+			outfh.write('@%s/1\n%s\n+\n%s\n' % (name, sequence, ''.join([chr(p + ascii_offset) for p in phreds])))
+			if matefh is not None:
+				mate_start = min(len(genome) - length, start + rng.randint(200, 500))
+				phreds = read_qualities(rng, length, profile)
+				sequence = add_errors(rng, genome[mate_start:mate_start+length].translate(complement)[::-1], phreds)
+				matefh.write('@%s/2\n%s\n+\n%s\n' % (name, sequence, ''.join([chr(p + ascii_offset) for p in phreds])))
+	finally:
+		outfh.close()
+		if matefh is not None:
+			matefh.close()
+	return reads
+
+def _padded(data):
+	return data + b'\x00' * (-len(data) % 8)
+
+def write_sff(outfile, reads=5000, mids=None, seed=1, profile='typical'):
+	'''Writes a 454 SFF file of reads with the key sequence, one of mids (numbers of
+	the 454 Rapid library MID tags) and, on most reads, a primer near one end.
+	Lengths vary as 454 reads do. Returns the number of reads.'''
+	from split_mids_by_sequence import RapidLibraryTags
+	rng = random.Random(seed)
+	mids = mids if mids is not None else [1, 2, 3, 4]
+	genome = random_sequence(rng, 20000)
+	header = struct.pack('>IccccQIIHHHB', 779314790, b'\x00', b'\x00', b'\x00', b'\x01', 0, 0, reads, 0, len(SffKey), len(SffFlowChars), 1)
+	header += (SffFlowChars + SffKey).encode()
+	header = _padded(header)
+	header = header[:24] + struct.pack('>H', len(header)) + header[26:]
+	with open(outfile, 'wb') as outfh:
+		outfh.write(header)
+		for r in range(reads):
+			length = max(40, int(rng.gauss(350, 80)))
+			start = rng.randint(0, len(genome) - length)
+			insert = genome[start:start+length]
+			x = rng.random()
+			if x < 0.4:
+				insert = Primers[0] + insert
+			elif x < 0.7:
+				insert = insert + Primers[1] + random_sequence(rng, rng.randint(0, 4))
+			sequence = SffKey + RapidLibraryTags[rng.choice(mids)] + insert
+			phreds = read_qualities(rng, len(sequence), profile)
+			sequence = sequence[:15] + add_errors(rng, sequence[15:], phreds[15:], 0)
+			name = ('SYNTH%07d' % r).encode()
+			read_header = struct.pack('>HHIHHHH', 0, len(name), len(sequence), 0, 0, 0, 0) + name
+			read_header = _padded(read_header)
+			read_header = struct.pack('>H', len(read_header)) + read_header[2:]
+			flowgram = struct.pack('>%dH' % len(SffFlowChars), *[rng.randint(0, 300) for f in SffFlowChars])
+			data = flowgram + bytes([1] * len(sequence)) + sequence.encode() + bytes(phreds)
+			outfh.write(read_header + _padded(data))
+	return reads
+
+def write_pileup(prefix, segments=(('segment1', 5000), ('segment2', 5000)), depth=200, seed=1, mismatch_rate=0.02, indel_rate=0.01, gap_rate=0.002):
+	'''Writes <prefix>.fasta and a 10-column samtools pileup <prefix>.pileup of
+	segments (name, length) covered at around depth reads, with mismatches, read
+	starts and ends, indels and occasional uncovered runs. Returns the number of
+	pileup lines.'''
+	rng = random.Random(seed)
+	lines = 0
+	with open(prefix + '.fasta', 'w') as fastafh, open(prefix + '.pileup', 'w') as pileupfh:
+		for name, length in segments:
+			reference = random_sequence(rng, length)
+			fastafh.write('>%s\n' % name)
+			for i in range(0, length, 60):
+				fastafh.write(reference[i:i+60] + '\n')
+			minority = {}
+			position = 1
+			while position <= length:
+				if rng.random() < gap_rate: # uncovered run
+					position += rng.randint(5, 50)
+					continue
+				reference_base = reference[position-1]
+				if position not in minority and rng.random() < 0.05:
+					minority[position] = (rng.choice([b for b in 'ACGT' if b != reference_base]), rng.uniform(0.05, 0.4))
+				position_depth = max(1, int(rng.gauss(depth, depth / 10)))
+				bases = []
+				for d in range(position_depth):
+					forward = rng.random() < 0.5
+					if rng.random() < 0.01:
+						bases.append('^' + chr(rng.randint(33, 93)))
+					x = rng.random()
+					if position in minority and x < minority[position][1]:
+						base = minority[position][0]
+					elif x < 1 - mismatch_rate:
+						base = '.'
+					elif rng.random() < 0.2:
+						base = '*'
+					else:
+						base = rng.choice('ACGTN')
+					if not forward:
+						base = ',' if base == '.' else base.lower()
+					bases.append(base)
+					if rng.random() < indel_rate:
+						indel = random_sequence(rng, rng.randint(1, 4))
+						bases.append('%s%d%s' % (rng.choice('+-'), len(indel), indel if forward else indel.lower()))
+					if rng.random() < 0.01:
+						bases.append('$')
+				qualities = ''.join([chr(33 + q) for q in read_qualities(rng, position_depth, 'good')])
+				pileupfh.write('%s\t%d\t%s\t%s\t60\t60\t60\t%d\t%s\t%s\n' % (name, position, reference_base, reference_base, position_depth, ''.join(bases), qualities))
+				lines += 1
+				position += 1
+	return lines
@@ -0,0 +1,171 @@
+'''Golden-output regression checks: runs the QUASR scripts on small fixture datasets
+made by datasets.py and compares every FASTQ, FASTA, table and other file they
+write with the golden checksums (or golden copies) of a known-good version, so
+that faster rewrites can be shown to give the same results.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib, json, os, shutil, subprocess, sys
+import datasets
+
+FixtureSettings = { 'version': 1, 'reads': 2000, 'pileup_length': 3000, 'depth': 60, 'seed': 7 }
+# Files written by the scripts that differ from run to run or machine to machine
+IgnoredSuffixes = ('.json', '.log', '.jpg', '.pstats', '.folded', '.fai')
+StdoutFile = 'stdout.txt'
+
+# Name, script (from the top of the QUASR tree), its arguments with {data} for the
+# fixtures directory and {out} for the case's output directory, whether its output
+# to the screen is checked (saved as stdout.txt) and fixtures copied into {out} first
+Cases = (	('qc_single', 'quality_control.py', '-f {data}/single.fq -o {out}/qc -m 20 -l 50', False, ()),
+			('qc_paired', 'quality_control.py', '-f {data}/paired.f.fq -r {data}/paired.r.fq -o {out}/qc -m 25 -l 60', False, ()),
+			('qc_batch', 'extras/qc_batch_runner.py', '-f {data}/qc_manifest.txt -o {out}/batch -m 20 -l 50 -p 2', False, ()),
+			('readset_sequence_mids', 'readset_parser.py', '-f {data}/reads.sff -o {out}/rs -s -m 1,2,3,4 -r -t {data}/primers.txt', True, ()),
+			('readset_header_mids', 'readset_parser.py', '-f {data}/mids.fq -o {out}/rs -d -m 1,2,3', True, ()),
+			('duplicate_remover', 'extras/fastq_duplicate_remover.py', '-f {data}/paired.f.fq -r {data}/paired.r.fq -o {out}/dedup', True, ()),
+			('remove_Ns', 'extras/fastq_remove_Ns.py', '{data}/single.fq {out}/n', True, ()),
+			('consensus', 'extras/pileup_consensus.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/c -q -a 0.3,0.1 -l 10,40', False, ()),
+			('consensus_independent', 'extras/pileup_consensus.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/c -d -c 20 -l 5', False, ()),
+			('consensus_parallel', 'extras/pileup_consensus.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/c -q -p 3', False, ()),
+			('minority_list', 'extras/pileup_minority_list.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/m -q 0.05', False, ()),
+			('minority_list_strand', 'extras/pileup_minority_list.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/m -q 0.02 -c 20 -s', False, ()),
+			('minority_vcf', 'extras/pileup_minority_list.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/m -q 0.05 -v -z', False, ()),
+			('minority_numbers', 'extras/pileup_minority_numbers.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -t 10', True, ()),
+			('coverage_stats', 'extras/pileup_coverage_stats.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/cov -w 500 -b 1,50', False, ()),
+			('depth_graph_svg', 'extras/pileup_depth_graph.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/d -s -x 1000', False, ()),
+			('minority_graph_svg', 'extras/pileup_minority_graph.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/m -s -x 1000', False, ()),
+			('pileup_index_region', 'extras/pileup_index.py', '-f {out}/pileup.pileup -b 100', False, ('pileup.pileup',)),
+			('region_consensus', 'extras/pileup_consensus.py', '-f {data}/pileup.pileup -r {data}/pileup.fasta -o {out}/c -q -g segment2:200-1100', False, ()),
+			('pileup_batch', 'extras/pileup_batch_runner.py', '-f {data}/pileup_manifest.txt -o {out}/pb -p 2', False, ()) )
+CaseNames = [case[0] for case in Cases]
+
+def make_fixtures(datadir):
+	'''Writes the fixture datasets and manifests to datadir'''
+	def path(name):
+		return os.path.join(datadir, name)
+
+	reads, seed = FixtureSettings['reads'], FixtureSettings['seed']
+	segments = [('segment1', FixtureSettings['pileup_length'] // 2), ('segment2', FixtureSettings['pileup_length'] - FixtureSettings['pileup_length'] // 2)]
+	datasets.write_fastq(path('single.fq'), reads, profile='poor', seed=seed)
+	datasets.write_fastq(path('paired.f.fq'), reads // 2, seed=seed + 1, mate_file=path('paired.r.fq'))
+	datasets.write_fastq(path('mids.fq'), reads // 2, seed=seed + 2, mids=[1, 2, 3, 4])
+	datasets.write_sff(path('reads.sff'), reads // 4, seed=seed + 3, profile='good')
+	datasets.write_pileup(path('pileup'), segments, FixtureSettings['depth'], seed=seed + 4)
+	datasets.write_pileup(path('pileup2'), segments[:1], FixtureSettings['depth'] // 2, seed=seed + 5)
+	with open(path('primers.txt'), 'w') as outfh:
+		outfh.write('\t'.join(datasets.Primers) + '\n')
+	with open(path('qc_manifest.txt'), 'w') as outfh:
+		outfh.write('single\t%s\n' % path('single.fq'))
+		outfh.write('paired\t%s\t%s\t25\t60\n' % (path('paired.f.fq'), path('paired.r.fq')))
+	with open(path('pileup_manifest.txt'), 'w') as outfh:
+		outfh.write('sample1\t%s\t%s\n' % (path('pileup.pileup'), path('pileup.fasta')))
+		outfh.write('sample2\t%s\t%s\n' % (path('pileup2.pileup'), path('pileup2.fasta')))
+
+def file_checksum(path):
+	sha = hashlib.sha256()
+	with open(path, 'rb') as infh:
+		for block in iter(lambda: infh.read(1 << 20), b''):
+			sha.update(block)
+	return sha.hexdigest()
+
+def run_case(case, quasr_dir, datadir, outdir):
+	'''Runs one case in a fresh outdir. Returns its exit status and a {file: sha256}
+	dictionary of the files it wrote.'''
+	name, script, arguments, check_stdout, copies = case
+	if os.path.isdir(outdir):
+		shutil.rmtree(outdir)
+	os.makedirs(outdir)
+	for fixture in copies:
+		shutil.copy(os.path.join(datadir, fixture), outdir)
+	datadir, outdir = os.path.abspath(datadir), os.path.abspath(outdir)
+	environment = dict(os.environ)
+	environment['PYTHONPATH'] = os.pathsep.join([os.path.join(quasr_dir, 'modules')] + ([environment['PYTHONPATH']] if environment.get('PYTHONPATH') else []))
+	command = [sys.executable, os.path.join(quasr_dir, script)] + arguments.format(data=datadir, out=outdir).split()
+	process = subprocess.run(command, cwd=outdir, env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+	if check_stdout is True:
+		# Paths are replaced so the output doesn't depend on where the check is run
+		stdout = process.stdout.decode('utf-8', 'replace').replace(outdir, '<OUT>').replace(datadir, '<DATA>')
+		with open(os.path.join(outdir, StdoutFile), 'w') as outfh:
+			outfh.write(stdout)
+	else:
+		with open(os.path.join(outdir, 'output.log'), 'wb') as outfh:
+			outfh.write(process.stdout)
+	checksums = {}
+	for directory, subdirs, files in os.walk(outdir):
+		for filename in files:
+			path = os.path.join(directory, filename)
+			relative = os.path.relpath(path, outdir)
+			if filename.endswith(IgnoredSuffixes) or relative in copies:
+				continue
+			checksums[relative] = file_checksum(path)
+	return process.returncode, checksums
+
+def first_difference(path, golden_path):
+	# Returns the first differing line of two text files as (line number, line, golden line), or None
+	with open(path, 'rb') as infh, open(golden_path, 'rb') as goldenfh:
+		line_number = 0
+		while True:
+			line, golden_line = infh.readline(), goldenfh.readline()
+			line_number += 1
+			if line == b'' and golden_line == b'':
+				return None
+			if line != golden_line:
+				return (line_number, line.decode('utf-8', 'replace').rstrip('\n'), golden_line.decode('utf-8', 'replace').rstrip('\n'))
+
+def compare_case(name, status, checksums, golden, outdir, golden_dir=None):
+	'''Returns the list of differences between a case's outputs and its golden entry.
+	If golden_dir holds a copy of a differing file, the first differing line is given.'''
+	if name not in golden['cases']:
+		return ['no golden outputs recorded']
+	expected = golden['cases'][name]
+	differences = []
+	if status != expected['status']:
+		differences.append('exit status %d, expected %d' % (status, expected['status']))
+	for filename in sorted(set(checksums) | set(expected['files'])):
+		if filename not in checksums:
+			differences.append('"%s" was not written' % filename)
+		elif filename not in expected['files']:
+			differences.append('"%s" was written but is not in the golden outputs' % filename)
+		elif checksums[filename] != expected['files'][filename]:
+			message = '"%s" differs' % filename
+			golden_path = os.path.join(golden_dir, name, filename) if golden_dir is not None else None
+			difference = first_difference(os.path.join(outdir, filename), golden_path) if golden_path is not None and os.path.exists(golden_path) else None
+			if difference is not None:
+				message += ' from line %d:\n\t< %s\n\t> %s' % (difference[0], difference[2][:100], difference[1][:100])
+			differences.append(message)
+	return differences
+
+def save_golden_copy(outdir, checksums, golden_dir, name):
+	# Copies a case's outputs to <golden_dir>/<name>/ for byte-for-byte comparison
+	case_dir = os.path.join(golden_dir, name)
+	if os.path.isdir(case_dir):
+		shutil.rmtree(case_dir)
+	for filename in checksums:
+		target = os.path.join(case_dir, filename)
+		if not os.path.isdir(os.path.dirname(target)):
+			os.makedirs(os.path.dirname(target))
+		shutil.copy(os.path.join(outdir, filename), target)
+
+def read_golden(infile):
+	with open(infile, 'r') as infh:
+		return json.load(infh)
+
+def write_golden(outfile, golden):
+	with open(outfile, 'w') as outfh:
+		json.dump(golden, outfh, indent=1, sort_keys=True)
+		outfh.write('\n')
@@ -0,0 +1,161 @@
+#! /software/bin/python3
+
+'''Generates synthetic Illumina FASTQ, 454 SFF and pileup datasets and times each
+stage of QUASR over them, reporting reads or pileup positions per second and peak
+memory. Results are compared against a stored baseline, and any stage slower (or
+larger) than it by more than the tolerance is reported as a regression.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys, getopt, json, os, time
+sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
+try:
+	from benchmarks import *
+except ImportError:
+	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if sys.version_info < (3,0):
+	print("[ERROR]: QUASR requires Python3 to run. Please read 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if __name__ == "__main__":
+	prog = sys.argv[0]
+
+	examples = '''
+[EG]: %s -o bench_dir
+[EG]: %s -o bench_dir -n 100000 -l 50000 -d 1000 -r 5
+[EG]: %s -o bench_dir -x qc_single,qc_paired -t 10
+[EG]: %s -o bench_dir -w''' % (prog, prog, prog, prog)
+
+	usage = '''[USAGE]: %s <options>
+-h   [None]\tDisplay this usage message with examples (--help)
+-o * [String]\tDirectory for the datasets, outputs and results (--outdir)
+-n   [Integer]\tNumber of single-end reads to generate; half as many pairs, a quarter as many SFF reads [20000] (--reads)
+-l   [Integer]\tLength of the pileup reference [20000] (--length)
+-d   [Integer]\tMean pileup depth [200] (--depth)
+-s   [Integer]\tSeed of the generated datasets [1] (--seed)
+-r   [Integer]\tRun each benchmark this many times and keep the fastest [3] (--repeats)
+-x   [String]\tComma-separated benchmarks to run [all] (--only)
+-b   [File]\tBaseline results to compare against [baseline.json beside this script] (--baseline)
+-t   [Float]\tPercentage loss of throughput, or gain in memory, reported as a regression [20] (--tolerance)
+-w   [None]\tSave these results as the new baseline (--write-baseline)
+
+[NOTE]: Options with * are mandatory. All others are optional.
+[NOTE]: Benchmarks are %s
+[NOTE]: Results are written to <outdir>/results.json. The exit status is 1 if any
+        benchmark regressed. Baselines are specific to the machine they were made on''' % (prog, ', '.join(BenchmarkNames))
+
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "ho:n:l:d:s:r:x:b:t:w", ["help", "outdir=", "reads=", "length=", "depth=", "seed=", "repeats=", "only=", "baseline=", "tolerance=", "write-baseline"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(usage)
+		sys.exit(2)
+
+	outdir = None
+	settings = {}
+	repeats = 3
+	selected = BenchmarkNames
+	baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+	tolerance = 20.0
+	write_baseline = False
+
+	try:
+		for o, a in opts:
+			if o in ("-h", "--help"):
+				print(usage)
+				print(examples)
+				sys.exit()
+			elif o in ("-o", "--outdir"):
+				outdir = a
+			elif o in ("-n", "--reads"):
+				settings['reads'] = int(a)
+			elif o in ("-l", "--length"):
+				settings['pileup_length'] = int(a)
+			elif o in ("-d", "--depth"):
+				settings['depth'] = int(a)
+			elif o in ("-s", "--seed"):
+				settings['seed'] = int(a)
+			elif o in ("-r", "--repeats"):
+				repeats = int(a)
+			elif o in ("-x", "--only"):
+				selected = a.split(',')
+			elif o in ("-b", "--baseline"):
+				baseline_file = a
+			elif o in ("-t", "--tolerance"):
+				tolerance = float(a)
+			elif o in ("-w", "--write-baseline"):
+				write_baseline = True
+	except ValueError as err:
+		print('[ERROR]: Unable to parse option value: %s' % err)
+		sys.exit(2)
+
+	if len(sys.argv) == 1:
+		print(usage)
+		sys.exit()
+
+	if outdir is None:
+		print('[ERROR]: Output directory must be specified with the "-o" flag')
+		sys.exit(2)
+	elif repeats < 1:
+		print('[ERROR]: Benchmarks must be run at least once')
+		sys.exit(2)
+	unknown = [name for name in selected if name not in BenchmarkNames]
+	if unknown:
+		print('[ERROR]: Unknown benchmarks ' + str(unknown))
+		sys.exit(2)
+
+	datadir = os.path.join(outdir, 'data')
+	workdir = os.path.join(outdir, 'output')
+	for directory in (datadir, workdir):
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+	description = generate_datasets(datadir, **settings)
+	print('[INFO]: %d single-end reads, %d paired reads, %d SFF reads and %d pileup positions' % (description['single_reads'], description['paired_reads'], description['sff_reads'], description['pileup_positions']))
+
+	results = {	'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(),
+				'datasets': description['settings'], 'repeats': repeats, 'benchmarks': {} }
+	for name in [name for name in BenchmarkNames if name in selected]:
+		result = run_benchmark(name, datadir, workdir, description, repeats)
+		results['benchmarks'][name] = result
+		print('[STATS]: %-18s %9d %-9s %8.3fs %12.1f %s/s %9s kB peak' % (name, result['records'], result['unit'], result['wall_time'], result['rate'] or 0, result['unit'], result['peak_rss_kb']))
+	resultsfile = os.path.join(outdir, 'results.json')
+	write_results(resultsfile, results)
+	print('[INFO]: Results written to "%s"' % resultsfile)
+
+	regressions = []
+	if os.path.exists(baseline_file):
+		with open(baseline_file, 'r') as infh:
+			baseline = json.load(infh)
+		if baseline.get('datasets') != results['datasets']:
+			print('[WARNING]: Baseline "%s" was made with different datasets %s' % (baseline_file, str(baseline.get('datasets'))))
+		for name, rate_change, memory_change, regressed in compare(results, baseline, tolerance / 100):
+			print('[STATS]: %-18s throughput %8s, memory %8s against baseline%s' % (name, format_change(rate_change), format_change(memory_change), ' [REGRESSION]' if regressed else ''))
+			if regressed:
+				regressions.append(name)
+	elif write_baseline is False:
+		print('[WARNING]: No baseline found at "%s". Use "-w" to save one' % baseline_file)
+
+	if write_baseline is True:
+		write_results(baseline_file, results)
+		print('[INFO]: Baseline written to "%s"' % baseline_file)
+	if regressions:
+		print('[WARNING]: %d benchmarks regressed by more than %g%%: %s' % (len(regressions), tolerance, ', '.join(regressions)))
+		sys.exit(1)
@@ -0,0 +1,156 @@
+#! /software/bin/python3
+
+'''Runs quality_control.py, readset_parser.py and the extras scripts on small
+fixture datasets and checks that every output file matches the golden outputs of a
+known-good version, by checksum or byte-for-byte against saved golden copies.
+Use it before and after a performance rewrite to show the results are unchanged.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys, getopt, os
+sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
+try:
+	from regression import *
+except ImportError:
+	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if sys.version_info < (3,0):
+	print("[ERROR]: QUASR requires Python3 to run. Please read 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+def _run_case_star(args):
+	return run_case(*args)
+
+if __name__ == "__main__":
+	prog = sys.argv[0]
+
+	examples = '''
+[EG]: %s -o regression_dir
+[EG]: %s -o regression_dir -p 4 -x qc_single,consensus
+[EG]: %s -o regression_dir -g golden_dir
+[EG]: %s -o regression_dir -g golden_dir -w''' % (prog, prog, prog, prog)
+
+	usage = '''[USAGE]: %s <options>
+-h   [None]\tDisplay this usage message with examples (--help)
+-o * [String]\tDirectory for the fixtures and the outputs of each case (--outdir)
+-x   [String]\tComma-separated cases to run [all] (--only)
+-p   [Integer]\tNumber of cases to run in parallel [1] (--processes)
+-c   [File]\tGolden checksums [golden.json beside this script] (--checksums)
+-g   [String]\tDirectory of golden copies of the outputs, to show the first differing line (--golden)
+-w   [None]\tRecord these outputs as the golden outputs (and copies in -g) (--write-golden)
+
+[NOTE]: Options with * are mandatory. All others are optional.
+[NOTE]: Cases are %s
+[NOTE]: The exit status is 1 if any output differs from the golden outputs''' % (prog, ', '.join(CaseNames))
+
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "ho:x:p:c:g:w", ["help", "outdir=", "only=", "processes=", "checksums=", "golden=", "write-golden"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(usage)
+		sys.exit(2)
+
+	outdir = None
+	selected = CaseNames
+	processes = 1
+	quasr_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	checksum_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden.json')
+	golden_dir = None
+	write = False
+
+	try:
+		for o, a in opts:
+			if o in ("-h", "--help"):
+				print(usage)
+				print(examples)
+				sys.exit()
+			elif o in ("-o", "--outdir"):
+				outdir = a
+			elif o in ("-x", "--only"):
+				selected = a.split(',')
+			elif o in ("-p", "--processes"):
+				processes = int(a)
+			elif o in ("-c", "--checksums"):
+				checksum_file = a
+			elif o in ("-g", "--golden"):
+				golden_dir = a
+			elif o in ("-w", "--write-golden"):
+				write = True
+	except ValueError as err:
+		print('[ERROR]: Unable to parse option value: %s' % err)
+		sys.exit(2)
+
+	if len(sys.argv) == 1:
+		print(usage)
+		sys.exit()
+
+	if outdir is None:
+		print('[ERROR]: Output directory must be specified with the "-o" flag')
+		sys.exit(2)
+	unknown = [name for name in selected if name not in CaseNames]
+	if unknown:
+		print('[ERROR]: Unknown cases ' + str(unknown))
+		sys.exit(2)
+	if write is False and not os.path.exists(checksum_file):
+		print('[ERROR]: No golden checksums found at "%s". Use "-w" to record them' % checksum_file)
+		sys.exit(2)
+
+	datadir = os.path.join(outdir, 'fixtures')
+	if not os.path.isdir(datadir):
+		os.makedirs(datadir)
+	print('[INFO]: Writing fixtures to "%s"' % datadir)
+	make_fixtures(datadir)
+
+	cases = [case for case in Cases if case[0] in selected]
+	jobs = [(case, quasr_dir, datadir, os.path.join(outdir, case[0])) for case in cases]
+	if processes > 1:
+		import multiprocessing
+		with multiprocessing.Pool(processes) as pool:
+			outcomes = pool.map(_run_case_star, jobs)
+	else:
+		outcomes = [run_case(*job) for job in jobs]
+
+	golden = read_golden(checksum_file) if os.path.exists(checksum_file) else {'fixtures': FixtureSettings, 'cases': {}}
+	if write is True:
+		golden['fixtures'] = FixtureSettings
+		for case, (status, checksums) in zip(cases, outcomes):
+			golden['cases'][case[0]] = {'status': status, 'files': checksums}
+			if golden_dir is not None:
+				save_golden_copy(os.path.join(outdir, case[0]), checksums, golden_dir, case[0])
+			print('[INFO]: Recorded %d outputs of "%s" (exit status %d)' % (len(checksums), case[0], status))
+		write_golden(checksum_file, golden)
+		print('[INFO]: Golden checksums written to "%s"' % checksum_file)
+		sys.exit()
+
+	if golden['fixtures'] != FixtureSettings:
+		print('[WARNING]: Golden outputs were recorded from different fixtures %s' % str(golden['fixtures']))
+	failed = []
+	for case, (status, checksums) in zip(cases, outcomes):
+		differences = compare_case(case[0], status, checksums, golden, os.path.join(outdir, case[0]), golden_dir)
+		if differences:
+			failed.append(case[0])
+			for difference in differences:
+				print('[ERROR]: %s: %s' % (case[0], difference))
+		else:
+			print('[INFO]: %s: %d outputs match' % (case[0], len(checksums)))
+	print('[STATS]: %d of %d cases match the golden outputs' % (len(cases) - len(failed), len(cases)))
+	if failed:
+		print('[INFO]: Outputs of the failed cases (and their output.log) are in "%s"' % outdir)
+		sys.exit(1)
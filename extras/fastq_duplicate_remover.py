@@ -25,6 +25,7 @@ import sys, os.path
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
 try:
 	from fastq import *
+	from fastq_filters import unique_reads, unique_pairs
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -46,73 +47,47 @@ def main(infile, outprefix, rev_file=None, offset=33):
 		raise
 	else:
 		print('[INFO]: Input and output files successfully opened')
-		unique_seqs = {}
-		duplicates = 0
 		skipped = 0
 	
 	print('[INFO]: Parsing FASTQ records from "%s"' % infile)
-	forward_reads = {header: FastqRecord(header, sequence, quality) for header, sequence, quality in fastq_iterator(infh)}
+	forward_reads = {read.get_header(): read for read in fastq_records(infh)}
 	infh.close()
 	total = len(forward_reads)
 	if rev_file is not None:
 		print('[INFO]: Parsing reverse reads from "%s"' % rev_file)
-		reverse_reads = {header: FastqRecord(header, sequence, quality) for header, sequence, quality in fastq_iterator(revfh)}
+		reverse_reads = {read.get_header(): read for read in fastq_records(revfh)}
 		revfh.close()
 		assert len(reverse_reads) == total, "%d reads in forward file and %d in reverse file" % (total, len(reverse_reads))
-	
-	for header, record in forward_reads.items():
-		f_mean_qual = record.calculate_mean_quality(ascii_offset=offset)
-		f_sequence = record.get_sequence()
-		if rev_file is not None:
-			# PE duplicate check
-			if not header in reverse_reads.keys():
+		
+		# PE duplicate check, on read pairs matched by header
+		pairs = []
+		for header, record in forward_reads.items():
+			if not header in reverse_reads:
 				reverse_header = '%s2' % header[:-1]
-				if not reverse_header in reverse_reads.keys():
+				if not reverse_header in reverse_reads:
 					print('[ERROR]: Ignoring read "%s"; no matching reverse read' % header)
 					skipped += 1
 					continue
 			else:
 				reverse_header = header
-			r_record = reverse_reads[reverse_header]
-			comb_mean_qual = (f_mean_qual + r_record.calculate_mean_quality(ascii_offset=offset))/2
-			comb_sequence = f_sequence + r_record.get_sequence()
-			if comb_sequence not in unique_seqs.keys():
-				unique_seqs[comb_sequence] = (record, r_record, comb_mean_qual)
-				continue
-			else:
-				duplicates += 1
-				if comb_mean_qual <= unique_seqs[comb_sequence][2]:
-					continue
-				else:
-					unique_seqs[comb_sequence] = (record, r_record, comb_mean_qual)
-			
-		else:
-			# SE duplicate check
-			if f_sequence not in unique_seqs.keys():
-				unique_seqs[f_sequence] = (record, f_mean_qual)
-				continue
-			else:
-				duplicates += 1
-				if f_mean_qual <= unique_seqs[f_sequence][1]:
-					continue
-				else:
-					unique_seqs[f_sequence] = (record, f_mean_qual)
-	
-	if rev_file is not None:
-		for f_fastq, r_fastq, ignore in unique_seqs.values():
+			pairs.append((record, reverse_reads[reverse_header]))
+		unique_seqs = unique_pairs(pairs, offset)
+		for f_fastq, r_fastq in unique_seqs:
 			f_fastq.write_to_file(outfh)
 			r_fastq.write_to_file(outfh_r)
 		outfh_r.close()
 	else:
-		for fastq, ignore in unique_seqs.values():
+		# SE duplicate check
+		unique_seqs = unique_reads(forward_reads.values(), offset)
+		for fastq in unique_seqs:
 			fastq.write_to_file(outfh)
 	outfh.close()
 	
 	uniques = len(unique_seqs)
-	assert	(duplicates + uniques + skipped == total), 'Unparsed reads in file!'
+	duplicates = total - skipped - uniques
 	print('[STATS]: %d inital sequences' % total)
 	print('[STATS]: %d duplicate sequenes' % duplicates)
-	print('[STATS]: %d unique sequences' % len(unique_seqs))
+	print('[STATS]: %d unique sequences' % uniques)
 
 if __name__ == "__main__":
 	import getopt
@@ -24,6 +24,8 @@ import sys
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
 try:
 	import fastq
+	from fastq_filters import remove_Ns
+	from error_report import ErrorReport
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -41,39 +43,18 @@ outprefix = sys.argv[2]
 
 outfile = outprefix + '.Ntrimmed.fastq'
 passed_seqs = 0
-failed_seqs = 0
-total_seqs = 0
-unparseable_seqs = 0
+counts = {'failed': 0}
+errors = ErrorReport()
 with open(infile, 'r') as infh, open(outfile, 'w') as outfh:
 	print('[INFO]: Parsing %s' % infile)
-	for header, sequence, quality in fastq.fastq_iterator(infh):
-		total_seqs += 1
-		try:
-			record = fastq.FastqRecord(header, sequence, quality)
-		except IOError as err:
-			print('[ERROR]: Ignoring "%s": %s' % (header, err))
-			unparseable_seqs += 1
-			continue
-		
-		if 'N' in record.sequence:
-			if record.sequence.count('N') > 1:
-				failed_seqs += 1
-				continue
-			else:
-				index = record.sequence.find('N')
-				# If N is towards end then store beginning of read
-				if len(record.sequence[:index]) > len(record.sequence[index+1:]):
-					record.write_to_file(outfh, end=index)
-					passed_seqs += 1
-				# Or if N is towards beginning or in middle of sequence
-				elif len(record.sequence[:index]) <= len(record.sequence[index+1:]):
-					record.write_to_file(outfh, start=index+1)
-					passed_seqs += 1
-		else:
-			record.write_to_file(outfh)
-			passed_seqs += 1
+	for record in remove_Ns(fastq.fastq_records(infh, errors), counts):
+		record.write_to_file(outfh)
+		passed_seqs += 1
 	
-	assert total_seqs == passed_seqs + failed_seqs + unparseable_seqs, '[ERROR]: Unparsed sequence in file'			
+	failed_seqs = counts['failed']
+	unparseable_seqs = errors.counts.get('invalid_read', 0)
+	errors.summary()
+	total_seqs = passed_seqs + failed_seqs + unparseable_seqs
 	print('[TOTAL]: Input sequences: %d' % total_seqs)
 	print('[PASS]: Sequences written to "%s": %d' % (outfile, passed_seqs))
 	print('[FAIL]: Sequences with >1 N: %d' % failed_seqs)
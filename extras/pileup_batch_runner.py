@@ -0,0 +1,152 @@
+#! /software/bin/python3
+
+'''Takes in a manifest of pileup files and, for each sample, writes a consensus
+sequence and a minority base list and calculates the genome fraction with a major
+base above a cutoff. Samples are processed in parallel and a combined summary
+table is written for the whole run.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys, getopt
+sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
+try:
+	from pileup_batch import *
+except ImportError:
+	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if sys.version_info < (3,0):
+	print("[ERROR]: QUASR requires Python3 to run. Please read 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if __name__ == "__main__":
+	prog = sys.argv[0]
+
+	examples = '''
+[EG]: %s -f manifest.txt -o outDir/run1
+[EG]: %s -f manifest.txt -o outDir/run1 -p 8 -c 15 -q 0.02
+[EG]: %s -f manifest.txt -o outDir/run1 -p 8 -d -l 50''' % (prog, prog, prog)
+
+	usage = '''[USAGE]: %s <options>
+-h   [None]\tDisplay this usage message with examples (--help)
+
+--GENERAL--
+-f * [File]\tManifest of tab-separated "sample, pileup[, reference]" lines (--manifest)
+-o * [String]\tOutput directory and file prefix (--outprefix)
+-p   [Integer]\tNumber of samples to process in parallel [1] (--processes)
+-i   [None]\tIllumina ASCII offset (+64) used to encode quality (--illumina)
+-c   [Integer]\tIgnore bases below this Phred score [0] (--cutoff)
+
+--CONSENSUS--
+-d   [None]\tGenerate quality-independent consensus sequence [dependent] (--independent)
+-a   [Float]\tMinority base frequency for inclusion as ambiguity code [0.3] (--ambiguity)
+-l   [Integer]\tDepth below which bases are written in lowercase (or as 'N's if -d) [10] (--lowcoverage)
+
+--MINORITIES--
+-q   [Float]\tList only minority bases above this frequency [0.05] (--frequency)
+-t   [Integer]\tList only those bases with a read depth above this value [0] (--depth)
+-m   [Float]\tMajority base frequency cutoff for the genome fraction [0.99] (--majority)
+-x   [None]\tDo not count deletions (*) (--deletions)
+
+[NOTE]: Options with * are mandatory. All others are optional.
+[NOTE]: Outputs are <outprefix>.<sample>.consensus.fasta, <outprefix>.<sample>.minority.txt
+        and the run summary <outprefix>.summary.txt''' % prog
+
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hf:o:p:ic:da:l:q:t:m:x", ["help", "manifest=", "outprefix=", "processes=", "illumina", "cutoff=", "independent", "ambiguity=", "lowcoverage=", "frequency=", "depth=", "majority=", "deletions"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(usage)
+		sys.exit(2)
+
+	manifest = None
+	outprefix = None
+	processes = 1
+	settings = {}
+
+	try:
+		for o, a in opts:
+			if o in ("-h", "--help"):
+				print(usage)
+				print(examples)
+				sys.exit()
+			elif o in ("-f", "--manifest"):
+				manifest = a
+			elif o in ("-o", "--outprefix"):
+				outprefix = a
+			elif o in ("-p", "--processes"):
+				processes = int(a)
+			elif o in ("-i", "--illumina"):
+				settings['ascii_offset'] = 64
+			elif o in ("-c", "--cutoff"):
+				settings['phred_cutoff'] = int(a)
+			elif o in ("-d", "--independent"):
+				settings['quality_independent'] = True
+			elif o in ("-a", "--ambiguity"):
+				settings['ambiguity_threshold'] = float(a)
+			elif o in ("-l", "--lowcoverage"):
+				settings['low_depth_cutoff'] = int(a)
+			elif o in ("-q", "--frequency"):
+				settings['frequency_cutoff'] = float(a)
+			elif o in ("-t", "--depth"):
+				settings['depth_cutoff'] = int(a)
+			elif o in ("-m", "--majority"):
+				settings['majority_cutoff'] = float(a)
+			elif o in ("-x", "--deletions"):
+				settings['base_list'] = 'ACGT'
+	except ValueError as err:
+		print('[ERROR]: Unable to parse option value: %s' % err)
+		sys.exit(2)
+
+	if len(sys.argv) == 1:
+		print(usage)
+		sys.exit()
+
+	if manifest is None:
+		print('[ERROR]: Manifest file must be specified with the "-f" flag')
+		sys.exit(2)
+	elif outprefix is None:
+		print('[ERROR]: Output directory and file prefix must be specified with the "-o" flag')
+		sys.exit(2)
+
+	if settings.get('quality_independent') is True and settings.get('phred_cutoff', 0) != 0:
+		print('[WARNING]: Quality-independent consensus does not use Phred values. "-c" only applies to the minority list and majority fraction')
+
+	try:
+		with open(manifest, 'r') as manifestfh:
+			samples = parse_manifest(manifestfh)
+	except (IOError, RuntimeError) as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+
+	print('[INFO]: Processing %d samples using %d processes' % (len(samples), processes))
+	rows = []
+	for row in run_batch(samples, outprefix, processes, **settings):
+		if row[1] == 'OK':
+			print('[INFO]: Sample "%s" processed' % row[0])
+		else:
+			print('[ERROR]: Sample "%s" %s' % (row[0], row[1]))
+		rows.append(row)
+
+	summaryfile = outprefix + '.summary.txt'
+	with open(summaryfile, 'w') as outfh:
+		write_summary(outfh, rows)
+	failed = len([row for row in rows if row[1] != 'OK'])
+	print('[STATS]: %d samples processed, %d failed' % (len(rows) - failed, failed))
+	print('[INFO]: Summary written to "%s"' % summaryfile)
@@ -28,6 +28,11 @@ import sys, getopt
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
 try:
 	from pileup import *
+	from consensus import *
+	from pileup_parallel import *
+	from alignment import *
+	from metrics import *
+	from profiling import StageProfiler
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -41,31 +46,43 @@ prog = sys.argv[0]
 examples = '''
 [EG]: %s -f input.pileup -o outDir/outPrefix -q -c 15
 [EG]: %s -f input.pileup -o outDir/outPrefix -q -c 15 -l 50
-[EG]: %s -f input.pileup -o outDir/outPrefix -d -l 50''' % (prog, prog, prog)
+[EG]: %s -f input.pileup -o outDir/outPrefix -d -l 50
+[EG]: %s -f input.pileup -o outDir/outPrefix -q -c 15 -a 0.1,0.2,0.3 -l 10,50
+[EG]: %s -f input.bam -r reference.fasta -o outDir/outPrefix -q -c 15 -p 4''' % (prog, prog, prog, prog, prog)
 
 usage = '''[USAGE]: %s <options>
 -h   [None]\tDisplay this usage message with examples (--help)
 
 --GENERAL--
--f * [File]\tInput pileup file (--infile)
+-f * [File]\tInput pileup file, or SAM/BAM file (.sam/.bam) to count directly with deletions (--infile)
 -o * [String]\tOutput directory and file prefix (--outprefix)
 -i   [None]\tIllumina ASCII offset (+64) used to encode quality (--illumina) 
--a   [Float]\tMinority base frequency for inclusion as ambiguity code [0.3] (--ambiguity)
+-a   [CSV]\tMinority base frequencies for inclusion as ambiguity code [0.3] (--ambiguity)
 -r   [File]\tReference file to confirm genome size if low coverage (--reference)
+-g   [String]\tOnly process region "segment[:start-end]" (--region)
+-p   [Integer]\tNumber of processes used to parse the pileup or decompress the BAM file [1] (--processes)
+-k   [File]\tWrite per-stage timing, throughput and memory metrics to a JSON file (--metrics)
+--profile [None]\tProfile each stage to <outprefix>.<stage>.pstats and .folded (collapsed stacks)
 
 --EITHER--
 -q + [None]\tGenerate quality-dependent consensus sequence (--dependent)
 -c   [Integer]\tIgnore bases below this Phred score [0] (--cutoff)
--l   [Integer]\tDepth below which bases are written in lowercase [10] (--lowcoverage)
+-l   [CSV]\tDepths below which bases are written in lowercase [10] (--lowcoverage)
 
 --OR--
 -d + [None]\tGenerate quality-independent consensus sequence (--independent)
--l   [Integer]\tDepth below which bases are written as 'N's [10] (--lowcoverage)
+-l   [CSV]\tDepths below which bases are written as 'N's [10] (--lowcoverage)
 
-[NOTE]: Options with * are mandatory. Those with + are mandatory but mutually-exclusive.''' % prog
+[NOTE]: Options with * are mandatory. Those with + are mandatory but mutually-exclusive.
+[NOTE]: SAM/BAM input counts deletions, so positions where most reads have a deletion
+        are called as '-'. Pileup input does not count them, so the same reads can give a
+        different consensus from a pileup than from their SAM/BAM file
+[NOTE]: One consensus is written per -a/-l combination. If more than one is given, the
+        output files are named <outprefix>.a<ambiguity>.l<depth>.consensus.fasta, with
+        <ambiguity> to two decimal places (or in full if it has more)''' % prog
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:r:a:ql:d", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "reference=", "ambiguity=", "dependent", "lowcoverage=", "independent"])
+	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:r:a:ql:dg:p:k:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "reference=", "ambiguity=", "dependent", "lowcoverage=", "independent", "region=", "processes=", "metrics=", "profile"])
 except getopt.GetoptError as err:
         # print help information and exit:
 	print(str(err)) # will print something like "option -a not recognized"
@@ -76,10 +93,14 @@ pileup_file = None
 outprefix = None
 phred_cutoff = 0
 ascii_offset = 33
-ambiguity_threshold = 0.30
-low_depth_cutoff = 10
+ambiguity_thresholds = '0.30'
+low_depth_cutoffs = '10'
 quality_independent = None
 reference_file = None
+region = None
+processes = 1
+metrics_file = None
+profile = False
 checker = 0 # This is just to check that both options haven't been specified
 
 for o, a in opts:
@@ -94,9 +115,9 @@ for o, a in opts:
 	elif o in ("-c", "--cutoff"):
 		phred_cutoff = int(a)
 	elif o in ("-a", "--ambiguity"):
-		ambiguity_threshold = float(a)
+		ambiguity_thresholds = a
 	elif o in ("-l", "--lowcoverage"):
-		low_depth_cutoff = int(a)
+		low_depth_cutoffs = a
 	elif o in ("-d", "--independent"):
 		quality_independent = True
 		checker += 1
@@ -105,6 +126,14 @@ for o, a in opts:
 		checker += 1
 	elif o in ("-r", "reference="):
 		reference_file = a
+	elif o in ("-g", "--region"):
+		region = a
+	elif o in ("-p", "--processes"):
+		processes = int(a)
+	elif o in ("-k", "--metrics"):
+		metrics_file = a
+	elif o == "--profile":
+		profile = True
 
 if len(sys.argv) == 1:
 	print(usage)
@@ -123,83 +152,103 @@ elif checker > 1:
 	print('[ERROR]: Cannot specify both quality-dependent and -independent flags')
 	sys.exit(2)
 
+try:
+	ambiguity_thresholds = [float(t) for t in ambiguity_thresholds.split(',')]
+	low_depth_cutoffs = [int(t) for t in low_depth_cutoffs.split(',')]
+except ValueError as err:
+	print('[ERROR]: Unable to parse threshold list: %s' % err)
+	sys.exit(2)
+# Repeated values would write the same file twice
+ambiguity_thresholds = sorted(set(ambiguity_thresholds), key=ambiguity_thresholds.index)
+low_depth_cutoffs = sorted(set(low_depth_cutoffs), key=low_depth_cutoffs.index)
+
+def threshold_name(threshold):
+	# Two decimal places, as before, unless that would round the threshold
+	name = '%.2f' % threshold
+	return name if float(name) == threshold else repr(threshold)
+
 if quality_independent is True and phred_cutoff != 0:
 	print('[WARNING]: Quality-independent consensus does not use Phred values. Ignoring "-c" flag')
 	phred_cutoff = 0
 
-AmbiguityCodes = { 	'AC': 'M', 'AG': 'R', 'AT': 'W',
-					'CG': 'S', 'CT': 'Y', 'GT': 'K',
-					'ACG': 'V', 'ACT': 'H', 'AGT': 'D',
-					'CGT': 'B', 'ACGT': 'N' }
+alignment_input = pileup_file.endswith('.sam') or pileup_file.endswith('.bam')
+if alignment_input and region is not None:
+	print('[ERROR]: Regions can only be given with pileup files')
+	sys.exit(2)
 
-outfile = outprefix + '.consensus.fasta'
-with open(pileup_file, 'r') as infh, open(outfile, 'w') as outfh:
-	print('[INFO]: Parsing "%s"' % pileup_file)
-	if reference_file is not None:
-		with open(reference_file, 'r') as ref_fh:
-			pileup = PileupFile(infh, ref_fh)
-	else:
-		pileup = PileupFile(infh)
-	
-	# Get the read bases at each position	
-	if quality_independent is True:
-		print('[INFO]: Generating quality-independent consensus')
-		base_list = pileup.parse_read_bases(phred_cutoff, ascii_offset)
-	else: # This removes all bases below the cutoff
-		print('[INFO]: Generating quality-dependent consensus')
-		base_list = pileup.parse_read_bases(phred_cutoff, ascii_offset)
-	segment_list = pileup.return_reference_names()
-	previous_segment = None
-	genome_size = len(base_list)
-	consensus = ''
-	for i in range(genome_size):
-		current_segment = segment_list[i]
-		if current_segment != previous_segment:
-			if previous_segment is not None:
-				#outfh.write('>%s %s | amb:%.2f | phred:%d | depth:%d\n%s\n' % (outprefix, previous_segment, ambiguity_threshold, phred_cutoff, low_depth_cutoff, consensus))
-				outfh.write('>%s\n%s\n' % (previous_segment, consensus))
-				consensus = ''
-				
-		previous_segment = current_segment
-		bases = base_list[i].upper()
-		depth = len(bases)
-		if depth == 0:
-			if pileup._read_depth[i] > 0: # bad coding to access private variable, but easiest way to find out if there were bases covering!
-				consensus += 'N'
+index = None
+if region is not None:
+	try:
+		region = parse_region(region)
+	except ValueError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+	index = load_pileup_index(pileup_file)
+	print('[INFO]: Restricting to %s:%d-%s' % (region[0], region[1], region[2] if region[2] is not None else 'end'))
+
+# Count the read bases at each position once. Quality-independent has a cutoff of 0
+if quality_independent is True:
+	print('[INFO]: Generating quality-independent consensus')
+else: # This removes all bases below the cutoff
+	print('[INFO]: Generating quality-dependent consensus')
+metrics = Metrics(profiler=StageProfiler() if profile is True else None)
+stage = metrics.stage('count_read_bases').start()
+ref_fh = None
+if reference_file is not None:
+	ref_fh = open(reference_file, 'r')
+if alignment_input:
+	print('[INFO]: Counting alignments in "%s"' % pileup_file)
+	try:
+		with open_alignments(pileup_file, processes) as alignments:
+			if ref_fh is not None:
+				with IndexedFasta(ref_fh) as reference:
+					counts, pileup_depths, segment_table, insertions = count_alignments(alignments.references, alignments.records, phred_cutoff, reference)
 			else:
-				consensus += '-'
-			continue
-		elif depth < low_depth_cutoff and quality_independent is True:
-			consensus += 'N'
-			continue
+				counts, pileup_depths, segment_table, insertions = count_alignments(alignments.references, alignments.records, phred_cutoff)
+	except (IOError, ValueError) as err:
+		print('[ERROR]: Unable to read "%s": %s' % (pileup_file, err))
+		sys.exit(2)
+	segment_ranges = [(name, offset, offset + length) for name, offset, length in segment_table]
+elif processes > 1 and region is None:
+	print('[INFO]: Parsing "%s" using %d processes' % (pileup_file, processes))
+	try:
+		counts, pileup_depths, segment_table = parallel_count_read_bases(pileup_file, ref_fh, processes, phred_cutoff, ascii_offset, load_pileup_index(pileup_file))
+	except (IOError, AssertionError) as err: # raised again here from the worker process
+		print('[ERROR]: Unable to read "%s": %s' % (pileup_file, err))
+		sys.exit(2)
+	segment_ranges = [(name, offset, offset + length) for name, offset, length in segment_table]
+else:
+	print('[INFO]: Parsing "%s"' % pileup_file)
+	try:
+		with open(pileup_file, 'r') as infh:
+			pileup = PileupFile(infh, ref_fh, region, index)
+	except (IOError, AssertionError) as err:
+		print('[ERROR]: Unable to read "%s": %s' % (pileup_file, err))
+		sys.exit(2)
+	counts = pileup.count_read_bases(phred_cutoff, ascii_offset)
+	pileup_depths = pileup.return_pileup_depths()
+	segment_ranges = pileup.return_segment_ranges()
+if ref_fh is not None:
+	ref_fh.close()
+stage.stop().count(len(pileup_depths), len(pileup_depths), file_size(pileup_file))
+
+multiple = len(ambiguity_thresholds) * len(low_depth_cutoffs) > 1
+for ambiguity_threshold in ambiguity_thresholds:
+	for low_depth_cutoff in low_depth_cutoffs:
+		if multiple is True:
+			outfile = '%s.a%s.l%d.consensus.fasta' % (outprefix, threshold_name(ambiguity_threshold), low_depth_cutoff)
 		else:
-			consensus_base = ''
-			max_freq = 0.0
-			max_base = ''
-			if '*' in bases: # If more reads show a deletion than not, consider it as a deletion
-				del_freq = bases.count('*') / depth
-				if del_freq > 0.5:
-					consensus += '-'
-					continue
-			for base in 'ACGT': # First calculate bases above threshold
-				f = bases.count(base) / depth
-				if f > max_freq:
-					max_freq = f # Store the freqency of the highest frequency base to compare against deletion frequency
-					max_base = base
-				elif f == max_freq:
-					max_base += base
-
-				if f > ambiguity_threshold:
-					consensus_base += base
-			if len(consensus_base) == 0:
-				consensus_base = max_base
-			if len(consensus_base) > 1:
-				consensus_base = AmbiguityCodes.get(consensus_base.upper(), 'N')
-			if depth < low_depth_cutoff: # must be quality independent == False because the alternative is already dealt with above
-				consensus += consensus_base.lower()
-			else:
-				consensus += consensus_base.upper()
-				
-	#outfh.write('>%s %s | amb:%.2f | phred:%d | depth:%d\n%s\n' % (outprefix, previous_segment, ambiguity_threshold, phred_cutoff, low_depth_cutoff, consensus))
-	outfh.write('>%s\n%s\n' % (previous_segment, consensus))
-	print('[INFO]: Consensus sequence written to "%s"' % outfile)
+			outfile = outprefix + '.consensus.fasta'
+		with metrics.stage('call_consensus') as stage:
+			consensus = call_consensus(counts, pileup_depths, ambiguity_threshold, low_depth_cutoff, quality_independent)
+			with open(outfile, 'w') as outfh:
+				write_consensus(outfh, consensus, segment_ranges)
+		stage.count(len(pileup_depths), len(consensus), bytes_written=file_size(outfile))
+		print('[INFO]: Consensus sequence written to "%s"' % outfile)
+
+if metrics_file is not None:
+	metrics.write_json(metrics_file)
+	print('[INFO]: Metrics written to "%s"' % metrics_file)
+if profile is True:
+	metrics.profiler.write(outprefix)
+	print('[INFO]: Stage profiles written to "%s.<stage>.pstats" and "%s.<stage>.folded"' % (outprefix, outprefix))
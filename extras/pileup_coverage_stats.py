@@ -0,0 +1,146 @@
+#! /software/bin/python3
+
+'''Writes coverage statistics for a pileup file: the mean, median, minimum and
+maximum read depth and the fraction of positions covered to given depths, for each
+segment and optionally for each fixed-size window along it.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys, getopt
+sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
+try:
+	from pileup import *
+	from coverage import *
+except ImportError:
+	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if sys.version_info < (3,0):
+	print("[ERROR]: QUASR requires Python3 to run. Please read 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+prog = sys.argv[0]
+
+examples = '''
+[EG]: %s -f input.pileup -o output_dir/out
+[EG]: %s -f input.pileup -r reference.fasta -o output_dir/out -c 15 -w 500
+[EG]: %s -f input.pileup -o output_dir/out -w 100 -b 1,20,50,1000''' % (prog, prog, prog)
+
+usage = '''[USAGE]: %s <options>
+-h   [None]\tDisplay this usage message with examples (--help)
+-f * [File]\tInput pileup file (--infile)
+-o * [String]\tOutput directory and file prefix (--outprefix)
+-i   [None]\tIllumina ASCII offset (+64) used to encode quality (--illumina)
+-c   [Integer]\tIgnore bases below this Phred score [0] (--cutoff)
+-r   [File]\tReference file to confirm genome size if low coverage (--reference)
+-g   [String]\tOnly process region "segment[:start-end]" (--region)
+-w   [Integer]\tAlso write statistics for windows of this many bases (--window)
+-b   [CSV]\tDepths to report breadth of coverage at [1,10,100] (--breadth)
+
+[NOTE]: Options with * are mandatory. All others are optional.
+[NOTE]: Statistics are written to <outprefix>.coverage.txt''' % prog
+
+try:
+	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:r:g:w:b:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "reference=", "region=", "window=", "breadth="])
+except getopt.GetoptError as err:
+	print(str(err))
+	print(usage)
+	sys.exit(2)
+
+infile = None
+outprefix = None
+reference_file = None
+region = None
+phred_cutoff = 0
+ascii_offset = 33
+window = None
+thresholds = '1,10,100'
+
+for o, a in opts:
+	if o in ("-h", "--help"):
+		print(usage)
+		print(examples)
+		sys.exit()
+	elif o in ("-f", "--infile"):
+		infile = a
+	elif o in ("-o", "--outprefix"):
+		outprefix = a
+	elif o in ("-c", "--cutoff"):
+		phred_cutoff = int(a)
+	elif o in ("-i", "--illumina"):
+		ascii_offset = 64
+	elif o in ("-r", "--reference"):
+		reference_file = a
+	elif o in ("-g", "--region"):
+		region = a
+	elif o in ("-w", "--window"):
+		window = int(a)
+	elif o in ("-b", "--breadth"):
+		thresholds = a
+
+if len(sys.argv) == 1:
+	print(usage)
+	sys.exit()
+
+if infile is None:
+	print('[ERROR]: Input pileup file must be specified with the "-f" flag')
+	sys.exit(2)
+elif outprefix is None:
+	print('[ERROR]: Output directory and file prefix must be specified with the "-o" flag')
+	sys.exit(2)
+elif window is not None and window < 1:
+	print('[ERROR]: Window size must be at least 1')
+	sys.exit(2)
+
+try:
+	thresholds = [int(t) for t in thresholds.split(',')]
+except ValueError as err:
+	print('[ERROR]: Unable to parse breadth depths: %s' % err)
+	sys.exit(2)
+
+index = None
+first_position = 1
+if region is not None:
+	try:
+		region = parse_region(region)
+	except ValueError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+	index = load_pileup_index(infile)
+	first_position = region[1]
+	print('[INFO]: Restricting to %s:%d-%s' % (region[0], region[1], region[2] if region[2] is not None else 'end'))
+
+print('[INFO]: Parsing "%s"' % infile)
+try:
+	with open(infile, 'r') as pileup_fh:
+		if reference_file is not None:
+			with open(reference_file, 'r') as ref_fh:
+				pileup = PileupFile(pileup_fh, ref_fh, region, index)
+		else:
+			pileup = PileupFile(pileup_fh, None, region, index)
+except AssertionError as err:
+	print('[ERROR]: %s' % err)
+	sys.exit(1)
+
+depths = pileup.return_read_depths(phred_cutoff, ascii_offset)
+outfile = outprefix + '.coverage.txt'
+with open(outfile, 'w') as outfh:
+	rows = write_coverage(outfh, coverage_rows(depths, pileup.return_segment_table(), window, thresholds, first_position), thresholds)
+print('[STATS]: %d segments, %d positions, %d rows' % (len(pileup.return_segment_table()), len(depths), rows))
+print('[INFO]: Coverage statistics written to "%s"' % outfile)
@@ -23,6 +23,7 @@ import sys, os, tempfile, getopt, math
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
 try:
 	from pileup import *
+	from svg_plot import *
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -36,7 +37,8 @@ prog = sys.argv[0]
 examples = '''
 [EG]: %s -f input.pileup -o output_dir/out
 [EG]: %s -f input.pileup -o ../output -c 15
-[EG]: %s -f input.pileup -o ~/out -c 20 -p /usr/bin/R -x 1000 -n 4''' % (prog, prog, prog)
+[EG]: %s -f input.pileup -o ~/out -c 20 -p /usr/bin/R -x 1000 -n 4
+[EG]: %s -f input.pileup -o ~/out -s -j 4 -x 10000''' % (prog, prog, prog, prog)
 
 usage = '''[USAGE]: %s <options>
 -h   [None]\tDisplay this usage message with examples (--help)
@@ -47,17 +49,20 @@ usage = '''[USAGE]: %s <options>
 -i   [None]\tIllumina ASCII offset (+64) used to encode quality (--illumina)
 -c   [Integer]\tIgnore bases below this Phred score [0] (--cutoff)
 -r   [File]\tReference file to confirm genome size if low coverage (--reference)
+-g   [String]\tOnly process region "segment[:start-end]" (--region)
 
 --GRAPH OPTIONS--
 -p   [File]\tPath to R binary for stats generation and graphing (--path)
 -x   [Integer]\tNumber of bases per plot (--xaxis)
 -n   [Integer]\tMaximum number of plots per output JPG [4] (--num)
 -y   [Integer]\tMaximum Y-axis range. Default is maximum data-value (--yaxis)
+-s   [None]\tDraw SVG plots without R, binning positions to the page width (--svg)
+-j   [Integer]\tNumber of SVG pages to draw in parallel [1] (--jobs)
 
 [NOTE]: Options with * are mandatory. All others are optional.''' % prog
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:r:p:x:n:y:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "reference=", "path=", "xaxis=", "num=", "yaxis="])
+	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:r:p:x:n:y:g:sj:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "reference=", "path=", "xaxis=", "num=", "yaxis=", "region=", "svg", "jobs="])
 except getopt.GetoptError as err:
         # print help information and exit:
 	print(str(err)) # will print something like "option -a not recognized"
@@ -73,6 +78,9 @@ max_y_axis = None
 num_graphs = 4
 ascii_offset = 33
 reference_file = None
+region = None
+svg_output = False
+jobs = 1
 
 for o, a in opts:
 	if o in ("-h", "--help"):
@@ -95,8 +103,14 @@ for o, a in opts:
 		r_binary_path = a
 	elif o in ("-r", "reference="):
 		reference_file = a
+	elif o in ("-g", "--region"):
+		region = a
 	elif o in ("-y", "yaxis="):
 		max_y_axis = a
+	elif o in ("-s", "--svg"):
+		svg_output = True
+	elif o in ("-j", "--jobs"):
+		jobs = int(a)
 
 if len(sys.argv) == 1:
 	print(usage)
@@ -117,55 +131,75 @@ def determine_R_path():
 	else:
 		return None
 
-graphfile = outprefix + '.depth.pdf'
-# First determine R binary path
-if r_binary_path is not None:
-	if not os.path.exists(r_binary_path):
-		print('[ERROR]: Specified path to R binary is invalid')
-		sys.exit(2)
-else:
-	r_binary_path = determine_R_path()
-	if r_binary_path is None:
-		print('[ERROR]: Unable to determine R path. Please use flag to specify.')
-		sys.exit(2)
+if not svg_output:
+	graphfile = outprefix + '.depth.pdf'
+	# First determine R binary path
+	if r_binary_path is not None:
+		if not os.path.exists(r_binary_path):
+			print('[ERROR]: Specified path to R binary is invalid')
+			sys.exit(2)
 	else:
-		print('[INFO]: R binary found')
+		r_binary_path = determine_R_path()
+		if r_binary_path is None:
+			print('[ERROR]: Unable to determine R path. Please use flag to specify.')
+			sys.exit(2)
+		else:
+			print('[INFO]: R binary found')
 	
-# now create temp files to store R commands and R input data
-try:
-	r_datafile = tempfile.NamedTemporaryFile(delete=False, mode='w')
-	r_commandsfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
-except IOError as err:
-	print('[ERROR]: Unable to open temporary files to write R commands: %s' % err)
-	sys.exit(2)
+	# now create temp files to store R commands and R input data
+	try:
+		r_datafile = tempfile.NamedTemporaryFile(delete=False, mode='w')
+		r_commandsfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
+	except IOError as err:
+		print('[ERROR]: Unable to open temporary files to write R commands: %s' % err)
+		sys.exit(2)
+
+index = None
+if region is not None:
+	try:
+		region = parse_region(region)
+	except ValueError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+	index = load_pileup_index(pileup_file)
+	print('[INFO]: Restricting to %s:%d-%s' % (region[0], region[1], region[2] if region[2] is not None else 'end'))
 
 print('[INFO]: Parsing "%s"' % pileup_file)
 with open(pileup_file, 'r') as pileup_fh:
 	print('[INFO]: Parsing "%s"' % pileup_file)
 	if reference_file is not None:
 		with open(reference_file, 'r') as ref_fh:
-			pileup = PileupFile(pileup_fh, ref_fh)
+			pileup = PileupFile(pileup_fh, ref_fh, region, index)
 	else:
-		pileup = PileupFile(pileup_fh)
+		pileup = PileupFile(pileup_fh, None, region, index)
 	
 depths = pileup.return_read_depths(phred_cutoff, ascii_offset)
-for d in depths:
-		r_datafile.write('%d\t' % d)
-		if d == 0:
-			r_datafile.write('1\n')
-		else:
-			r_datafile.write('0\n')
-r_datafile.close()
+if not svg_output:
+	# depth and binary depth (1: no coverage, 0: covered), written 10000 rows at a time
+	for i in range(0, len(depths), 10000):
+		r_datafile.write(''.join(['%d\t%d\n' % (d, d == 0) for d in depths[i:i+10000]]))
+	r_datafile.close()
 
 print('[INFO]: Generating depth plots')
 
+if svg_output:
+	first_position = region[1] if region is not None else 1 # X-axis label of the first position
+	y_max = int(max_y_axis) if max_y_axis is not None else upper_limit(max(depths) if depths else 0)
+	if max_x_axis is None:
+		panels = [depth_panel(depths, offset, offset + size, first_position, '"%s"' % name, y_max) for name, offset, size in pileup.return_segment_table()]
+	else:
+		panels = [depth_panel(depths, b, min(b + max_x_axis, len(depths)), first_position + b, 'Nucleotides %d-%d' % (first_position + b, first_position + min(b + max_x_axis, len(depths)) - 1), y_max) for b in range(0, len(depths), max_x_axis)]
+	print('[INFO]: Depth plots written to:')
+	for svgfile in render_pages(outprefix + '.depth%02d.svg', panels, max(1, min(num_graphs, len(panels))), jobs):
+		print('[INFO]: %s' % svgfile)
+	sys.exit()
+
 # First, work out how many plots will be produced
 num_pages = None
 # if a max num of nucleotides on X axis is not specified, each segment will be put on a new plot
 if max_x_axis is None:
-	seg_names = pileup.return_reference_names()
-	seg_counter = pileup.calc_segment_sizes()
-	num_segs = len(seg_counter)
+	segment_table = pileup.return_segment_table()
+	num_segs = len(segment_table)
 	# If fewer segments than plots per page, make plots per page = number of segments
 	if num_segs < num_graphs:
 		num_graphs = num_segs 
@@ -218,10 +252,9 @@ par(mfrow=c(%d,1))''' % num_graphs
 			remainder = (counter+num_graphs) - num_segs 
 		for s in range(num_graphs*page, (counter+num_graphs)-remainder):
 			counter += 1
-			name = seg_counter[s][0]
-			size = seg_counter[s][1]
-			min = max + 1
-			max = max + size
+			name, offset, size = segment_table[s]
+			min = offset + 1 # R indices are 1-based
+			max = offset + size
 			r_commands += '''
 barplot(t(as.matrix(binary.depth[%d:%d,])), col="grey80", border=NA, xlab="", ylab="", space=0, axes=F)
 par(new=T)
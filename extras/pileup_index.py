@@ -0,0 +1,88 @@
+#! /software/bin/python3
+
+'''Indexes a pileup file by segment and block of positions so that the pileup_*
+scripts can seek straight to a region given with -g/--region instead of parsing
+the whole file. The index is written next to the pileup file as <pileup>.pidx
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys, getopt
+sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
+try:
+	from pileup import *
+except ImportError:
+	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if sys.version_info < (3,0):
+	print("[ERROR]: QUASR requires Python3 to run. Please read 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+prog = sys.argv[0]
+
+examples = '''
+[EG]: %s -f input.pileup
+[EG]: %s -f input.pileup -b 100''' % (prog, prog)
+
+usage = '''[USAGE]: %s <options>
+-h   [None]\tDisplay this usage message with examples (--help)
+-f * [File]\tInput pileup file (--infile)
+-b   [Integer]\tNumber of positions per indexed block [1000] (--block)
+
+[NOTE]: Options with * are mandatory. All others are optional.''' % prog
+
+try:
+	opts, args = getopt.getopt(sys.argv[1:], "hf:b:", ["help", "infile=", "block="])
+except getopt.GetoptError as err:
+	print(str(err))
+	print(usage)
+	sys.exit(2)
+
+infile = None
+block_size = 1000
+
+for o, a in opts:
+	if o in ("-h", "--help"):
+		print(usage)
+		print(examples)
+		sys.exit()
+	elif o in ("-f", "--infile"):
+		infile = a
+	elif o in ("-b", "--block"):
+		block_size = int(a)
+
+if len(sys.argv) == 1:
+	print(usage)
+	sys.exit()
+
+if infile is None:
+	print('[ERROR]: Input pileup file must be specified with the "-f" flag')
+	sys.exit(2)
+elif block_size < 1:
+	print('[ERROR]: Block size must be at least 1')
+	sys.exit(2)
+
+outfile = infile + PileupIndexSuffix
+print('[INFO]: Indexing "%s"' % infile)
+with open(infile, 'rb') as infh:
+	index = build_pileup_index(infh, block_size)
+with open(outfile, 'w') as outfh:
+	write_pileup_index(outfh, index, block_size)
+print('[INFO]: %d segments indexed' % len(index))
+print('[INFO]: Index written to "%s"' % outfile)
@@ -22,9 +22,11 @@ minority bases. The minority bases are those that are not the most frequent base
 # along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
 
 import sys, os, math, tempfile, getopt
+from array import array
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
 try:
 	from pileup import *
+	from svg_plot import *
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -38,7 +40,8 @@ prog = sys.argv[0]
 examples = '''
 [EG]: %s -f input.pileup -o output_dir/out
 [EG]: %s -f input.pileup -o ../output -c 15 -l 50
-[EG]: %s -f input.pileup -o ~/out -c 20 -p /usr/bin/R -x 1000 -n 4''' % (prog, prog, prog)
+[EG]: %s -f input.pileup -o ~/out -c 20 -p /usr/bin/R -x 1000 -n 4
+[EG]: %s -f input.pileup -o ~/out -s -j 4 -x 10000''' % (prog, prog, prog, prog)
 
 usage = '''[USAGE]: %s <options>
 -h   [None]\tDisplay this usage message with examples (--help)
@@ -49,17 +52,20 @@ usage = '''[USAGE]: %s <options>
 -i   [None]\tIllumina ASCII offset (+64) used to encode quality (--illumina)
 -c   [Integer]\tIgnore bases below this Phred score [0] (--cutoff)
 -r   [File]\tReference file to confirm genome size if low coverage (--reference)
+-g   [String]\tOnly process region "segment[:start-end]" (--region)
 
 --GRAPH OPTIONS--
 -p   [File]\tPath to R binary for stats generation and graphing (--path)
 -x   [Integer]\tNumber of bases per plot (--xaxis)
 -n   [Integer]\tMaximum number of plots per output JPG [4] (--num)
 -l   [Integer]\tBackground shade bases with depth below cutoff [10] (--lowcoverage)
+-s   [None]\tDraw SVG plots without R, binning positions to the page width (--svg)
+-j   [Integer]\tNumber of SVG pages to draw in parallel [1] (--jobs)
 
 [NOTE]: Options with * are mandatory. All others are optional.''' % prog
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:r:p:x:n:l:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "reference=", "path=", "xaxis=", "num=", "lowcoverage="])
+	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:r:p:x:n:l:g:sj:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "reference=", "path=", "xaxis=", "num=", "lowcoverage=", "region=", "svg", "jobs="])
 except getopt.GetoptError as err:
         # print help information and exit:
 	print(str(err)) # will print something like "option -a not recognized"
@@ -75,6 +81,9 @@ r_binary_path = None
 max_x_axis = None
 num_graphs = 4
 reference_file = None
+region = None
+svg_output = False
+jobs = 1
 
 for o, a in opts:
 	if o in ("-h", "--help"):
@@ -99,6 +108,12 @@ for o, a in opts:
 		depth_cutoff = int(a)
 	elif o in ("-r", "--reference"):
 		reference_file = a
+	elif o in ("-g", "--region"):
+		region = a
+	elif o in ("-s", "--svg"):
+		svg_output = True
+	elif o in ("-j", "--jobs"):
+		jobs = int(a)
 
 if len(sys.argv) == 1:
 	print(usage)
@@ -119,51 +134,67 @@ def determine_R_path():
 	else:
 		return None
 
-# First determine R binary path
-if r_binary_path is not None:
-	if not os.path.exists(r_binary_path):
-		print('[ERROR]: Specified path to R binary is invalid')
-		sys.exit(2)
-else:
-	r_binary_path = determine_R_path()
-	if r_binary_path is None:
-		print('[ERROR]: Unable to determine R path. Please use flag to specify.')
-		sys.exit(2)
+if not svg_output:
+	# First determine R binary path
+	if r_binary_path is not None:
+		if not os.path.exists(r_binary_path):
+			print('[ERROR]: Specified path to R binary is invalid')
+			sys.exit(2)
 	else:
-		print('[INFO]: R binary found')
+		r_binary_path = determine_R_path()
+		if r_binary_path is None:
+			print('[ERROR]: Unable to determine R path. Please use flag to specify.')
+			sys.exit(2)
+		else:
+			print('[INFO]: R binary found')
 	
-# now create temp files to store R commands and R input data
-try:
-	r_datafile = tempfile.NamedTemporaryFile(delete=False, mode='w')
-	r_commandsfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
-except IOError as err:
-	print('[ERROR]: Unable to open temporary files to write R commands: %s' % err)
-	sys.exit(2)
+	# now create temp files to store R commands and R input data
+	try:
+		r_datafile = tempfile.NamedTemporaryFile(delete=False, mode='w')
+		r_commandsfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
+	except IOError as err:
+		print('[ERROR]: Unable to open temporary files to write R commands: %s' % err)
+		sys.exit(2)
+
+index = None
+if region is not None:
+	try:
+		region = parse_region(region)
+	except ValueError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+	index = load_pileup_index(pileup_file)
+	print('[INFO]: Restricting to %s:%d-%s' % (region[0], region[1], region[2] if region[2] is not None else 'end'))
 
 print('[INFO]: Parsing "%s"' % pileup_file)
 with open(pileup_file, 'r') as pileup_fh:
 	print('[INFO]: Parsing "%s"' % pileup_file)
 	if reference_file is not None:
 		with open(reference_file, 'r') as ref_fh:
-			pileup = PileupFile(pileup_fh, ref_fh)
+			pileup = PileupFile(pileup_fh, ref_fh, region, index)
 	else:
-		pileup = PileupFile(pileup_fh)
+		pileup = PileupFile(pileup_fh, None, region, index)
 try:	
 	bases = pileup.parse_read_bases(phred_cutoff, ascii_offset)
 except AssertionError as err:
 	print('[ERROR]: %s' % err)
-	r_datafile.close()
-	r_commandsfile.close()
-	os.unlink(r_datafile.name)
-	os.unlink(r_commandsfile.name)
+	if not svg_output:
+		r_datafile.close()
+		r_commandsfile.close()
+		os.unlink(r_datafile.name)
+		os.unlink(r_commandsfile.name)
 	sys.exit()
 	
 # Bases is a list of the read bases for each reference position
 # IE ['ATCGAT', 'CGATCGACTA', 'TACGATCGA']
 max_sum = 0.0
+minorities = [array('d') for base in 'ACGT'] # A/C/G/T minority frequencies
+low_coverage = array('b') # binary depth (1: <cutoff, 0: >cutoff)
 for pos in bases:
 	if pos == '':
-		r_datafile.write('0.00\t0.00\t0.00\t0.00\t1\n') # A/C/G/T/binary depth (1: <cutoff, 0: >cutoff)
+		for column in minorities:
+			column.append(0.0)
+		low_coverage.append(1)
 		continue
 	
 	freqs = {'A': 0.00, 'C': 0.00, 'G': 0.00, 'T': 0.00}
@@ -182,39 +213,56 @@ for pos in bases:
 	if '*' in pos:
 		del_freq = pos.count('*') / total
 		if del_freq > max_freq:
-			r_datafile.write('0.00\t0.00\t0.00\t0.00\t1\n')
+			for column in minorities:
+				column.append(0.0)
+			low_coverage.append(1)
 			continue
 			
-	for base in 'ACGT':
+	for base, column in zip('ACGT', minorities):
 		if base == max_base:
-			r_datafile.write('0.00\t') # doesn't print out majority base for readability
+			column.append(0.0) # doesn't plot the majority base for readability
 		else:
 			b = freqs[base]
-			r_datafile.write('%.3f\t' % b)
+			column.append(b)
 			sum += b
 	if total > depth_cutoff:
-		r_datafile.write('0\n') # for plotting grey lines at low coverage
+		low_coverage.append(0) # for plotting grey lines at low coverage
 	else:
-		r_datafile.write('1\n')
+		low_coverage.append(1)
 	if sum > max_sum:
 		max_sum = sum
-		
-r_datafile.close()
+
+if not svg_output:
+	for i in range(0, len(low_coverage), 10000):
+		rows = zip(*[column[i:i+10000] for column in minorities] + [low_coverage[i:i+10000]])
+		r_datafile.write(''.join(['%.3f\t%.3f\t%.3f\t%.3f\t%d\n' % row for row in rows]))
+	r_datafile.close()
 			
 print('[INFO]: Generating minority plots')
 
+if svg_output:
+	first_position = region[1] if region is not None else 1 # X-axis label of the first position
+	if max_x_axis is None:
+		panels = [minority_panel(minorities, low_coverage, offset, offset + size, first_position, name, max_sum) for name, offset, size in pileup.return_segment_table()]
+	else:
+		panels = [minority_panel(minorities, low_coverage, b, min(b + max_x_axis, len(low_coverage)), first_position + b, 'Nucleotides %d-%d' % (first_position + b, first_position + min(b + max_x_axis, len(low_coverage)) - 1), max_sum) for b in range(0, len(low_coverage), max_x_axis)]
+	print('[INFO]: Minority plots written to:')
+	for svgfile in render_pages(outprefix + '.minority%02d.svg', panels, max(1, min(num_graphs, len(panels))), jobs):
+		print('[INFO]: %s' % svgfile)
+	sys.exit()
+
 # First, work out how many plots will be produced
 num_pages = None
 # if a max num of nucleotides on X axis is not specified, each segment will be put on a new plot
 if max_x_axis is None:
-	seg_counter = pileup.calc_segment_sizes()
-	num_segs = len(seg_counter)
+	segment_table = pileup.return_segment_table()
+	num_segs = len(segment_table)
 	# If fewer segments than plots per page, make plots per page = number of segments
 	if num_segs < num_graphs:
 		num_graphs = num_segs 
 	num_pages = math.ceil(num_segs/num_graphs)
 else:
-	genome_size = len(bases)
+	genome_size = len(low_coverage)
 	graph_boundaries = [(b+1, b+max_x_axis) for b in range(0, genome_size, max_x_axis) if b+max_x_axis <= genome_size]
 	remainder = genome_size % max_x_axis
 	if remainder != 0:
@@ -252,10 +300,9 @@ par(cex=0.8)''' % num_graphs
 			remainder = (counter+num_graphs) - num_segs 
 		for s in range(num_graphs*page, (counter+num_graphs)-remainder):
 			counter += 1
-			name = seg_counter[s][0]
-			size = seg_counter[s][1]
-			min = max + 1
-			max = max + size
+			name, offset, size = segment_table[s]
+			min = offset + 1 # R indices are 1-based
+			max = offset + size
 			r_commands += '''
 barplot(t(as.matrix(binary.depth[%d:%d,])), col="grey80", border=NA, xlab="", ylab="", space=0, axes=F)
 par(new=T)
@@ -22,10 +22,15 @@ the most frequent base.
 # You should have received a copy of the GNU General Public License
 # along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
 
-import sys, getopt
+import sys, os, getopt
 sys.path.append('/Users/sw10/Dropbox/Sanger/QUASR/QUASR_v6.09/modules/')
 try:
 	from pileup import *
+	from minority import *
+	from vcf import *
+	from bgzf import *
+	from metrics import *
+	from profiling import StageProfiler
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -39,7 +44,9 @@ prog = sys.argv[0]
 examples = '''
 [EG]: %s -f input.pileup -o output_dir/out
 [EG]: %s -f input.pileup -o ../output -c 15 -l 50
-[EG]: %s -f input.pileup -o ~/out -c 20 -p /usr/bin/R -x 1000 -n 4''' % (prog, prog, prog)
+[EG]: %s -f input.pileup -o ~/out -c 20 -p /usr/bin/R -x 1000 -n 4
+[EG]: %s -f input.pileup -o ~/out -c 20 -s
+[EG]: %s -f input.pileup -r reference.fasta -o ~/out -c 20 -v -z -n sample1''' % (prog, prog, prog, prog, prog)
 
 usage = '''[USAGE]: %s <options>
 -h   [None]\tDisplay this usage message with examples (--help)
@@ -49,13 +56,20 @@ usage = '''[USAGE]: %s <options>
 -c   [Integer]\tIgnore bases below this Phred score [0] (--cutoff)
 -d   [None]\tDo not display minority deletions (*) (--deletions)
 -r   [File]\tReference file to confirm genome size if low coverage (--reference)
+-g   [String]\tOnly process region "segment[:start-end]" (--region)
 -q   [Float]\tDisplay only minority bases above this frequency [0.20] (--frequency)
 -t   [Integer]\tDisplay only those bases with a read depth above this value [0] (--depth)
+-s   [None]\tAlso display forward/reverse strand counts and strand bias p-values (--strand)
+-v   [None]\tWrite non-reference bases as VCF (<outprefix>.minority.vcf) instead (--vcf)
+-z   [None]\tCompress the VCF with bgzip (<outprefix>.minority.vcf.gz) (--bgzip)
+-n   [String]\tSample name of the VCF column [file name part of -o] (--sample)
+-k   [File]\tWrite per-stage timing, throughput and memory metrics to a JSON file (--metrics)
+--profile [None]\tProfile each stage to <outprefix>.<stage>.pstats and .folded (collapsed stacks)
 
 [NOTE]: Options with * are mandatory. All others are optional.''' % prog
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:dr:q:t:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "deletions", "reference=", "frequency=", "depth="])
+	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:dr:q:t:g:svzn:k:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "deletions", "reference=", "frequency=", "depth=", "region=", "strand", "vcf", "bgzip", "sample=", "metrics=", "profile"])
 except getopt.GetoptError as err:
         # print help information and exit:
 	print(str(err)) # will print something like "option -a not recognized"
@@ -65,11 +79,18 @@ except getopt.GetoptError as err:
 infile = None
 outprefix = None
 reference_file = None
+region = None
 f_cutoff = 0.05
 depth_cutoff = 0
 phred_cutoff = 0
 ascii_offset = 33
 base_list = 'ACGT*'
+stranded = False
+vcf_output = False
+bgzip_output = False
+sample = None
+metrics_file = None
+profile = False
 
 for o, a in opts:
 	if o in ("-h", "--help"):
@@ -88,10 +109,25 @@ for o, a in opts:
 		ascii_offset = 64
 	elif o in ("-r", "--reference"):
 		reference_file = a
+	elif o in ("-g", "--region"):
+		region = a
 	elif o in ("-q", "--frequency"):
 		f_cutoff = float(a)
 	elif o in ("-d", "--deletions"):
 		base_list = 'ACGT'
+	elif o in ("-s", "--strand"):
+		stranded = True
+	elif o in ("-v", "--vcf"):
+		vcf_output = True
+	elif o in ("-z", "--bgzip"):
+		vcf_output = True
+		bgzip_output = True
+	elif o in ("-n", "--sample"):
+		sample = a
+	elif o in ("-k", "--metrics"):
+		metrics_file = a
+	elif o == "--profile":
+		profile = True
 
 if len(sys.argv) == 1:
 	print(usage)
@@ -104,49 +140,64 @@ elif outprefix is None:
 	print('[ERROR]: Output directory and file prefix must be specified with the "-o" flag')
 	sys.exit(2)
 
-with open(infile, 'r') as pileup_fh:
-	print('[INFO]: Parsing "%s"' % infile)
-	if reference_file is not None:
-		with open(reference_file, 'r') as ref_fh:
-			pileup = PileupFile(pileup_fh, ref_fh)
-	else:
-		pileup = PileupFile(pileup_fh)
-		
-try:	
-	bases = pileup.parse_read_bases(phred_cutoff, ascii_offset)
-	segs = pileup.return_reference_names()
+if sample is not None and (sample == '' or '\t' in sample):
+	print('[ERROR]: Sample name given with the "-n" flag must be non-empty and without tabs')
+	sys.exit(2)
+
+if bgzip_output:
+	outfile = outprefix + '.minority.vcf.gz'
+elif vcf_output:
+	outfile = outprefix + '.minority.vcf'
+else:
+	outfile = outprefix + '.minority.txt'
+index = None
+if region is not None:
+	try:
+		region = parse_region(region)
+	except ValueError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+	index = load_pileup_index(infile)
+	print('[INFO]: Restricting to %s:%d-%s' % (region[0], region[1], region[2] if region[2] is not None else 'end'))
+
+print('[INFO]: Parsing "%s"' % infile)
+metrics = Metrics(profiler=StageProfiler() if profile is True else None)
+stage = metrics.stage('minority_list').start()
+ref_fh = None
+try:
+	with open(infile, 'r') as pileup_fh:
+		if reference_file is not None:
+			ref_fh = open(reference_file, 'r')
+		positions = metrics.timed_records('pileup_iterator', pileup_iterator(pileup_fh, ref_fh, region, index))
+		if vcf_output:
+			contigs = []
+			if reference_file is not None:
+				with IndexedFasta(reference_file) as reference:
+					contigs = list(reference.lengths.items())
+			outfh = BgzfWriter(open(outfile, 'wb')) if bgzip_output else open(outfile, 'w')
+			with outfh:
+				outfh.write(vcf_header(sample if sample is not None else os.path.basename(outprefix), contigs))
+				written = write_vcf(outfh, call_variants(positions, phred_cutoff, ascii_offset, f_cutoff, depth_cutoff, base_list))
+		else:
+			with open(outfile, 'w') as outfh:
+				if stranded:
+					outfh.write('SEGMENT\tPOS\tBASE\tFREQ\tDEPTH\tMAJORITY\tFORWARD\tREVERSE\tSTRAND_BIAS\n')
+				else:
+					outfh.write('SEGMENT\tPOS\tBASE\tFREQ\tDEPTH\tMAJORITY\n')
+				counted = count_positions(positions, phred_cutoff, ascii_offset, stranded)
+				written = write_minorities(outfh, call_minorities(counted, f_cutoff, depth_cutoff, base_list))
 except AssertionError as err:
 	print('[ERROR]: %s' % err)
+	sys.exit(1)
+finally:
+	if ref_fh is not None:
+		ref_fh.close()
+stage.stop().count(metrics.stage('pileup_iterator').records_out, written, file_size(infile), file_size(outfile))
+print('[INFO]: Minority frequencies written to "%s"' % outfile)
 
-counter = 0
-previous_seg = segs[0]
-outfile = outprefix + '.minority.txt'
-with open(outfile, 'w') as outfh:
-	outfh.write('SEGMENT\tPOS\tBASE\tFREQ\tDEPTH\tMAJORITY\n')	
-	for n in range(len(bases)):
-		if 	segs[n] != previous_seg:
-			counter = 1
-			previous_seg = segs[n]
-		else:
-			counter += 1
-		pos = bases[n]
-		if pos == '':
-			continue
-		total = len(pos)
-		max_base = None
-		max_freq = 0.0
-		freqs = {'A': 0.00, 'C': 0.00, 'G': 0.00, 'T': 0.00, '*': 0.00}
-		# Calculate base frequencies	
-		for base in base_list:
-			f = pos.count(base) / total
-			freqs[base] = f
-			if f > max_freq:
-				max_base = base
-				max_freq = f
-			
-		for base in base_list:
-			if base == max_base:
-				continue
-			elif freqs[base] > f_cutoff and total > depth_cutoff:
-				outfh.write('%s\t%d\t%s\t%.2f\t%d\t%s\n' % (segs[n], counter, base, freqs[base], total, max_base))
-print('[INFO]: Minority frequencies written to "%s"' % outfile)
\ No newline at end of file
+if metrics_file is not None:
+	metrics.write_json(metrics_file)
+	print('[INFO]: Metrics written to "%s"' % metrics_file)
+if profile is True:
+	metrics.profiler.write(outprefix)
+	print('[INFO]: Stage profiles written to "%s.<stage>.pstats" and "%s.<stage>.folded"' % (outprefix, outprefix))
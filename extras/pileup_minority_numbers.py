@@ -26,6 +26,7 @@ import sys, getopt
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR_v6.08/modules/')
 try:
 	from pileup import *
+	from minority import *
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -47,13 +48,14 @@ usage = '''[USAGE]: %s <options>
 -i   [None]\tIllumina ASCII offset (+64) used to encode quality (--illumina)
 -c   [Integer]\tIgnore bases below this Phred score [0] (--cutoff)
 -r   [File]\tReference file to confirm genome size if low coverage (--reference)
+-g   [String]\tOnly process region "segment[:start-end]" (--region)
 -t   [Integer]\tDisplay only those bases with a read depth above this value [0] (--depth)
 -m   [Float]\tMinority value cutoff [0.99] (--minority)
 
 [NOTE]: Options with * are mandatory. All others are optional.''' % prog
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:dr:q:t:m:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "deletions", "reference=", "frequency=", "depth=", "minority="])
+	opts, args = getopt.getopt(sys.argv[1:], "hf:o:ic:dr:q:t:m:g:", ["help", "infile=", "outprefix=", "illumina", "cutoff=", "deletions", "reference=", "frequency=", "depth=", "minority=", "region="])
 except getopt.GetoptError as err:
         # print help information and exit:
 	print(str(err)) # will print something like "option -a not recognized"
@@ -63,6 +65,7 @@ except getopt.GetoptError as err:
 infile = None
 outprefix = None
 reference_file = None
+region = None
 phred_cutoff = 0
 ascii_offset = 33
 cutoff = 0.99
@@ -81,6 +84,8 @@ for o, a in opts:
 		ascii_offset = 64
 	elif o in ("-r", "--reference"):
 		reference_file = a
+	elif o in ("-g", "--region"):
+		region = a
 	elif o in ("-d", "--deletions"):
 		base_list = 'ACGT'
 	elif o in ("-m", "--minority"):
@@ -94,49 +99,30 @@ if infile is None:
 	print('[ERROR]: Input pileup file must be specified with the "-f" flag')
 	sys.exit(2)
 
-with open(infile, 'r') as pileup_fh:
-	print('[INFO]: Parsing "%s"' % infile)
-	if reference_file is not None:
-		with open(reference_file, 'r') as ref_fh:
-			pileup = PileupFile(pileup_fh, ref_fh)
-	else:
-		pileup = PileupFile(pileup_fh)
-		
-try:	
-	bases = pileup.parse_read_bases(phred_cutoff, ascii_offset)
-	segs = pileup.return_reference_names()
+index = None
+if region is not None:
+	try:
+		region = parse_region(region)
+	except ValueError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+	index = load_pileup_index(infile)
+	print('[INFO]: Restricting to %s:%d-%s' % (region[0], region[1], region[2] if region[2] is not None else 'end'))
+
+print('[INFO]: Parsing "%s"' % infile)
+ref_fh = None
+try:
+	with open(infile, 'r') as pileup_fh:
+		if reference_file is not None:
+			ref_fh = open(reference_file, 'r')
+		counted = count_positions(pileup_iterator(pileup_fh, ref_fh, region, index), phred_cutoff, ascii_offset)
+		count, total = majority_fraction(counted, cutoff, base_list)
 except AssertionError as err:
 	print('[ERROR]: %s' % err)
+	sys.exit(1)
+finally:
+	if ref_fh is not None:
+		ref_fh.close()
 
-count = 0
-counter = 0
-previous_seg = segs[0]
-#outfile = outprefix + '.minority.txt'
-#with open(outfile, 'w') as outfh:
-#	outfh.write('SEGMENT\tPOS\tBASE\tFREQ\tDEPTH\tMAJORITY\n')	
-for n in range(len(bases)):
-	if 	segs[n] != previous_seg:
-		counter = 1
-		previous_seg = segs[n]
-	else:
-		counter += 1
-	pos = bases[n]
-	if pos == '':
-		continue
-	total = len(pos)
-	max_base = None
-	max_freq = 0.0
-	freqs = {'A': 0.00, 'C': 0.00, 'G': 0.00, 'T': 0.00, '*': 0.00}
-	# Calculate base frequencies	
-	for base in base_list:
-		f = pos.count(base) / total
-		freqs[base] = f
-		if f > max_freq:
-			max_base = base
-			max_freq = f
-			
-	if max_freq >= 0.99:
-		count = count + 1
-				
-perc = float(count) / len(bases)
+perc = float(count) / total
 print('[INFO]: Genome percentage with major base above cutoff: %.2f' % perc)
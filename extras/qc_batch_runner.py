@@ -0,0 +1,149 @@
+#! /software/bin/python3
+
+'''Takes in a manifest of readsets and runs the quality_control.py QC (and
+optionally the QA graphs) on each sample across a pool of processes. Samples that
+fail in a way a rerun could fix (eg a filesystem error) are retried, and the read counters of every sample are merged into a combined
+summary table for the whole run.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys, getopt
+sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
+try:
+	from qc_batch import *
+except ImportError:
+	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if sys.version_info < (3,0):
+	print("[ERROR]: QUASR requires Python3 to run. Please read 'docs/INSTALL' for more info")
+	sys.exit(1)
+
+if __name__ == "__main__":
+	prog = sys.argv[0]
+
+	examples = '''
+[EG]: %s -f manifest.txt -o outDir/run1 -m 20 -l 50
+[EG]: %s -f manifest.txt -o outDir/run1 -m 30 -l 150 -p 8 -t 2
+[EG]: %s -f manifest.txt -o outDir/run1 -m 25 -l 50 -p 8 -g -a /usr/bin/R''' % (prog, prog, prog)
+
+	usage = '''[USAGE]: %s <options>
+-h   [None]\tDisplay this usage message with examples (--help)
+
+--GENERAL--
+-f * [File]\tManifest of tab-separated "sample, forward[, reverse[, median[, length]]]" lines (--manifest)
+-o * [String]\tOutput directory and file prefix (--outprefix)
+-p   [Integer]\tNumber of samples to process in parallel [1] (--processes)
+-t   [Integer]\tNumber of times to retry a sample failing with a filesystem error [1] (--retries)
+-i   [None]\tIllumina ASCII offset (+64) used to encode quality (--illumina)
+
+--QUALITY CONTROL--
+-m   [Integer]\tMedian quality cutoff for samples without one in the manifest (--median)
+-l   [Integer]\tRead length cutoff for samples without one in the manifest (--length)
+
+--QUALITY-ASSURANCE--
+-g   [None]\tGenerate QA graphs of each output readset (--graphs)
+-a   [File]\tPath to R binary for stats generation and graphing (--path)
+-e   [Integer]\tNumber of bases to graph 3' mean quality dropoff [15] (--end)
+
+[NOTE]: Options with * are mandatory. All others are optional.
+[NOTE]: Outputs are <outprefix>.<sample>.f.fq (and .r.fq if paired), the QC log
+        <outprefix>.<sample>.log and the run summary <outprefix>.summary.txt''' % prog
+
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hf:o:p:t:im:l:ga:e:", ["help", "manifest=", "outprefix=", "processes=", "retries=", "illumina", "median=", "length=", "graphs", "path=", "end="])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(usage)
+		sys.exit(2)
+
+	manifest = None
+	outprefix = None
+	processes = 1
+	median_cutoff = None
+	length_cutoff = None
+	settings = {}
+
+	try:
+		for o, a in opts:
+			if o in ("-h", "--help"):
+				print(usage)
+				print(examples)
+				sys.exit()
+			elif o in ("-f", "--manifest"):
+				manifest = a
+			elif o in ("-o", "--outprefix"):
+				outprefix = a
+			elif o in ("-p", "--processes"):
+				processes = int(a)
+			elif o in ("-t", "--retries"):
+				settings['retries'] = int(a)
+			elif o in ("-i", "--illumina"):
+				settings['ascii_offset'] = 64
+			elif o in ("-m", "--median"):
+				median_cutoff = int(a)
+			elif o in ("-l", "--length"):
+				length_cutoff = int(a)
+			elif o in ("-g", "--graphs"):
+				settings['perform_qa'] = True
+			elif o in ("-a", "--path"):
+				settings['r_path'] = a
+			elif o in ("-e", "--end"):
+				settings['end_length'] = int(a)
+	except ValueError as err:
+		print('[ERROR]: Unable to parse option value: %s' % err)
+		sys.exit(2)
+
+	if len(sys.argv) == 1:
+		print(usage)
+		sys.exit()
+
+	if manifest is None:
+		print('[ERROR]: Manifest file must be specified with the "-f" flag')
+		sys.exit(2)
+	elif outprefix is None:
+		print('[ERROR]: Output directory and file prefix must be specified with the "-o" flag')
+		sys.exit(2)
+	elif settings.get('retries', 1) < 0:
+		print('[ERROR]: Number of retries cannot be negative')
+		sys.exit(2)
+
+	try:
+		with open(manifest, 'r') as manifestfh:
+			samples = parse_manifest(manifestfh, median_cutoff, length_cutoff)
+	except (IOError, RuntimeError) as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+
+	print('[INFO]: Processing %d samples using %d processes' % (len(samples), processes))
+	rows = run_batch(samples, outprefix, processes, **settings)
+	for row in rows:
+		if row[1] == 'OK':
+			print('[INFO]: Sample "%s" processed' % row[0])
+		elif row[1].startswith('FAILED'):
+			print('[ERROR]: Sample "%s" %s after %d attempts' % (row[0], row[1], row[2]))
+		else:
+			print('[WARNING]: Sample "%s" %s' % (row[0], row[1]))
+
+	summaryfile = outprefix + '.summary.txt'
+	with open(summaryfile, 'w') as outfh:
+		write_summary(outfh, rows)
+	failed = len([row for row in rows if row[1].startswith('FAILED')])
+	print('[STATS]: %d samples processed, %d failed' % (len(rows) - failed, failed))
+	print('[INFO]: Summary written to "%s"' % summaryfile)
@@ -0,0 +1,229 @@
+'''Reads SAM and BAM files directly and counts the aligned bases at each reference
+position, giving the same count matrix as PileupFile.count_read_bases() without
+going through samtools pileup. BAM files are decompressed BGZF block by block,
+optionally across several processes.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import re, struct
+from array import array
+from pileup import *
+from bgzf import *
+
+BamSequenceCodes = '=ACMGRSVTWYHKDBN'
+BamCigarCodes = 'MIDNSHP=X'
+SkippedFlags = 0x4 | 0x100 | 0x200 | 0x400 # unmapped, secondary, QC fail and duplicate, as samtools pileup
+_bam_base_pairs = [BamSequenceCodes[b >> 4] + BamSequenceCodes[b & 15] for b in range(256)]
+_base_columns = { base: i for (i, base) in enumerate(PileupFile.CountedBases) }
+
+def bam_records(fh, processes=1):
+	'''Reads a BAM file opened in binary mode. Returns the (name, length) reference
+	list from its header and a generator of alignments, as
+	(reference name, 0-based position, flag, cigar, sequence, qualities) where cigar is
+	a list of (operation, length) and qualities a list of Phred scores or None.
+	'''
+	chunks = bgzf_reader(fh, processes)
+	buffer = bytearray()
+
+	def read(n):
+		# Returns the next n bytes of the decompressed stream, or b'' at its end
+		while len(buffer) < n:
+			chunk = next(chunks, None)
+			if chunk is None:
+				if len(buffer) == 0:
+					return b''
+				raise IOError('Truncated BAM file')
+			buffer.extend(chunk)
+		data = bytes(buffer[:n])
+		del buffer[:n]
+		return data
+
+	if read(4) != b'BAM\x01':
+		raise IOError('Not a BAM file')
+	l_text = struct.unpack('<i', read(4))[0]
+	read(l_text)
+	references = []
+	for r in range(struct.unpack('<i', read(4))[0]):
+		l_name = struct.unpack('<i', read(4))[0]
+		name = read(l_name)[:-1].decode()
+		references.append((name, struct.unpack('<i', read(4))[0]))
+
+	def records():
+		while True:
+			size = read(4)
+			if not size:
+				return
+			record = read(struct.unpack('<i', size)[0])
+			ref_id, pos, l_read_name, mapq, bin, n_cigar, flag, l_seq = struct.unpack('<iiBBHHHi', record[:20])
+			i = 32 + l_read_name
+			cigar = [(BamCigarCodes[c & 15], c >> 4) for c in struct.unpack('<%dI' % n_cigar, record[i:i+4*n_cigar])]
+			i += 4 * n_cigar
+			sequence = ''.join([_bam_base_pairs[b] for b in record[i:i+(l_seq+1)//2]])[:l_seq]
+			i += (l_seq + 1) // 2
+			qualities = record[i:i+l_seq]
+			if l_seq == 0 or qualities[0] == 0xff:
+				qualities = None
+			yield (references[ref_id][0] if ref_id >= 0 else None, pos, flag, cigar, sequence, qualities)
+
+	return (references, records())
+
+def sam_records(fh, ascii_offset=33):
+	'''Reads a SAM file. Returns the same as bam_records(), with the reference list
+	taken from the @SQ header lines.'''
+	references = []
+	line = fh.readline()
+	while line.startswith('@'):
+		if line.startswith('@SQ'):
+			fields = dict([field.split(':', 1) for field in line.rstrip('\r\n').split('\t')[1:] if ':' in field])
+			references.append((fields['SN'], int(fields['LN'])))
+		line = fh.readline()
+
+	def records(line):
+		while line:
+			split_line = line.rstrip('\r\n').split('\t')
+			line = fh.readline()
+			if len(split_line) < 11:
+				continue
+			cigar = [(op, int(length)) for length, op in _cigar_regex.findall(split_line[5])]
+			qualities = None
+			if split_line[10] != '*':
+				qualities = [ord(q) - ascii_offset for q in split_line[10]]
+			yield (split_line[2] if split_line[2] != '*' else None, int(split_line[3]) - 1, int(split_line[1]), cigar, split_line[9], qualities)
+
+	return (references, records(line))
+
+class AlignmentFile:
+	'''An open .sam or .bam file, with its (name, length) reference list as
+	references and a generator of its alignments as records (see bam_records).
+	Closing it, or leaving a with block, closes the file and stops any processes
+	decompressing it.'''
+	
+	def __init__(self, alignment_file, processes=1):
+		if alignment_file.endswith('.bam'):
+			self._fh = open(alignment_file, 'rb')
+		else:
+			self._fh = open(alignment_file, 'r')
+		try:
+			if alignment_file.endswith('.bam'):
+				self.references, self.records = bam_records(self._fh, processes)
+			else:
+				self.references, self.records = sam_records(self._fh)
+		except Exception:
+			self._fh.close()
+			raise
+	
+	def close(self):
+		self.records.close()
+		self._fh.close()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *args):
+		self.close()
+
+# --- END OF CLASS --- #
+
+def open_alignments(alignment_file, processes=1):
+	'''Returns an AlignmentFile for a .sam or .bam file, to be used in a with block'''
+	return AlignmentFile(alignment_file, processes)
+
+def count_alignments(references, records, phred_cutoff=0, reference_fasta=None):
+	'''Walks the CIGAR of each alignment and returns (count columns, pileup depths,
+	segment table, insertions) for the reference segments with reads aligned to them.
+	The count columns and segment table are as from PileupFile and depths count all
+	reads covering a position, including deletions. Deletions are counted as '*' and
+	insertions are counted at the position before them. Positions no read covers count
+	as their reference base (from the IndexedFasta reference_fasta), or 'N'.
+	'''
+	lengths = dict(references)
+	segments = {}
+	for segment, position, flag, cigar, sequence, qualities in records:
+		if flag & SkippedFlags or segment is None or not cigar:
+			continue
+		if segment not in segments:
+			if segment not in lengths:
+				raise ValueError('Reference segment "%s" missing from the header' % segment)
+			size = lengths[segment]
+			segments[segment] = [array('l', [0]) * size for c in range(len(PileupFile.CountedBases) + 3)]
+		counts = segments[segment]
+		columns = counts[:len(PileupFile.CountedBases)]
+		total, depths, insertions = counts[len(PileupFile.CountedBases):]
+		deletions = columns[_base_columns['*']]
+		size = len(depths)
+		sequence = sequence.upper()
+		ref_pos = position
+		read_pos = 0
+		for op, length in cigar:
+			if op in 'MDN=X' and ref_pos + length > size:
+				raise ValueError('Alignment at %s:%d extends beyond the end of the segment (%d)' % (segment, position + 1, size))
+			if op in 'M=X':
+				for i in range(length):
+					p = ref_pos + i
+					depths[p] += 1
+					if qualities is None or qualities[read_pos+i] >= phred_cutoff:
+						total[p] += 1
+						k = _base_columns.get(sequence[read_pos+i])
+						if k is not None:
+							columns[k][p] += 1
+				ref_pos += length
+				read_pos += length
+			elif op == 'D':
+				for p in range(ref_pos, ref_pos + length):
+					depths[p] += 1
+					deletions[p] += 1
+					total[p] += 1
+				ref_pos += length
+			elif op == 'N':
+				ref_pos += length
+			elif op == 'I':
+				if ref_pos > 0:
+					insertions[ref_pos-1] += 1
+				read_pos += length
+			elif op == 'S':
+				read_pos += length
+
+	columns = [array('l') for c in range(len(PileupFile.CountedBases) + 1)]
+	pileup_depths = array('l')
+	insertions = array('l')
+	segment_table = []
+	gap_counts = {}
+	for segment, size in references:
+		if segment not in segments:
+			continue
+		counts = segments.pop(segment)
+		depths = counts[-2]
+		sequence = None
+		if reference_fasta is not None and segment in reference_fasta:
+			sequence = reference_fasta.fetch(segment).upper()
+		for p in range(size): # uncovered positions count as the reference base, as in parse_read_column()
+			if depths[p] == 0:
+				base = sequence[p] if sequence is not None and p < len(sequence) else 'N'
+				if base not in gap_counts:
+					gap_counts[base] = count_bases(base)
+				for n, column in zip(gap_counts[base], counts):
+					column[p] = n
+		segment_table.append((segment, len(pileup_depths), size))
+		for column, segment_column in zip(columns, counts):
+			column.extend(segment_column)
+		pileup_depths.extend(depths)
+		insertions.extend(counts[-1])
+	return (columns, pileup_depths, segment_table, insertions)
+
+_cigar_regex = re.compile('(\\d+)([MIDNSHP=X])')
@@ -0,0 +1,128 @@
+'''Reads and writes BGZF, the blocked gzip format used by BAM files and bgzip. Each
+block is a complete gzip member of at most 64KB, so files can be decompressed in
+parallel and indexed (eg by tabix) by block offset.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct, zlib
+
+BgzfBlockSize = 65280 # uncompressed bytes per block, as bgzip
+BgzfEofBlock = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+class BgzfWriter:
+	'''Writes text to a file opened in binary mode as BGZF blocks, ending with the
+	empty EOF block when closed'''
+	
+	def __init__(self, fh):
+		self._fh = fh
+		self._buffer = bytearray()
+	
+	def write(self, text):
+		self._buffer.extend(text.encode())
+		while len(self._buffer) >= BgzfBlockSize:
+			self._fh.write(bgzf_block(bytes(self._buffer[:BgzfBlockSize])))
+			del self._buffer[:BgzfBlockSize]
+	
+	def close(self):
+		if self._buffer:
+			self._fh.write(bgzf_block(bytes(self._buffer)))
+			self._buffer = bytearray()
+		self._fh.write(BgzfEofBlock)
+		self._fh.close()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *args):
+		self.close()
+
+# --- END OF CLASS --- #
+
+def bgzf_blocks(fh):
+	'''Yields the compressed data, CRC and size of each BGZF block of a file opened in
+	binary mode.'''
+	while True:
+		header = fh.read(12)
+		if not header:
+			return
+		if len(header) < 12 or header[:4] != b'\x1f\x8b\x08\x04':
+			raise IOError('Not a BGZF (BAM) file')
+		xlen = struct.unpack('<H', header[10:12])[0]
+		extra = fh.read(xlen)
+		block_size = None
+		i = 0
+		while i + 4 <= len(extra): # find the BC subfield holding the block size
+			length = struct.unpack('<H', extra[i+2:i+4])[0]
+			if extra[i:i+2] == b'BC':
+				block_size = struct.unpack('<H', extra[i+4:i+6])[0]
+			i += 4 + length
+		if block_size is None:
+			raise IOError('BGZF block without a block size')
+		data = fh.read(block_size - xlen - 11)
+		if len(data) < block_size - xlen - 11:
+			raise IOError('Truncated BGZF block')
+		yield data
+
+def inflate_blocks(blocks):
+	'''Decompresses a list of blocks from bgzf_blocks() into one bytes object'''
+	inflated = []
+	for block in blocks:
+		crc, size = struct.unpack('<II', block[-8:])
+		data = zlib.decompress(block[:-8], -15)
+		if len(data) != size or zlib.crc32(data) & 0xffffffff != crc:
+			raise IOError('Corrupt BGZF block')
+		inflated.append(data)
+	return b''.join(inflated)
+
+def bgzf_reader(fh, processes=1, batch_size=64):
+	'''Yields the decompressed contents of a BGZF file in batches of batch_size blocks.
+	With more than one process, batches are decompressed in parallel, a few batches
+	per process at a time so that memory use stays bounded.'''
+	import multiprocessing
+	blocks = bgzf_blocks(fh)
+	def batches():
+		batch = []
+		for block in blocks:
+			batch.append(block)
+			if len(batch) >= batch_size:
+				yield batch
+				batch = []
+		if batch:
+			yield batch
+	if processes <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+		for batch in batches():
+			yield inflate_blocks(batch)
+		return
+	with multiprocessing.get_context('fork').Pool(processes) as pool:
+		window = []
+		for batch in batches():
+			window.append(batch)
+			if len(window) >= processes * 4:
+				for data in pool.map(inflate_blocks, window):
+					yield data
+				window = []
+		for data in pool.map(inflate_blocks, window):
+			yield data
+
+def bgzf_block(data, level=6):
+	'''Returns data (at most BgzfBlockSize bytes) compressed as one BGZF block'''
+	compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+	compressed = compressor.compress(data) + compressor.flush()
+	return (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + struct.pack('<H', len(compressed) + 25)
+			+ compressed + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data)))
@@ -0,0 +1,104 @@
+'''Checkpoints for long runs over FASTQ files. Every so many reads, the byte offset
+reached in each input, the size of each output and the running counters are saved
+to a JSON file, so that a run that was killed can be resumed: outputs are cut back
+to their size at the checkpoint and reading carries on from the saved offsets.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import json, os
+
+CheckpointInterval = 100000 # reads between checkpoints
+
+class Checkpoint:
+	'''The checkpoint file of a run over the list of inputs with a dictionary of
+	parameters. A checkpoint only resumes a run with the same inputs, unchanged in
+	size and time modified, and the same parameters.'''
+
+	def __init__(self, checkpoint_file, inputs, parameters, every=CheckpointInterval):
+		self.checkpoint_file = checkpoint_file
+		self.inputs = [path for path in inputs if path is not None]
+		self.parameters = json.loads(json.dumps(parameters)) # as it will be read back
+		self.every = every
+		self._saved_at = None
+
+	def _input_states(self):
+		return [[path, os.path.getsize(path), os.stat(path).st_mtime_ns] for path in self.inputs]
+
+	def load(self):
+		'''Returns the state saved by an earlier run, or None if there is no checkpoint.
+		Raises RuntimeError if it was saved by a run with other inputs or parameters.'''
+		if not os.path.exists(self.checkpoint_file):
+			return None
+		with open(self.checkpoint_file, 'r') as infh:
+			try:
+				state = json.load(infh)
+			except ValueError:
+				raise RuntimeError('Checkpoint "%s" is unreadable' % self.checkpoint_file)
+		if state['parameters'] != self.parameters:
+			raise RuntimeError('Checkpoint "%s" was saved by a run with different options' % self.checkpoint_file)
+		if state['inputs'] != self._input_states():
+			raise RuntimeError('Input files have changed since checkpoint "%s" was saved' % self.checkpoint_file)
+		for path, size in state['outputs'].items():
+			if not os.path.exists(path) or os.path.getsize(path) < size:
+				raise RuntimeError('Output "%s" is missing or shorter than at checkpoint "%s"' % (path, self.checkpoint_file))
+		self._saved_at = state['records']
+		return state
+
+	def due(self, records):
+		# True if a checkpoint should be saved after this many reads
+		return records % self.every == 0 and records != self._saved_at and records > 0
+
+	def save(self, records, offsets, outputs, counters):
+		'''Saves the number of reads done, the list of input offsets the next reads start
+		at, the sizes of the list of output file handles (after flushing them to disk)
+		and a dictionary of JSON-serialisable counters'''
+		sizes = {}
+		for outfh in outputs:
+			outfh.flush()
+			os.fsync(outfh.fileno())
+			sizes[outfh.name] = os.fstat(outfh.fileno()).st_size
+		state = {	'records': records, 'inputs': self._input_states(), 'parameters': self.parameters,
+					'offsets': offsets, 'outputs': sizes, 'counters': counters }
+		# Written to a temporary file first so a run killed while saving leaves the last checkpoint intact
+		temporary = self.checkpoint_file + '.tmp'
+		with open(temporary, 'w') as outfh:
+			json.dump(state, outfh, indent=1)
+			outfh.write('\n')
+		os.replace(temporary, self.checkpoint_file)
+		self._saved_at = records
+
+	def remove(self):
+		# Called once the run has finished
+		if os.path.exists(self.checkpoint_file):
+			os.unlink(self.checkpoint_file)
+
+# --- END OF CLASS --- #
+
+def open_outputs(outfiles, state=None):
+	'''Opens the output files for writing. With the state of a checkpoint, each is cut
+	back to its size at the checkpoint and opened for appending instead.'''
+	handles = []
+	for outfile in outfiles:
+		if state is None:
+			handles.append(open(outfile, 'w'))
+		else:
+			with open(outfile, 'r+b') as outfh:
+				outfh.truncate(state['outputs'][outfile])
+			handles.append(open(outfile, 'a'))
+	return handles
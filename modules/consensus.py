@@ -0,0 +1,80 @@
+'''Generates consensus sequences from the base-count matrix of a pileup file
+(see PileupFile.count_read_bases). Counting is done once per pileup, so any
+number of consensus calls can be made from the same counts.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+AmbiguityCodes = { 	'AC': 'M', 'AG': 'R', 'AT': 'W',
+					'CG': 'S', 'CT': 'Y', 'GT': 'K',
+					'ACG': 'V', 'ACT': 'H', 'AGT': 'D',
+					'CGT': 'B', 'ACGT': 'N' }
+
+def _mask_symbols():
+	# The consensus symbol for each bit mask of A (1), C (2), G (4) and T (8)
+	symbols = ['']
+	for mask in range(1, 16):
+		bases = ''.join([base for bit, base in zip((1, 2, 4, 8), 'ACGT') if mask & bit])
+		symbols.append(bases if len(bases) == 1 else AmbiguityCodes.get(bases, 'N'))
+	return symbols
+
+MaskSymbols = _mask_symbols()
+
+def call_consensus(counts, pileup_depths, ambiguity_threshold=0.30, low_depth_cutoff=10, quality_independent=False):
+	'''Takes the count columns from PileupFile.count_read_bases() and the unfiltered
+	pileup depths, and returns the consensus as a list of single characters, one per
+	position. Each rule is applied to whole columns in turn, later rules overriding
+	earlier ones at the positions they apply to.
+	'''
+	a, c, g, t, deletions, depths = counts
+	bases = (a, c, g, t)
+	# Bases above the ambiguity threshold, or if there are none, those tied for the highest count
+	above = [0] * len(depths)
+	for bit, column in zip((1, 2, 4, 8), bases):
+		above = [mask | bit if depth and n / depth > ambiguity_threshold else mask for mask, n, depth in zip(above, column, depths)]
+	peaks = list(map(max, *bases))
+	tied = [0] * len(depths)
+	for bit, column in zip((1, 2, 4, 8), bases):
+		tied = [mask | bit if n == peak else mask for mask, n, peak in zip(tied, column, peaks)]
+	consensus = [MaskSymbols[mask or ties] for mask, ties in zip(above, tied)]
+
+	low = [i for i, depth in enumerate(depths) if 0 < depth < low_depth_cutoff]
+	if quality_independent is True:
+		for i in low:
+			consensus[i] = 'N'
+	else:
+		for i in low:
+			consensus[i] = consensus[i].lower()
+	# If more reads show a deletion than not, consider it as a deletion
+	for i, (n, depth) in enumerate(zip(deletions, depths)):
+		if depth and n / depth > 0.5 and (quality_independent is False or depth >= low_depth_cutoff):
+			consensus[i] = '-'
+	# Bases were present but all failed the quality cutoff (N), or there were none (-)
+	for i, depth in enumerate(depths):
+		if depth == 0:
+			consensus[i] = 'N' if pileup_depths[i] > 0 else '-'
+	return consensus
+
+def split_consensus(consensus, segment_ranges):
+	'''Yields the (segment, sequence) pairs of a consensus from call_consensus()'''
+	for name, start, end in segment_ranges:
+		yield (name, ''.join(consensus[start:end]))
+
+def write_consensus(outfh, consensus, segment_ranges):
+	for name, sequence in split_consensus(consensus, segment_ranges):
+		outfh.write('>%s\n%s\n' % (name, sequence))
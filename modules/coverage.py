@@ -0,0 +1,87 @@
+'''Coverage statistics per segment and per fixed-size window from a per-position
+depth array (eg PileupFile.return_read_depths()). Sums and breadth counts come
+from prefix sums, so any number of windows costs one pass over the depths.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from itertools import accumulate
+
+CoverageColumns = ('LEVEL', 'SEGMENT', 'START', 'END', 'MEAN', 'MEDIAN', 'MIN', 'MAX')
+
+def prefix_sums(values):
+	'''Returns an array where element i is the sum of values[:i]'''
+	sums = array('q', [0])
+	sums.extend(accumulate(values))
+	return sums
+
+def threshold_prefix_sums(depths, threshold):
+	'''Returns the prefix sums of the number of positions with a depth of at least
+	threshold'''
+	return prefix_sums([d >= threshold for d in depths])
+
+def median(values):
+	ordered = sorted(values)
+	n = len(ordered)
+	if n == 0:
+		return 0.0
+	if n % 2 == 1:
+		return float(ordered[n // 2])
+	return (ordered[n // 2 - 1] + ordered[n // 2]) / 2
+
+def coverage_rows(depths, segment_table, window=None, thresholds=(1, 10, 100), first_position=1):
+	'''Yields (level, segment, start, end, mean, median, min, max, breadth, ...) for
+	each segment of a PileupFile segment table and, if window is given, for each
+	window of that many positions within it. Breadths are the fractions of positions
+	with a depth of at least each of thresholds. start and end are 1-based reference
+	positions, counted from first_position.
+	'''
+	sums = prefix_sums(depths)
+	breadths = [threshold_prefix_sums(depths, t) for t in thresholds]
+
+	def row(level, name, offset, start, end):
+		# start and end are indices into depths
+		n = end - start
+		values = depths[start:end]
+		return (level, name, start - offset + first_position, end - offset + first_position - 1,
+				(sums[end] - sums[start]) / n, median(values), min(values), max(values)) + tuple([(b[end] - b[start]) / n for b in breadths])
+
+	for name, offset, length in segment_table:
+		if length == 0:
+			continue
+		yield row('segment', name, offset, offset, offset + length)
+		if window is not None:
+			for start in range(offset, offset + length, window):
+				yield row('window', name, offset, start, min(start + window, offset + length))
+
+def write_coverage(outfh, rows, thresholds=(1, 10, 100)):
+	'''Writes rows from coverage_rows() as a tab-separated table with a header.
+	Returns the number of rows written.'''
+	outfh.write('\t'.join(CoverageColumns + tuple(['BREADTH_%d' % t for t in thresholds])) + '\n')
+	row_format = '%s\t%s\t%d\t%d\t%.2f\t%.1f\t%d\t%d' + '\t%.4f' * len(thresholds) + '\n'
+	written = 0
+	batch = []
+	for r in rows:
+		batch.append(row_format % r)
+		if len(batch) >= 10000:
+			outfh.write(''.join(batch))
+			written += len(batch)
+			batch = []
+	outfh.write(''.join(batch))
+	return written + len(batch)
@@ -0,0 +1,96 @@
+'''Counted, rate-limited reporting of malformed reads. Each error is counted under
+its class (e.g. a length mismatch), only the first few of each class are printed and
+the rest are summarised at the end, so that a badly corrupted file doesn't flood the
+output. Rejected reads can also be written to a tab-separated sidecar file.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import atexit
+
+ErrorExamples = 10 # errors of each class printed before the rest are only counted
+
+class ErrorReport:
+	'''Counts errors by class and prints the first max_examples of each. With
+	rejected_file, each rejected read is written to it as a line of error class,
+	header, sequence, quality and message, separated by tabs.'''
+
+	def __init__(self, max_examples=ErrorExamples, rejected_file=None):
+		self.max_examples = max_examples
+		self.rejected_file = rejected_file
+		self.counts = {}
+		self._rejected = None
+		self._rejected_size = None
+
+	def error(self, error_class, message, header=None, sequence=None, quality=None):
+		'''Counts an error of the class, printing message if it is among the first
+		max_examples of its class, and writes the read to the rejected-reads file'''
+		count = self.counts.get(error_class, 0) + 1
+		self.counts[error_class] = count
+		if count <= self.max_examples:
+			print('[ERROR]: %s' % message)
+		if self.rejected_file is not None and header is not None:
+			self.rejected().write('%s\t%s\t%s\t%s\t%s\n' % (error_class, header, sequence or '', quality or '', message))
+
+	def rejected(self):
+		# The rejected-reads file handle, opened on the first rejected read
+		if self._rejected is None:
+			if self._rejected_size is None:
+				self._rejected = open(self.rejected_file, 'w')
+			else:
+				with open(self.rejected_file, 'r+b') as outfh:
+					outfh.truncate(self._rejected_size)
+				self._rejected = open(self.rejected_file, 'a')
+		return self._rejected
+
+	def outputs(self):
+		'''Returns the list of open file handles, for a checkpoint to record'''
+		return [self._rejected] if self._rejected is not None else []
+
+	def resume(self, state):
+		'''Carries on from the counts and rejected-reads file size saved in the state of
+		a checkpoint (see checkpoint.py)'''
+		self.counts = dict(state['counters'].get('errors', {}))
+		if self.rejected_file is not None and self.rejected_file in state['outputs']:
+			self._rejected_size = state['outputs'][self.rejected_file]
+
+	def summary(self):
+		'''Prints the number of errors of each class that weren't shown, and starts
+		counting afresh for the next stage'''
+		for error_class in sorted(self.counts):
+			hidden = self.counts[error_class] - self.max_examples
+			if hidden > 0:
+				print('[ERROR]: %d more "%s" errors not shown (%d in total)' % (hidden, error_class, self.counts[error_class]))
+		if self.counts and self._rejected is not None:
+			self._rejected.flush()
+			print('[INFO]: Rejected reads written to "%s"' % self.rejected_file)
+		self.counts = {}
+
+	def close(self):
+		if self._rejected is not None:
+			self._rejected.close()
+			self._rejected = None
+
+# --- END OF CLASS --- #
+
+DefaultReport = ErrorReport()
+atexit.register(DefaultReport.summary)
+
+def report(errors=None):
+	'''Returns errors, or the shared report used when the caller doesn't give one'''
+	return errors if errors is not None else DefaultReport
@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
 
+import os, mmap
+
 class FastaRecord:	
 	
 	AcceptedBases = 'ACGTUNMRWSYKVHDBN-'
@@ -59,17 +61,177 @@ class FastaRecord:
 		
 # --- END OF CLASS --- #
 
+class IndexedFasta:
+	'''Random access to the sequences of a FASTA file through its .fai index, which
+	is read if it is newer than the FASTA file and built (and saved if possible)
+	otherwise. Bases are read from a memory map of the file, so sequences are not
+	held in memory. Sequences are named by the first word of their header, as in
+	samtools. Files that can't be indexed, or handles without a file behind them,
+	are read into memory instead. close() (or leaving a with block) releases the
+	file and memory map, which are opened again if more bases are fetched.
+	'''
+	
+	def __init__(self, fasta):
+		self._fh = None
+		self._map = None
+		self._file = None
+		self._sequences = None
+		self._index = {}
+		self.lengths = {}
+		fasta_file = fasta if isinstance(fasta, str) else getattr(fasta, 'name', None)
+		entries = None
+		if isinstance(fasta_file, str) and os.path.isfile(fasta_file):
+			entries = self._load_index(fasta_file)
+		if entries is None:
+			if isinstance(fasta, str):
+				with open(fasta, 'r') as fh:
+					self._read_sequences(fh)
+			else:
+				self._read_sequences(fasta)
+			return
+		for entry in entries:
+			self._index[entry[0]] = entry
+			self.lengths[entry[0]] = entry[1]
+		self._file = fasta_file
+		self._open()
+	
+	def _open(self):
+		self._fh = open(self._file, 'rb')
+		if os.path.getsize(self._file) > 0:
+			self._map = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+	
+	def _load_index(self, fasta_file):
+		index_file = fasta_file + FastaIndexSuffix
+		if os.path.isfile(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(fasta_file):
+			with open(index_file, 'r') as infh:
+				return read_fasta_index(infh)
+		try:
+			with open(fasta_file, 'rb') as fh:
+				entries = build_fasta_index(fh)
+		except ValueError:
+			return None
+		try:
+			with open(index_file, 'w') as outfh:
+				write_fasta_index(outfh, entries)
+		except IOError:
+			pass # the index is only kept for next time
+		return entries
+	
+	def _read_sequences(self, fh):
+		self._sequences = {}
+		for header, sequence in fasta_iterator(fh):
+			name = header.split()[0] if header.split() else ''
+			self._sequences[name] = sequence
+			self.lengths[name] = len(sequence)
+	
+	def __contains__(self, name):
+		return name in self.lengths
+	
+	def get_names(self):
+		return list(self.lengths)
+	
+	def get_length(self, name):
+		return self.lengths[name]
+	
+	def fetch(self, name, start=1, end=None):
+		'''Returns bases start to end (1-based, inclusive) of a sequence'''
+		length = self.lengths[name]
+		if end is None or end > length:
+			end = length
+		if start < 1:
+			start = 1
+		if start > end:
+			return ''
+		if self._sequences is not None:
+			return self._sequences[name][start-1:end]
+		if self._fh is None:
+			self._open()
+		name, length, offset, line_bases, line_width = self._index[name]
+		first = offset + (start - 1) // line_bases * line_width + (start - 1) % line_bases
+		last = offset + (end - 1) // line_bases * line_width + (end - 1) % line_bases
+		return b''.join(self._map[first:last+1].split()).decode()
+	
+	def get_base(self, name, position):
+		return self.fetch(name, position, position)
+	
+	def close(self):
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+		if self._fh is not None:
+			self._fh.close()
+			self._fh = None
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *args):
+		self.close()
+		
+# --- END OF CLASS --- #
+
 def fasta_iterator(fh):
 	while True:
 		line = fh.readline()
+		if not line: return
 		if line[0] == '>': break
 	while True:
 		header = line[1:-1].rstrip()
-		sequence = fh.readline().rstrip()
+		lines = [fh.readline().rstrip()]
 		while True:
 			line = fh.readline()
 			if not line: break
 			if line.startswith('>'): break
-			sequence += line.rstrip()
-		yield(header, sequence)
-		if not line: return
\ No newline at end of file
+			lines.append(line.rstrip())
+		yield(header, ''.join(lines))
+		if not line: return
+
+FastaIndexSuffix = '.fai'
+
+def build_fasta_index(fh):
+	'''Returns a samtools faidx-compatible index of a FASTA file opened in binary mode,
+	as a list of (name, length, offset, bases per line, bytes per line). Raises a
+	ValueError if a sequence has lines of different lengths and can't be indexed.
+	'''
+	index = []
+	entry = None
+	offset = 0
+	last_line = False # a line shorter than the first has been seen in this sequence
+	for line in fh:
+		offset += len(line)
+		if line.startswith(b'>'):
+			if entry is not None:
+				index.append(tuple(entry))
+			entry = [line[1:].split()[0].decode() if line[1:].split() else '', 0, offset, 0, 0]
+			last_line = False
+			continue
+		if entry is None:
+			continue
+		bases = len(line.rstrip())
+		if bases == 0:
+			last_line = True # blank lines are only allowed at the end of a sequence
+			continue
+		if entry[3] == 0:
+			entry[3] = bases
+			entry[4] = len(line)
+		elif last_line or bases > entry[3] or (bases == entry[3] and len(line) != entry[4] and line.endswith(b'\n')):
+			raise ValueError('Sequence "%s" has lines of different lengths' % entry[0])
+		if bases < entry[3]:
+			last_line = True
+		entry[1] += bases
+	if entry is not None:
+		index.append(tuple(entry))
+	return index
+
+def write_fasta_index(outfh, index):
+	for entry in index:
+		outfh.write('%s\t%d\t%d\t%d\t%d\n' % entry)
+
+def read_fasta_index(infh):
+	index = []
+	for line in infh:
+		split_line = line.rstrip('\r\n').split('\t')
+		if len(split_line) < 5:
+			raise ValueError('Incorrect formatting in FASTA index line: "%s"' % line.rstrip())
+		index.append((split_line[0],) + tuple([int(c) for c in split_line[1:5]]))
+	return index
@@ -16,6 +16,7 @@
 # along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
 
 from fasta import *
+from error_report import report
 
 class FastqRecord(FastaRecord):
 	
@@ -104,8 +105,10 @@ def convert_phred_to_ascii(phred_scores, ascii_offset=33):
 		output = [reverse_ascii_table.get(phred+ascii_offset, '!') for phred in phred_scores]
 		return ''.join([ascii for ascii in output])
 		
-def fastq_iterator(filehandle):
+def fastq_iterator(filehandle, errors=None):
 	#Generator taken from BioPython. Yields the header, sequence and quality for a record'''
+	# Records with mismatched lengths are reported to the ErrorReport errors
+	errors = report(errors)
 	while True:
 		line = filehandle.readline()
 		if line[0] == '@': break
@@ -126,8 +129,61 @@ def fastq_iterator(filehandle):
 				if len(quality) >= sequence_length: break
 			quality += line.rstrip()
 		if len(quality) != sequence_length:
-			print('[ERROR]: Length mismatch in quality and base sequence for \"%s\". Record ignored.' % header)
+			errors.error('length_mismatch', 'Length mismatch in quality and base sequence for \"%s\". Record ignored.' % header, header, sequence, quality)
 			if not line: return
 			else: continue
 		yield (header, sequence, quality)
 		if not line: return
+
+def fastq_records(filehandle, errors=None):
+	'''Generator of FastqRecords from a FASTQ file handle. Reads that can't be made
+	into records are counted in the ErrorReport errors and skipped.'''
+	errors = report(errors)
+	for header, sequence, quality in fastq_iterator(filehandle, errors):
+		try:
+			read = FastqRecord(header, sequence, quality)
+		except IOError as err:
+			errors.error('invalid_read', 'Unable to handle "%s": %s' % (header, err), header, sequence, quality)
+			continue
+		yield read
+
+def fastq_offset_iterator(filehandle, offset=0, errors=None):
+	'''As fastq_iterator(), for a file opened in binary mode and starting from the byte
+	offset given. Each record also comes with the offset the next record starts at,
+	so that a later run can carry on from just after it.'''
+	errors = report(errors)
+	filehandle.seek(offset)
+	position = offset
+	while True:
+		line = filehandle.readline()
+		position += len(line)
+		if not line: return
+		if line[:1] == b'@': break
+	while True:
+		header = line[1:].rstrip().decode()
+		line = filehandle.readline()
+		position += len(line)
+		sequence = line.rstrip()
+		while True:
+			line = filehandle.readline()
+			position += len(line)
+			if not line or line[:1] == b'+': break
+			else: sequence += line.rstrip()
+		sequence_length = len(sequence)
+		line = filehandle.readline()
+		position += len(line)
+		quality = line.rstrip()
+		while True:
+			next_record = position
+			line = filehandle.readline()
+			position += len(line)
+			if not line: break
+			if line[:1] == b'@':
+				if len(quality) >= sequence_length: break
+			quality += line.rstrip()
+		if len(quality) != sequence_length:
+			errors.error('length_mismatch', 'Length mismatch in quality and base sequence for \"%s\". Record ignored.' % header, header, sequence.decode(), quality.decode())
+			if not line: return
+			else: continue
+		yield (header, sequence.decode(), quality.decode(), next_record)
+		if not line: return
@@ -0,0 +1,72 @@
+'''Read filters of the extras scripts, over iterables of FastqRecords: removal of
+reads with N's (fastq_remove_Ns.py) and of duplicate reads or read pairs
+(fastq_duplicate_remover.py).
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+def trim_N(read):
+	'''Returns a FastqRecord with no N unchanged and one with a single N trimmed to
+	the longer side of it, or None if it has more than one N'''
+	count = read.sequence.count('N')
+	if count == 0:
+		return read
+	elif count > 1:
+		return None
+	index = read.sequence.find('N')
+	length = read.get_sequence_length()
+	# If N is towards end then keep beginning of read, otherwise the end of it
+	if index > length - index - 1:
+		read.remove_bases(index, length)
+	else:
+		read.remove_bases(0, index + 1)
+	return read
+
+def remove_Ns(reads, counts=None):
+	'''Generator of the FastqRecords reads trimmed by trim_N(), dropping those with
+	more than one N. Dropped reads are counted in the counts dictionary as failed.'''
+	if counts is None:
+		counts = {}
+	for read in reads:
+		read = trim_N(read)
+		if read is None:
+			counts['failed'] = counts.get('failed', 0) + 1
+			continue
+		yield read
+
+def unique_reads(reads, ascii_offset=33):
+	'''Returns a list of the FastqRecords reads with one read for each sequence, that
+	of the highest mean quality (the first if tied), in the order first seen'''
+	unique_seqs = {}
+	for read in reads:
+		mean_qual = read.calculate_mean_quality(ascii_offset=ascii_offset)
+		sequence = read.get_sequence()
+		if sequence not in unique_seqs or mean_qual > unique_seqs[sequence][1]:
+			unique_seqs[sequence] = (read, mean_qual)
+	return [read for read, mean_qual in unique_seqs.values()]
+
+def unique_pairs(pairs, ascii_offset=33):
+	'''As unique_reads(), for (forward, reverse) FastqRecord pairs, keeping one pair for
+	each forward and reverse sequence by the mean of their mean qualities'''
+	unique_seqs = {}
+	for forward, reverse in pairs:
+		mean_qual = (forward.calculate_mean_quality(ascii_offset=ascii_offset) + reverse.calculate_mean_quality(ascii_offset=ascii_offset))/2
+		sequence = forward.get_sequence() + reverse.get_sequence()
+		if sequence not in unique_seqs or mean_qual > unique_seqs[sequence][2]:
+			unique_seqs[sequence] = (forward, reverse, mean_qual)
+	return [(forward, reverse) for forward, reverse, mean_qual in unique_seqs.values()]
@@ -53,32 +53,45 @@ def parse_primerfile_to_regex(primerfh):
 			print('[WARN]: Unable to parse primer sequence from "%s"' % line)
 	return primers_regex
 	
-def main(infile, outprefix, primerfile):
+def trim_primers(record, primers, primers_count):
+	'''Removes the first of primers (from parse_primerfile_to_regex) found within 4
+	bases of either end of a FastqRecord, along with everything beyond it, and counts
+	it in primers_count. Returns the record.'''
+	sequence = record.get_sequence()
+	length = record.get_sequence_length()
+	for p in primers:
+		primer = p[0]
+		original = p[1]
+		match = re.search(primer, sequence)
+		if match:
+			dist_from_end = length - match.end()
+			if dist_from_end+1 < match.start():
+				if dist_from_end <= 4:
+					record.remove_bases(match.start(), length-1)
+					primers_count[original] = primers_count.get(original, 0) + 1
+					break
+			else:
+				if match.start() <= 4:
+					record.remove_bases(0, match.end())
+					primers_count[original] = primers_count.get(original, 0) + 1
+					break
+	return record
+
+def remove_primers(reads, primers, primers_count):
+	'''Generator of the FastqRecords reads with primers removed by trim_primers(),
+	counting them in primers_count. Reads with no bases left are dropped.'''
+	for read in reads:
+		read = trim_primers(read, primers, primers_count)
+		if read.get_sequence_length() > 0:
+			yield read
+
+def main(infile, outprefix, primerfile, errors=None):
 	outfile = outprefix + '.trim.fq'
 	with open(infile, 'r') as infh, open(outfile, 'w') as outfh, open(primerfile, 'r') as primerfh:
 		primers = parse_primerfile_to_regex(primerfh)
 		primers_count = {}
-		for header, sequence, quality in fastq_iterator(infh):
-			record = FastqRecord(header, sequence, quality)
-			length = record.get_sequence_length()
-			for p in primers:
-				primer = p[0]
-				original = p[1]
-				match = re.search(primer, sequence)
-				if match:
-					dist_from_end = length - match.end()
-					if dist_from_end+1 < match.start():
-						if dist_from_end <= 4:
-							record.remove_bases(match.start(), length-1)
-							primers_count[original] = primers_count.get(original, 0) + 1
-							break
-					else:
-						if match.start() <= 4:
-							record.remove_bases(0, match.end())
-							primers_count[original] = primers_count.get(original, 0) + 1
-							break
-			if record.get_sequence_length() > 0:
-				record.write_to_file(outfh)
+		for record in remove_primers(fastq_records(infh, errors), primers, primers_count):
+			record.write_to_file(outfh)
 			
 	for key, value in primers_count.items():
 		print('[INFO]: "%s" removed from %d sequences in %s' % (key, value, infile))
@@ -0,0 +1,171 @@
+'''Records the wall time, CPU time, records in and out, bytes read and written and
+peak memory of each stage of a run, and writes them to a JSON metrics file that
+can be compared across runs.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import json, os, sys, time
+try:
+	import resource
+except ImportError: # not available on Windows
+	resource = None
+
+class Stage:
+	'''Metrics of one stage. Times are summed over every start()/stop() pair (or "with"
+	block) on the stage, so a stage can be timed in pieces, as the streaming
+	readset_parser.py stages are. peak_rss is the peak of the process as a whole when
+	the stage last finished. If given a profiling.StageProfiler, the stage is also
+	profiled while it runs.'''
+
+	def __init__(self, name, profiler=None):
+		self.name = name
+		self.profiler = profiler
+		self.calls = 0
+		self.wall_time = 0.0
+		self.cpu_time = 0.0
+		self.records_in = 0
+		self.records_out = 0
+		self.bytes_read = 0
+		self.bytes_written = 0
+		self.peak_rss = None
+		self._started = None
+
+	def start(self):
+		self._started = (time.perf_counter(), time.process_time())
+		if self.profiler is not None:
+			self.profiler.enter(self.name)
+		return self
+
+	def stop(self, sample_memory=True):
+		if self.profiler is not None:
+			self.profiler.exit(self.name)
+		wall, cpu = self._started
+		self.wall_time += time.perf_counter() - wall
+		self.cpu_time += time.process_time() - cpu
+		self.calls += 1
+		if sample_memory is True:
+			self.peak_rss = peak_rss()
+		return self
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+		return False
+
+	def count(self, records_in=0, records_out=0, bytes_read=0, bytes_written=0):
+		self.records_in += records_in
+		self.records_out += records_out
+		self.bytes_read += bytes_read
+		self.bytes_written += bytes_written
+
+	def as_dict(self):
+		if self.peak_rss is None and self.calls > 0:
+			self.peak_rss = peak_rss()
+		return {	'stage': self.name, 'calls': self.calls,
+					'wall_time': round(self.wall_time, 6), 'cpu_time': round(self.cpu_time, 6),
+					'records_in': self.records_in, 'records_out': self.records_out,
+					'records_per_second': round(self.records_in / self.wall_time, 2) if self.wall_time > 0 else None,
+					'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written,
+					'peak_rss_kb': self.peak_rss }
+
+# --- END OF CLASS --- #
+
+class Metrics:
+	'''The stages of one run, in the order they were created'''
+
+	def __init__(self, program=None, profiler=None):
+		self.program = program if program is not None else os.path.basename(sys.argv[0])
+		self.profiler = profiler
+		self.stages = []
+		self._names = {}
+		self._started = (time.time(), time.perf_counter(), time.process_time())
+
+	def stage(self, name):
+		'''Returns the Stage called name, creating it the first time'''
+		if name not in self._names:
+			self._names[name] = Stage(name, self.profiler)
+			self.stages.append(self._names[name])
+		return self._names[name]
+
+	def timed_stage(self, name, stage_function):
+		'''Wraps a readset_pipeline stage, timing it and counting the reads passing
+		through it'''
+		stage = self.stage(name)
+		def timed(batch):
+			with stage:
+				output = stage_function(batch)
+			stage.count(len(batch), len(output))
+			return output
+		return timed
+
+	def timed_records(self, name, records):
+		'''Generator passing on records, timing the work of producing each one'''
+		stage = self.stage(name)
+		records = iter(records)
+		while True:
+			stage.start()
+			record = next(records, None)
+			stage.stop(sample_memory=False)
+			if record is None:
+				stage.peak_rss = peak_rss()
+				return
+			stage.count(1, 1)
+			yield record
+
+	def timed_call(self, name, function):
+		'''Wraps a function taking one record, timing it and counting its calls'''
+		stage = self.stage(name)
+		def timed(record):
+			stage.start()
+			output = function(record)
+			stage.stop(sample_memory=False)
+			stage.count(records_in=1)
+			return output
+		return timed
+
+	def as_dict(self):
+		started, wall, cpu = self._started
+		return {	'program': self.program, 'arguments': sys.argv[1:],
+					'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+					'wall_time': round(time.perf_counter() - wall, 6), 'cpu_time': round(time.process_time() - cpu, 6),
+					'peak_rss_kb': peak_rss(), 'stages': [stage.as_dict() for stage in self.stages] }
+
+	def write_json(self, outfile):
+		with open(outfile, 'w') as outfh:
+			json.dump(self.as_dict(), outfh, indent=1)
+			outfh.write('\n')
+
+# --- END OF CLASS --- #
+
+def peak_rss():
+	'''Returns the peak resident set size of the process so far in kB, or None'''
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin': # reported in bytes rather than kB
+		peak //= 1024
+	return peak
+
+def file_size(path):
+	# Size of a file in bytes, or 0 if it doesn't exist
+	if path is None or not os.path.exists(path):
+		return 0
+	return os.path.getsize(path)
@@ -0,0 +1,148 @@
+'''Calls minority bases from a stream of pileup positions (see pileup_iterator).
+Frequencies are calculated from per-position base counts, so only one position
+is held in memory at a time and rows are written to file in large batches.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from pileup import *
+
+def majority_base(counts, base_list='ACGT*'):
+	'''Returns the most frequent of base_list and its count from a count_bases() tuple.
+	Ties go to the base listed first. If no bases are counted, returns (None, 0)'''
+	max_base = None
+	max_count = 0
+	for base in base_list:
+		n = counts[PileupFile.CountedBases.index(base)]
+		if n > max_count:
+			max_base = base
+			max_count = n
+	return (max_base, max_count)
+
+def count_positions(positions, phred_cutoff=0, ascii_offset=33, stranded=False, batch_size=10000):
+	'''Takes the positions yielded by pileup_iterator() and yields
+	(segment, position, count_bases() tuple) for each. If stranded, the
+	count_strand_bases() tuples from the same parse are added to each row. Bases are
+	counted batch_size positions at a time (see count_base_columns).'''
+	batch = []
+	bases_list = []
+	for segment, position, reference_base, depth, reads, qualities in positions:
+		batch.append((segment, position))
+		bases_list.append(parse_read_column(reads, qualities, reference_base, phred_cutoff, ascii_offset, position, stranded, segment))
+		if len(batch) >= batch_size:
+			for row in _counted_rows(batch, bases_list, stranded):
+				yield row
+			batch = []
+			bases_list = []
+	for row in _counted_rows(batch, bases_list, stranded):
+		yield row
+
+def _counted_rows(batch, bases_list, stranded):
+	# The count_positions() rows of a batch of (segment, position) and their parsed bases
+	counts = zip(*count_base_columns(bases_list))
+	if stranded:
+		forward, reverse = count_strand_columns(bases_list)
+		return [(segment, position, n, strands) for (segment, position), n, strands in zip(batch, counts, zip(zip(*forward), zip(*reverse)))]
+	return [(segment, position, n) for (segment, position), n in zip(batch, counts)]
+
+def strand_bias(forward, reverse, other_forward, other_reverse):
+	'''Returns the two-sided Fisher's exact test p-value for a base being found on one
+	strand more often than another base (eg the majority base) at the same position'''
+	def log_choose(n, k):
+		return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+	row = forward + reverse
+	column = forward + other_forward
+	total = row + other_forward + other_reverse
+	if row == 0 or column == 0 or row == total or column == total:
+		return 1.0
+	def log_p(x):
+		return log_choose(row, x) + log_choose(total - row, column - x) - log_choose(total, column)
+	observed = log_p(forward)
+	p = 0.0
+	for x in range(max(0, column + row - total), min(row, column) + 1):
+		lp = log_p(x)
+		if lp <= observed + 1e-7:
+			p += math.exp(lp)
+	return min(p, 1.0)
+
+def call_position(counts, frequency_cutoff=0.05, depth_cutoff=0, base_list='ACGT*'):
+	'''Returns a (base, frequency, depth, majority base) tuple for every non-majority
+	base in a count_bases() tuple with a frequency above frequency_cutoff. Nothing is
+	called at positions with depth_cutoff bases or fewer.
+	'''
+	total = counts[-1]
+	if total == 0 or total <= depth_cutoff:
+		return []
+	max_base = majority_base(counts, base_list)[0]
+	calls = []
+	for base in base_list:
+		if base == max_base:
+			continue
+		f = counts[PileupFile.CountedBases.index(base)] / total
+		if f > frequency_cutoff:
+			calls.append((base, f, total, max_base))
+	return calls
+
+def call_minorities(counted, frequency_cutoff=0.05, depth_cutoff=0, base_list='ACGT*'):
+	'''Takes the rows yielded by count_positions() and yields a
+	(segment, position, base, frequency, depth, majority base) tuple for every
+	minority base (see call_position). Rows with strand counts add the forward and
+	reverse counts of the base and its strand_bias() against the majority base.
+	'''
+	for row in counted:
+		segment, position, counts = row[:3]
+		for call in call_position(counts, frequency_cutoff, depth_cutoff, base_list):
+			if len(row) > 3:
+				forward, reverse = row[3]
+				i = PileupFile.CountedBases.index(call[0])
+				j = PileupFile.CountedBases.index(call[3])
+				call += (forward[i], reverse[i], strand_bias(forward[i], reverse[i], forward[j], reverse[j]))
+			yield (segment, position) + call
+
+def majority_fraction(counted, cutoff=0.99, base_list='ACGT*'):
+	'''Takes the rows yielded by count_positions() and returns the number of positions
+	whose majority base has a frequency of at least cutoff, and the total number of
+	positions'''
+	above = 0
+	total = 0
+	for row in counted:
+		counts = row[2]
+		total += 1
+		if counts[-1] > 0 and majority_base(counts, base_list)[1] / counts[-1] >= cutoff:
+			above += 1
+	return (above, total)
+
+def write_minorities(outfh, calls, batch_size=10000):
+	'''Writes minority calls as tab-separated rows, batch_size rows per write.
+	Returns the number of rows written.'''
+	written = 0
+	batch = []
+	for call in calls:
+		if len(call) > 6:
+			batch.append('%s\t%d\t%s\t%.2f\t%d\t%s\t%d\t%d\t%.4g\n' % call)
+		else:
+			batch.append('%s\t%d\t%s\t%.2f\t%d\t%s\n' % call)
+		if len(batch) >= batch_size:
+			outfh.write(''.join(batch))
+			written += len(batch)
+			batch = []
+	if batch:
+		outfh.write(''.join(batch))
+		written += len(batch)
+	return written
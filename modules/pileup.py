@@ -19,7 +19,9 @@ into separate instance variables to allow for easier manipulation
 # You should have received a copy of the GNU General Public License
 # along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
 
-import sys 
+import sys, re
+from array import array
+from itertools import repeat
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
 from fasta import *
 
@@ -49,13 +51,17 @@ class PileupFile:
 					'u':117, 'v':118, 'w':119, 'x':120,
 					'y':121, 'z':122, '{':123, '|':124,
 				 	'}':125, '~':126 }
-	
+
+	CountedBases = 'ACGT*'
+
 	@classmethod
 	def _convert_ascii_to_phred(cls, qualities, ascii_offset=33):
 		return [PileupFile.AsciiTable[q]-ascii_offset for q in qualities]
 	
-	def __init__(self, pileup_fh, reference_fh=None):
-		self._reference_name = []
+	def __init__(self, pileup_fh, reference_fh=None, region=None, index=None):
+		# Per-position columns are only stored for positions present in the pileup.
+		# Uncovered positions are kept as runs and only expanded when asked for.
+		# If a region is given (see parse_region), only that part of the pileup is read.
 		self._reference_base = []
 		self._consensus_base = []
 		self._consensus_quality = []
@@ -64,142 +70,410 @@ class PileupFile:
 		self._read_depth = []
 		self._read_bases = []
 		self._read_qualities = []
+		self._runs = [] # [segment, first position, length, index of first covered position or None if uncovered]
+		self._segments = [] # (segment, offset of first position, length)
+		self._segment_index = {}
 		self._reference_sizes = {} # this contains reference segment sizes only for comparison
-		self._reference_seqs = {}
+		self._reference = None # IndexedFasta, only read for the bases of uncovered positions
 		
 		if reference_fh is not None:
-			for header, sequence in fasta_iterator(reference_fh):
-				self._reference_sizes[header] = len(sequence)
-				self._reference_seqs[header] = sequence
+			self._reference = IndexedFasta(reference_fh)
+			self._reference_sizes = self._reference.lengths
+			self._reference.close() # reopened by parse_read_bases() if it is needed
 		
-		count = 0
-		segment = None
-		for line in pileup_fh:
-			if len(line) == 0:
+		if region is not None:
+			pileup_fh = region_lines(pileup_fh, region, index)
+		for segment, position, length, columns in _pileup_runs(pileup_fh, self._reference_sizes, region):
+			if columns is None:
+				self._runs.append([segment, position, length, None])
 				continue
-			split_line = line.split()
-			if split_line[2] == '*':
-				continue
-			if split_line[0] != segment:
-				if reference_fh is not None and segment is not None:
-					if count != self._reference_sizes[segment]:
-						assert self._reference_sizes[segment] > count, 'Internal counter (%d) greater than reference position counter (%d) for %s' % (count, ref_pos, segment)
-						while count < self._reference_sizes[segment]:
-							count += 1
-							self._reference_name.append(segment)
-							self._reference_base.append(self._reference_seqs[segment][count-1])
-							self._consensus_base.append('-')
-							self._consensus_quality.append(0)
-							self._snp_quality.append(0)
-							self._mapping_quality.append(0)
-							self._read_depth.append(0)
-							self._read_bases.append('')
-							self._read_qualities.append('')
-				count = 1
+			last = self._runs[-1] if self._runs else None
+			if last is not None and last[3] is not None and last[0] == segment and last[1] + last[2] == position:
+				last[2] += 1
 			else:
-				count += 1
-			segment = split_line[0]
-			ref_pos = int(split_line[1])
-			if ref_pos != count:
-				assert ref_pos > count, 'Internal counter (%d) greater than reference position counter (%d) for %s' % (count, ref_pos, segment)
-				while count < ref_pos:
-					self._reference_name.append(segment)
-					self._reference_base.append(self._reference_seqs[segment][count-1])
-					self._consensus_base.append('-')
-					self._consensus_quality.append(0)
-					self._snp_quality.append(0)
-					self._mapping_quality.append(0)
-					self._read_depth.append(0)
-					self._read_bases.append('')
-					self._read_qualities.append('')
-					count += 1
-
-			self._reference_name.append(split_line[0])
-			self._reference_base.append(split_line[2].upper())
-			columns = len(split_line)
-			if columns == 10 or columns == 11: # -c flag or -c/-s flags
-				self._consensus_base.append(split_line[3])
-				self._consensus_quality.append(split_line[4]) # Phred-scaled
-				self._snp_quality.append(split_line[5]) # Phred-scaled probability of consensus being identical to the reference
-				self._mapping_quality.append(split_line[6]) # RMS mapping quality
-				self._read_depth.append(int(split_line[7]))
-				self._read_bases.append(split_line[8])
-				self._read_qualities.append(split_line[9])
-				# Ignore last column which is mapping quality per base
-			elif columns == 6 or columns == 7: # -s flag or neither
-				self._read_depth.append(int(split_line[3]))
-				self._read_bases.append(split_line[4])
-				self._read_qualities.append(split_line[5])
-			elif columns == 4 and int(split_line[3]) == 0:
-				self._read_depth.append(0)
-				self._read_bases.append('')
-				self._read_qualities.append('')
+				self._runs.append([segment, position, 1, len(self._read_depth)])
+			reference_base, depth, reads, qualities, consensus_columns = columns
+			if consensus_columns is None:
+				consensus_columns = ('-', 0, 0, 0)
+			self._reference_base.append(reference_base)
+			self._consensus_base.append(consensus_columns[0])
+			self._consensus_quality.append(consensus_columns[1]) # Phred-scaled
+			self._snp_quality.append(consensus_columns[2]) # Phred-scaled probability of consensus being identical to the reference
+			self._mapping_quality.append(consensus_columns[3]) # RMS mapping quality
+			self._read_depth.append(depth)
+			self._read_bases.append(reads)
+			self._read_qualities.append(qualities)
+		
+		offset = 0
+		for segment, first, length, index in self._runs:
+			if self._segments and self._segments[-1][0] == segment:
+				self._segments[-1][2] += length
 			else:
-				raise IOError("Unidentifiable columns in pileup file: line %d" % count)
-			
-		if reference_fh is not None and count != self._reference_sizes[segment]:
-			assert self._reference_sizes[segment] > count, 'Internal counter (%d) greater than reference position counter (%d) for %s' % (count, ref_pos, segment)
-			while count < self._reference_sizes[segment]:
-				self._reference_name.append(split_line[0])
-				self._reference_base.append(self._reference_seqs[split_line[0]][count-1])
-				self._consensus_base.append('-')
-				self._consensus_quality.append(0)
-				self._snp_quality.append(0)
-				self._mapping_quality.append(0)
-				self._read_depth.append(0)
-				self._read_bases.append('')
-				self._read_qualities.append('')
-				count += 1
+				self._segment_index.setdefault(segment, len(self._segments))
+				self._segments.append([segment, offset, length])
+			offset += length
+		self._segments = [tuple(seg) for seg in self._segments]
+	
+	def _gap_bases(self, segment, first, length):
+		# Reference bases for a run of uncovered positions, or N's if there is no reference for it
+		if self._reference is None or segment not in self._reference:
+			return 'N' * length
+		return self._reference.fetch(segment, first, first + length - 1).upper()
+	
+	def _expand(self, covered, uncovered):
+		'''Yields covered(i) for the i-th covered position and each of the values
+		returned by uncovered(segment, first position, length) for each uncovered
+		run, in reference order'''
+		for segment, first, length, index in self._runs:
+			if index is None:
+				for value in uncovered(segment, first, length):
+					yield value
+			else:
+				for i in range(index, index + length):
+					yield covered(i)
 	
 	def parse_read_bases(self, phred_cutoff=0, ascii_offset=33):
-		import re
-		transformed_bases = []
-		for i in range(len(self._read_bases)):
-			reads = self._read_bases[i]
-			if reads == '':
-				transformed_bases.append(self._reference_base[i])
-				continue
-			if '*' in reads:
-				reads = re.sub('\*', '-', reads)
-			if '^' in reads:
-				reads = re.sub('\^.', '', reads) # remove read start token
-			if '$' in reads:
-				reads = reads.replace('$', '') # remove read end token
-			for symbol in '.,':
-				reads = reads.replace(symbol, self._reference_base[i])
-			for match in re.finditer('\d+', reads): # remove the indels eg +1A, -2gg, +2at etc.
-				regex = re.compile('(\+|\-)' + match.group() + '(A|C|G|T|N|-|Y|R|M|W|S|K|H|D|B|V|X){' + match.group() + '}', re.IGNORECASE)
-				reads = re.sub(regex, '', reads)
-			phred = [p for p in PileupFile._convert_ascii_to_phred(self._read_qualities[i], ascii_offset)]
-			str_length = len(reads)
-			assert str_length == len(phred), 'Unequal base and quality lengths at position %d:\n%s (%d)\n%s (%d)' % (i+1, reads, str_length, self._read_qualities[i], len(phred))
-			passed = [reads[j] for j in range(str_length) if phred[j] >= phred_cutoff]
-			transformed_bases.append(''.join(passed))
-		
-		return transformed_bases	
+		def covered(i):
+			return parse_read_column(self._read_bases[i], self._read_qualities[i], self._reference_base[i], phred_cutoff, ascii_offset, i+1)
+		try:
+			return list(self._expand(covered, self._gap_bases))
+		finally:
+			if self._reference is not None:
+				self._reference.close()
 	
+	def count_read_bases(self, phred_cutoff=0, ascii_offset=33):
+		'''Returns the base-count matrix for the pileup as a list of columns, one
+		array per symbol in PileupFile.CountedBases followed by the total number
+		of bases passing the cutoff at each position. Counts are case-insensitive.
+		'''
+		return count_base_columns(self.parse_read_bases(phred_cutoff, ascii_offset))
+
 	def calc_segment_sizes(self):
-		seg_counter = []
-		prev_seg = None
-		count = 0
-		for r in range(0, len(self._reference_name)):
-			count += 1
-			if self._reference_name[r] != prev_seg:
-				if prev_seg is None:
-					prev_seg = self._reference_name[r]
-					continue
-				seg_counter.append((prev_seg, count))
-				count = 0
-				prev_seg = self._reference_name[r]
-		seg_counter.append((self._reference_name[-1], count))
-		return seg_counter
-				
-	def return_reference_names(self):
-		return self._reference_name
+		return [(name, length) for name, offset, length in self._segments]
+	
+	def return_segment_table(self):
+		# (name, offset, length) for each segment. Offsets are 0-based indices into the per-position values
+		return self._segments
+	
+	def return_segment_ranges(self):
+		# (name, start, end) for each segment, as slice indices into the per-position values
+		return [(name, offset, offset + length) for name, offset, length in self._segments]
 	
+	def return_segment_slice(self, segment):
+		name, offset, length = self._segments[self._segment_index[segment]]
+		return slice(offset, offset + length)
+	
+	def view_segment(self, values, segment):
+		'''Returns the part of a per-position sequence (depths, count columns, consensus)
+		covering one segment. Arrays are returned as memoryviews, without copying.'''
+		segment_slice = self.return_segment_slice(segment)
+		try:
+			return memoryview(values)[segment_slice]
+		except TypeError:
+			return values[segment_slice]
+	
+	def return_reference_names(self):
+		names = []
+		for name, offset, length in self._segments:
+			names.extend([name] * length)
+		return names
+
+	def return_pileup_depths(self):
+		# Unfiltered read depth as reported in the pileup file
+		return array('l', self._expand(self._read_depth.__getitem__, lambda segment, first, length: repeat(0, length)))
+
 	def return_read_depths(self, phred_cutoff=0, ascii_offset=33):
-		passed_phred_lengths = []
-		for pos in self._read_qualities:
-			passed_phred = [p for p in PileupFile._convert_ascii_to_phred(pos, ascii_offset) if p >= phred_cutoff]
-			passed_phred_lengths.append(len(passed_phred))
-		return passed_phred_lengths		
+		# Number of bases at or above the Phred cutoff at each position
+		depths = quality_depths(self._read_qualities, phred_cutoff, ascii_offset)
+		return array('l', self._expand(depths.__getitem__, lambda segment, first, length: repeat(0, length)))
+
+# --- END OF CLASS --- #
+
+def parse_read_column(reads, qualities, reference_base, phred_cutoff=0, ascii_offset=33, position=None, stranded=False, segment=None):
+	'''Converts the read bases column of a pileup line into a string of the bases
+	whose quality passes the cutoff. Reference matches are replaced by the reference
+	base, read start/end tokens and indels are removed and deletions become '-'.
+	Positions without reads return the reference base. If stranded, forward strand
+	bases are uppercase and reverse strand bases lowercase (see count_strand_bases).
+	The segment and position are only used in the error raised for a malformed line.
+	'''
+	if reads == '':
+		return reference_base
+	if '*' in reads:
+		reads = _deletion_regex.sub('-', reads)
+	if '^' in reads:
+		reads = _read_start_regex.sub('', reads) # remove read start token
+	if '$' in reads:
+		reads = reads.replace('$', '') # remove read end token
+	if stranded:
+		reads = reads.replace('.', reference_base.upper()).replace(',', reference_base.lower())
+	else:
+		for symbol in '.,':
+			reads = reads.replace(symbol, reference_base)
+	for match in _digits_regex.finditer(reads): # remove the indels eg +1A, -2gg, +2at etc.
+		regex = re.compile('(\\+|\\-)' + match.group() + '(A|C|G|T|N|-|Y|R|M|W|S|K|H|D|B|V|X){' + match.group() + '}', re.IGNORECASE)
+		reads = re.sub(regex, '', reads)
+	phred = PileupFile._convert_ascii_to_phred(qualities, ascii_offset)
+	str_length = len(reads)
+	assert str_length == len(phred), 'Unequal base and quality lengths at position %s:\n%s (%d)\n%s (%d)' % (position if segment is None else '%s:%s' % (segment, position), reads, str_length, qualities, len(phred))
+	return ''.join([reads[j] for j in range(str_length) if phred[j] >= phred_cutoff])
+
+def _low_quality_bytes(phred_cutoff=0, ascii_offset=33):
+	# The quality characters in PileupFile.AsciiTable whose Phred score is below the cutoff
+	return bytes([b for b in PileupFile.AsciiTable.values() if b - ascii_offset < phred_cutoff])
+
+def quality_depths(qualities, phred_cutoff=0, ascii_offset=33, batch_size=10000):
+	'''Returns an array of the number of quality characters at or above phred_cutoff
+	in each string of qualities. Strings are joined batch_size at a time and the low
+	quality characters deleted in one pass, rather than converting each to a Phred score.
+	'''
+	depths = array('l')
+	low = _low_quality_bytes(phred_cutoff, ascii_offset)
+	for i in range(0, len(qualities), batch_size):
+		batch = '\n'.join(qualities[i:i+batch_size]).encode('ascii')
+		if low:
+			batch = batch.translate(None, low)
+		depths.extend([len(q) for q in batch.split(b'\n')])
+	return depths
+
+def _symbol_columns(strings, groups, batch_size=10000):
+	'''Returns an array for each string of characters in groups, of the number of
+	those characters in each of strings, followed by an array of the string lengths.
+	Strings are joined batch_size at a time and each column filled by deleting the
+	other characters from the batch in one pass, as in quality_depths().'''
+	columns = [array('l') for c in range(len(groups) + 1)]
+	deletes = [bytes([b for b in range(256) if b != 10 and chr(b) not in group]) for group in groups]
+	for i in range(0, len(strings), batch_size):
+		batch = '\n'.join(strings[i:i+batch_size]).encode('ascii', 'replace')
+		for column, delete in zip(columns, deletes):
+			column.extend(map(len, batch.translate(None, delete).split(b'\n')))
+		columns[-1].extend(map(len, batch.split(b'\n')))
+	return columns
+
+def count_base_columns(bases_list):
+	'''Returns the count columns (as PileupFile.count_read_bases) of a list of strings
+	from parse_read_column(): an array per symbol in PileupFile.CountedBases of its
+	case-insensitive counts, followed by an array of the string lengths'''
+	return _symbol_columns(bases_list, [symbol + symbol.lower() for symbol in PileupFile.CountedBases])
+
+def count_strand_columns(bases_list):
+	'''Returns the forward (uppercase) and reverse (lowercase) strand count columns of
+	each of PileupFile.CountedBases in a list of strings from
+	parse_read_column(stranded=True)'''
+	symbols = PileupFile.CountedBases
+	columns = _symbol_columns(bases_list, list(symbols) + [symbol.lower() if symbol.isalpha() else '' for symbol in symbols])
+	return (columns[:len(symbols)], columns[len(symbols):-1])
+
+def count_bases(bases):
+	'''Returns the case-insensitive counts of each of PileupFile.CountedBases in a
+	string from parse_read_column(), followed by the string length. For more than a
+	few strings, count_base_columns() is much faster.
+	'''
+	bases = bases.upper()
+	return tuple([bases.count(symbol) for symbol in PileupFile.CountedBases]) + (len(bases),)
+
+def count_strand_bases(bases):
+	'''Returns the forward (uppercase) and reverse (lowercase) strand counts of each of
+	PileupFile.CountedBases in a string from parse_read_column(stranded=True)'''
+	return (tuple([bases.count(symbol) for symbol in PileupFile.CountedBases]),
+			tuple([bases.count(symbol.lower()) if symbol.isalpha() else 0 for symbol in PileupFile.CountedBases]))
+
+def pileup_iterator(pileup_fh, reference_fh=None, region=None, index=None):
+	'''Streams a pileup file one reference position at a time, yielding
+	(segment, position, reference base, read depth, read bases, read qualities).
+	Positions missing from the pileup are yielded with a depth of 0. If a reference
+	is given, every segment is reported at full length. If a region from
+	parse_region() is given, only positions within it are yielded, seeking to it
+	with the index from read_pileup_index() if there is one.
+	'''
+	reference = None
+	reference_sizes = {}
+	if reference_fh is not None:
+		reference = IndexedFasta(reference_fh)
+		reference_sizes = reference.lengths
+	
+	if region is not None:
+		pileup_fh = region_lines(pileup_fh, region, index)
+	try:
+		for segment, position, length, columns in _pileup_runs(pileup_fh, reference_sizes, region):
+			if columns is not None:
+				yield (segment, position) + columns[:4]
+				continue
+			sequence = None
+			if reference is not None and segment in reference:
+				sequence = reference.fetch(segment, position, position + length - 1).upper()
+			for pos in range(position, position + length):
+				yield (segment, pos, sequence[pos-position] if sequence is not None else 'N', 0, '', '')
+	finally:
+		if reference is not None:
+			reference.close()
+
+def _pileup_runs(pileup_fh, reference_sizes, region=None):
+	'''Yields (segment, position, 1, columns) for each position in the pileup and
+	(segment, first position, length, None) for each run of positions missing from
+	it. Runs at the end of a segment are only known if it is in reference_sizes.
+	If a region from parse_region() is given, the lines must all be from that region
+	(see region_lines) and runs are only reported within it.
+	'''
+	first = 1
+	last = None
+	if region is not None:
+		first = region[1]
+		last = region[2]
+	
+	def segment_end(segment):
+		end = reference_sizes.get(segment, 0)
+		if last is not None and last < end:
+			return last
+		return end
+	
+	count = first - 1
+	segment = None
+	line_number = 0
+	for line in pileup_fh:
+		line_number += 1
+		split_line = line.split()
+		if len(split_line) == 0 or split_line[2] == '*':
+			continue
+		if split_line[0] != segment:
+			if segment is not None and segment_end(segment) > count:
+				yield (segment, count+1, segment_end(segment)-count, None)
+			segment = split_line[0]
+			count = first - 1
+		columns = split_pileup_columns(split_line, line_number)
+		position = columns[0]
+		assert position > count, 'Internal counter (%d) greater than reference position counter (%d) for %s' % (count, position, segment)
+		assert position <= reference_sizes.get(segment, position), 'Position %d beyond the end of reference segment %s (%d)' % (position, segment, reference_sizes.get(segment, 0))
+		if position > count+1:
+			yield (segment, count+1, position-count-1, None)
+		yield (segment, position, 1, columns[1:])
+		count = position
+	if segment is None and region is not None:
+		segment = region[0] # nothing covered in the region
+	if segment is not None and segment_end(segment) > count:
+		yield (segment, count+1, segment_end(segment)-count, None)
+
+def split_pileup_columns(split_line, line_number):
+	'''Returns the position, reference base, depth, read bases, read qualities of a
+	pileup line, followed by its (consensus base, consensus quality, SNP quality,
+	mapping quality) if present or None'''
+	columns = len(split_line)
+	position = int(split_line[1])
+	reference_base = split_line[2].upper()
+	if columns == 10 or columns == 11: # -c flag or -c/-s flags
+		# Ignore last column which is mapping quality per base
+		return (position, reference_base, int(split_line[7]), split_line[8], split_line[9], tuple(split_line[3:7]))
+	elif columns == 6 or columns == 7: # -s flag or neither
+		return (position, reference_base, int(split_line[3]), split_line[4], split_line[5], None)
+	elif columns == 4 and int(split_line[3]) == 0:
+		return (position, reference_base, 0, '', '', None)
+	else:
+		raise IOError("Unidentifiable columns in pileup file: line %d" % line_number)
+
+PileupIndexSuffix = '.pidx'
+
+def parse_region(region):
+	'''Converts "segment", "segment:start" or "segment:start-end" (1-based, inclusive)
+	into a (segment, start, end) tuple. end is None if the region runs to the end
+	of the segment.
+	'''
+	segment, sep, span = region.rpartition(':')
+	match = re.match(r'^(\d+)(?:-(\d+))?$', span)
+	if sep == '' or match is None:
+		return (region, 1, None)
+	start = int(match.group(1))
+	end = int(match.group(2)) if match.group(2) is not None else None
+	if start < 1 or (end is not None and end < start):
+		raise ValueError('Invalid region "%s"' % region)
+	return (segment, start, end)
+
+def build_pileup_index(pileup_fh, block_size=1000):
+	'''Takes a pileup file opened in binary mode and returns a dict of
+	segment: [(position, byte offset), ...] holding the first line of each segment
+	and the first line in each block of block_size positions.
+	'''
+	index = {}
+	offset = 0
+	segment = None
+	block = None
+	for line in pileup_fh:
+		split_line = line.split(None, 2)
+		if len(split_line) >= 2:
+			name = split_line[0].decode()
+			position = int(split_line[1])
+			if name != segment:
+				segment = name
+				block = None
+				index.setdefault(segment, [])
+			if (position-1) // block_size != block:
+				block = (position-1) // block_size
+				index[segment].append((position, offset))
+		offset += len(line)
+	return index
+
+def write_pileup_index(outfh, index, block_size):
+	outfh.write('#block_size\t%d\n' % block_size)
+	for segment, entries in index.items():
+		for position, offset in entries:
+			outfh.write('%s\t%d\t%d\n' % (segment, position, offset))
+
+def read_pileup_index(infh):
+	'''Reads an index written by write_pileup_index() back into a dict'''
+	index = {}
+	for line in infh:
+		if line.startswith('#'):
+			continue
+		split_line = line.rstrip('\r\n').split('\t')
+		if len(split_line) != 3:
+			raise IOError('Incorrect formatting in pileup index line: "%s"' % line.rstrip())
+		index.setdefault(split_line[0], []).append((int(split_line[1]), int(split_line[2])))
+	return index
+
+def load_pileup_index(pileup_file):
+	# Returns the index next to a pileup file, or None if it hasn't been indexed
+	import os
+	index_file = pileup_file + PileupIndexSuffix
+	if not os.path.exists(index_file):
+		return None
+	if os.path.getmtime(index_file) < os.path.getmtime(pileup_file):
+		print('[WARNING]: Ignoring out-of-date index "%s"' % index_file)
+		return None
+	with open(index_file, 'r') as infh:
+		return read_pileup_index(infh)
+
+def region_lines(pileup_fh, region, index=None):
+	'''Yields the lines of a pileup file within a region from parse_region(). With an
+	index, the file is first seeked to the indexed block containing the start of the
+	region, otherwise it is read from the beginning.
+	'''
+	import bisect
+	segment, start, end = region
+	if index is not None:
+		entries = index.get(segment)
+		if not entries:
+			return
+		i = bisect.bisect_right(entries, (start, float('inf'))) - 1
+		pileup_fh.seek(entries[max(i, 0)][1])
+	seen = False
+	while True:
+		line = pileup_fh.readline()
+		if not line:
+			return
+		split_line = line.split(None, 2)
+		if len(split_line) < 2:
+			continue
+		if split_line[0] != segment:
+			if seen:
+				return
+			continue
+		seen = True
+		position = int(split_line[1])
+		if position < start:
+			continue
+		if end is not None and position > end:
+			return
+		yield line
+
+_deletion_regex = re.compile('\\*')
+_read_start_regex = re.compile('\\^.')
+_digits_regex = re.compile('\\d+')
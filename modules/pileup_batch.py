@@ -0,0 +1,150 @@
+'''Runs the consensus, minority list and minority numbers calculations for many
+pileup files, one sample per worker process. Each pileup is parsed once per
+sample and all three outputs are produced from the same per-position counts.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from pileup import *
+from consensus import *
+from minority import *
+
+SummaryColumns = ('SAMPLE', 'STATUS', 'SEGMENTS', 'POSITIONS', 'COVERED', 'MEAN_DEPTH', 'MINORITIES', 'MAJORITY_FRAC')
+
+def parse_manifest(manifestfh):
+	'''Reads a tab-separated manifest of "sample \\t pileup [\\t reference]" lines.
+	Blank lines and lines starting with "#" are ignored.'''
+	samples = []
+	names = set()
+	for line in manifestfh:
+		line = line.rstrip("\r\n")
+		if line == '' or line.startswith('#'):
+			continue
+		split_line = line.split('\t')
+		if len(split_line) not in (2, 3):
+			raise RuntimeError('Incorrect formatting in line:\n[ERROR]: "%s"\n[ERROR]: Must be formatted as "sample \\t pileup [\\t reference]"' % line)
+		if split_line[0] in names:
+			raise RuntimeError('Sample "%s" is present more than once' % split_line[0])
+		names.add(split_line[0])
+		reference = split_line[2] if len(split_line) == 3 and split_line[2] != '' else None
+		samples.append((split_line[0], split_line[1], reference))
+	return samples
+
+def process_sample(sample, pileup_file, reference_file, outprefix, settings):
+	'''Writes <outprefix>.<sample>.consensus.fasta and <outprefix>.<sample>.minority.txt
+	and returns the summary row for the sample. settings is a dict of the keyword
+	arguments taken by run_batch().'''
+	sample_prefix = '%s.%s' % (outprefix, sample)
+	base_list = settings['base_list']
+	columns = [array('l') for c in range(len(PileupFile.CountedBases) + 1)]
+	pileup_depths = array('l')
+	segment_ranges = []
+	majority_above = 0
+	covered = 0
+	depth_sum = 0
+	# Quality-independent consensus counts every base, whatever the cutoff for the minorities
+	consensus_cutoff = 0 if settings['quality_independent'] is True else settings['phred_cutoff']
+	separate = consensus_cutoff != settings['phred_cutoff']
+	consensus_bases = []
+
+	def extend_columns():
+		for column, counts in zip(columns, count_base_columns(consensus_bases)):
+			column.extend(counts)
+		del consensus_bases[:]
+
+	ref_fh = None
+	try:
+		with open(pileup_file, 'r') as pileup_fh, open(sample_prefix + '.minority.txt', 'w') as outfh:
+			if reference_file is not None:
+				ref_fh = open(reference_file, 'r')
+			outfh.write('SEGMENT\tPOS\tBASE\tFREQ\tDEPTH\tMAJORITY\n')
+
+			def positions():
+				# Keeps the pileup depths and segment ranges while passing the positions on
+				nonlocal covered, depth_sum
+				for row in pileup_iterator(pileup_fh, ref_fh):
+					segment, depth = row[0], row[3]
+					index = len(pileup_depths)
+					if not segment_ranges or segment_ranges[-1][0] != segment:
+						segment_ranges.append([segment, index, index])
+					segment_ranges[-1][2] = index + 1
+					pileup_depths.append(depth)
+					if depth > 0:
+						covered += 1
+						depth_sum += depth
+					if separate:
+						consensus_bases.append(parse_read_column(row[4], row[5], row[2], consensus_cutoff, settings['ascii_offset'], row[1], segment=segment))
+						if len(consensus_bases) >= 10000:
+							extend_columns()
+					yield row
+
+			def counted():
+				# Keeps the counts for the consensus while passing them on to the minority caller
+				nonlocal majority_above
+				for row in count_positions(positions(), settings['phred_cutoff'], settings['ascii_offset']):
+					counts = row[2]
+					if not separate:
+						for n, column in zip(counts, columns):
+							column.append(n)
+					if counts[-1] > 0 and majority_base(counts, base_list)[1] / counts[-1] >= settings['majority_cutoff']:
+						majority_above += 1
+					yield row
+
+			minorities = write_minorities(outfh, call_minorities(counted(), settings['frequency_cutoff'], settings['depth_cutoff'], base_list))
+		if separate:
+			extend_columns()
+
+		consensus = call_consensus(columns, pileup_depths, settings['ambiguity_threshold'], settings['low_depth_cutoff'], settings['quality_independent'])
+		with open(sample_prefix + '.consensus.fasta', 'w') as outfh:
+			write_consensus(outfh, consensus, segment_ranges)
+	except Exception as err: # Any failure is reported against the sample so that the rest still run
+		return (sample, 'FAILED: %s: %s' % (type(err).__name__, err), 0, 0, 0, 0.0, 0, 0.0)
+	finally:
+		if ref_fh is not None:
+			ref_fh.close()
+
+	positions = len(pileup_depths)
+	mean_depth = depth_sum / positions if positions > 0 else 0.0
+	majority_frac = majority_above / positions if positions > 0 else 0.0
+	return (sample, 'OK', len(segment_ranges), positions, covered, mean_depth, minorities, majority_frac)
+
+def _process_sample_star(args):
+	return process_sample(*args)
+
+def run_batch(samples, outprefix, processes=1, phred_cutoff=0, ascii_offset=33, ambiguity_threshold=0.30, low_depth_cutoff=10, quality_independent=False, frequency_cutoff=0.05, depth_cutoff=0, majority_cutoff=0.99, base_list='ACGT*'):
+	'''Processes each (sample, pileup, reference) in samples across a pool of processes.
+	Yields the summary rows in manifest order as samples complete.'''
+	settings = {	'phred_cutoff': phred_cutoff, 'ascii_offset': ascii_offset,
+					'ambiguity_threshold': ambiguity_threshold, 'low_depth_cutoff': low_depth_cutoff,
+					'quality_independent': quality_independent, 'frequency_cutoff': frequency_cutoff,
+					'depth_cutoff': depth_cutoff, 'majority_cutoff': majority_cutoff, 'base_list': base_list }
+	jobs = [(sample, pileup_file, reference_file, outprefix, settings) for sample, pileup_file, reference_file in samples]
+	if processes <= 1:
+		for job in jobs:
+			yield process_sample(*job)
+		return
+	import multiprocessing
+	with multiprocessing.Pool(processes) as pool:
+		for row in pool.imap(_process_sample_star, jobs):
+			yield row
+
+def write_summary(outfh, rows):
+	outfh.write('\t'.join(SummaryColumns) + '\n')
+	for row in rows:
+		outfh.write('%s\t%s\t%d\t%d\t%d\t%.2f\t%d\t%.4f\n' % row)
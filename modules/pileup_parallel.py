@@ -0,0 +1,158 @@
+'''Counts the read bases of a pileup file across several processes. The file is
+split at line boundaries (or at segment starts, if it has been indexed), each
+worker counts its own chunk and the chunks are stitched back together, filling
+uncovered positions between and around them as PileupFile does.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from array import array
+from pileup import *
+
+def plan_chunks(pileup_file, processes, index=None):
+	'''Returns a list of (start, end) byte ranges covering the pileup file. If an
+	index with at least as many segments as processes is given, chunks start at
+	segment boundaries, otherwise the file is cut into equal byte ranges (which
+	the workers move to the next line boundary).
+	'''
+	size = os.path.getsize(pileup_file)
+	if processes <= 1 or size == 0:
+		return [(0, size)]
+	if index is not None and len(index) >= processes:
+		starts = sorted([entries[0][1] for entries in index.values() if entries])
+		step = len(starts) / processes
+		starts = sorted(set([starts[int(i * step)] for i in range(processes)] + [0]))
+	else:
+		starts = [(size * i) // processes for i in range(processes)]
+	return [(starts[i], starts[i+1] if i+1 < len(starts) else size) for i in range(len(starts))]
+
+def count_chunk(pileup_file, start, end, phred_cutoff=0, ascii_offset=33):
+	'''Counts the lines starting within bytes start to end of a pileup file. Returns a
+	list of [segment, first position, count columns, pileup depths] blocks, one per
+	run of consecutive positions.'''
+	blocks = []
+	block = None
+	with open(pileup_file, 'rb') as infh:
+		if start > 0:
+			infh.seek(start - 1)
+			infh.readline() # move to the start of the next full line
+		offset = infh.tell()
+		while offset < end:
+			line_start = offset
+			line = infh.readline()
+			if not line:
+				break
+			offset += len(line)
+			split_line = line.decode().split()
+			if len(split_line) == 0 or split_line[2] == '*':
+				continue
+			try:
+				position, reference_base, depth, reads, qualities, consensus_columns = split_pileup_columns(split_line, 0)
+			except IOError:
+				# Lines before the chunk are only counted when one is malformed
+				raise IOError('Unidentifiable columns in pileup file: line %d' % line_number(pileup_file, line_start))
+			bases = parse_read_column(reads, qualities, reference_base, phred_cutoff, ascii_offset, position, segment=split_line[0])
+			if block is None or block[0] != split_line[0] or block[1] + len(block[3]) != position:
+				block = [split_line[0], position, [], array('l')]
+				blocks.append(block)
+			block[2].append(bases)
+			block[3].append(depth)
+	for block in blocks:
+		block[2] = count_base_columns(block[2])
+	return blocks
+
+def line_number(pileup_file, offset):
+	'''Returns the line number of the line starting at byte offset of a file'''
+	lines = 1
+	with open(pileup_file, 'rb') as infh:
+		while offset > 0:
+			data = infh.read(min(offset, 1 << 20))
+			if not data:
+				break
+			lines += data.count(b'\n')
+			offset -= len(data)
+	return lines
+
+def _count_chunk_star(args):
+	return count_chunk(*args)
+
+def _map(function, jobs, processes):
+	# Forks the workers so that calling scripts don't need a __main__ guard
+	import multiprocessing
+	if processes <= 1 or len(jobs) <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+		return [function(job) for job in jobs]
+	with multiprocessing.get_context('fork').Pool(min(processes, len(jobs))) as pool:
+		return pool.map(function, jobs)
+
+def parallel_count_read_bases(pileup_file, reference_fh=None, processes=1, phred_cutoff=0, ascii_offset=33, index=None):
+	'''Returns (count columns, pileup depths, segment table) for a whole pileup file,
+	the same as PileupFile.count_read_bases(), return_pileup_depths() and
+	return_segment_table() would, with the parsing spread over processes.'''
+	reference = IndexedFasta(reference_fh) if reference_fh is not None else None
+	reference_sizes = reference.lengths if reference is not None else {}
+	try:
+		jobs = [(pileup_file, start, end, phred_cutoff, ascii_offset) for start, end in plan_chunks(pileup_file, processes, index)]
+		chunks = _map(_count_chunk_star, jobs, processes)
+
+		columns = [array('l') for c in range(len(PileupFile.CountedBases) + 1)]
+		pileup_depths = array('l')
+		segments = []
+		gap_counts = {}
+
+		def fill(segment, first, last):
+			# Uncovered positions count as their reference base, as in parse_read_column()
+			sequence = None
+			if reference is not None and segment in reference:
+				sequence = reference.fetch(segment, first, last).upper()
+			for position in range(first, last + 1):
+				base = sequence[position-first] if sequence is not None else 'N'
+				if base not in gap_counts:
+					gap_counts[base] = count_bases(base)
+				for n, column in zip(gap_counts[base], columns):
+					column.append(n)
+				pileup_depths.append(0)
+
+		segment = None
+		count = 0
+		for blocks in chunks:
+			for name, first, block_columns, block_depths in blocks:
+				if name != segment:
+					if segment is not None:
+						fill(segment, count + 1, reference_sizes.get(segment, 0))
+					segment = name
+					count = 0
+					segments.append([name, len(pileup_depths)])
+				assert first > count, 'Internal counter (%d) greater than reference position counter (%d) for %s' % (count, first, segment)
+				fill(segment, count + 1, first - 1)
+				for column, block_column in zip(columns, block_columns):
+					column.extend(block_column)
+				pileup_depths.extend(block_depths)
+				count = first + len(block_depths) - 1
+				assert count <= reference_sizes.get(segment, count), 'Position %d beyond the end of reference segment %s (%d)' % (count, segment, reference_sizes.get(segment, 0))
+		if segment is not None:
+			fill(segment, count + 1, reference_sizes.get(segment, 0))
+	finally:
+		if reference is not None:
+			reference.close()
+
+	segment_table = []
+	for i, (name, offset) in enumerate(segments):
+		end = segments[i+1][1] if i+1 < len(segments) else len(pileup_depths)
+		segment_table.append((name, offset, end - offset))
+	return (columns, pileup_depths, segment_table)
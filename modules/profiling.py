@@ -0,0 +1,105 @@
+'''Profiles each stage of a run separately with cProfile, for the --profile option of
+the scripts. Stages are those of modules/metrics.py. Each stage's profile is saved
+as a .pstats file and as collapsed stacks ("a;b;c <microseconds>" lines) that
+flamegraph tools such as flamegraph.pl and speedscope read.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import cProfile, os, pstats
+
+class StageProfiler:
+	'''Keeps a cProfile.Profile per stage. Only one profile runs at a time: entering
+	a stage pauses the stage it is nested in until it exits, so that each profile
+	only holds the work of its own stage.'''
+
+	def __init__(self):
+		self.profiles = {}
+		self._active = []
+
+	def enter(self, name):
+		if self._active:
+			self.profiles[self._active[-1]].disable()
+		if name not in self.profiles:
+			self.profiles[name] = cProfile.Profile()
+		self._active.append(name)
+		self.profiles[name].enable()
+
+	def exit(self, name):
+		self.profiles[name].disable()
+		self._active.pop()
+		if self._active:
+			self.profiles[self._active[-1]].enable()
+
+	def write(self, outprefix):
+		'''Writes <outprefix>.<stage>.pstats and <outprefix>.<stage>.folded for each
+		stage profiled. Returns the list of files written.'''
+		written = []
+		for name, profile in self.profiles.items():
+			stats_file = '%s.%s.pstats' % (outprefix, name)
+			profile.dump_stats(stats_file)
+			folded_file = '%s.%s.folded' % (outprefix, name)
+			with open(folded_file, 'w') as outfh:
+				write_collapsed_stacks(outfh, pstats.Stats(profile))
+			written += [stats_file, folded_file]
+		return written
+
+# --- END OF CLASS --- #
+
+def _frame_name(function):
+	filename, line, name = function
+	if filename == '~': # built-in functions
+		name = name.strip('<>')
+	else:
+		name = '%s (%s:%d)' % (name, os.path.basename(filename), line)
+	return name.replace(';', ',')
+
+def collapsed_stacks(stats, min_time=1e-6, max_depth=64):
+	'''Returns a {stack: seconds} dictionary of the call stacks in a pstats.Stats
+	object, with stacks as ";"-joined frames from the outermost call. cProfile only
+	records caller-callee pairs, so stacks are rebuilt from them: a function's own
+	time is split between its callers in proportion to the time spent in it from
+	each, and so on up to the entry points. Shares below min_time are dropped.'''
+	entries = stats.stats
+	stacks = {}
+
+	def climb(function, time, path):
+		callers = entries[function][4]
+		parents = [(caller, edge) for caller, edge in callers.items() if caller in entries and caller not in path]
+		if not parents or len(path) >= max_depth:
+			stack = ';'.join([_frame_name(f) for f in reversed(path)])
+			stacks[stack] = stacks.get(stack, 0.0) + time
+			return
+		total = sum([edge[3] for caller, edge in parents])
+		for caller, edge in parents:
+			share = time * edge[3] / total if total > 0 else time / len(parents)
+			if share >= min_time:
+				climb(caller, share, path + [caller])
+
+	for function, (cc, nc, tt, ct, callers) in entries.items():
+		if tt > 0:
+			climb(function, tt, [function])
+	return stacks
+
+def write_collapsed_stacks(outfh, stats):
+	'''Writes collapsed_stacks() as "stack microseconds" lines, heaviest first'''
+	stacks = collapsed_stacks(stats)
+	for stack, time in sorted(stacks.items(), key=lambda item: -item[1]):
+		microseconds = int(round(time * 1e6))
+		if microseconds > 0:
+			outfh.write('%s %d\n' % (stack, microseconds))
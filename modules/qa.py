@@ -18,6 +18,7 @@
 import tempfile
 import os
 from fastq import *
+from error_report import report
 
 def determine_R_path():
 	if 'R_PATH' in os.environ:
@@ -27,58 +28,84 @@ def determine_R_path():
 	else:
 		return None
 
-def main(fastq_file, output_file, r_binary_path=None, ascii_offset=33, window_size=15):
-	# First determine R binary path
+def check_R_path(r_binary_path=None):
+	# Returns the R binary to use, or None (with an error printed) if there isn't one
 	if r_binary_path is not None:
 		if not os.path.exists(r_binary_path):
 			print('[ERROR]: Specified path to R binary is invalid')
-			return 1
+			return None
+		return r_binary_path
+	r_binary_path = determine_R_path()
+	if r_binary_path is None:
+		print('[ERROR]: Unable to determine R path. Please use flag to specify.')
 	else:
-		r_binary_path = determine_R_path()
+		print('[INFO]: R binary found')
+	return r_binary_path
+
+def qa_row(read, ascii_offset=33, window_size=15):
+	'''Returns the R data file line for a FastqRecord: GC%, median quality, length and
+	the Phred scores of its last window_size bases (padded with NA)'''
+	# Want to calculate read length, GC%, median percentage
+	read_length = read.get_sequence_length()
+	gc = read.calculate_gc_percentage()
+	median = read.calculate_median_quality(ascii_offset=ascii_offset)
+	row = '%.2f\t%d\t%d' % (gc, median, read_length)
+
+	# Now handle 3' end cross-sectional window
+	phreds = read.return_phred_scores(start=-window_size, ascii_offset=ascii_offset)
+	phred_size = len(phreds)
+	assert phred_size <= window_size, 'Window size incorrectly parsed'
+	if phred_size < window_size:
+		diff = window_size - phred_size
+		row += '%s' % '\tNA' * diff
+	for p in phreds:
+		row += '\t%d' % p
+	return row + '\n'
+
+def qa_reads(reads, title, output_file, r_binary_path=None, ascii_offset=33, window_size=15):
+	'''Draws the QA graphs of an iterable of FastqRecords to output_file, titled
+	title, with the R binary found by check_R_path() if none is given. Returns 0, or
+	1 if R couldn't be run.'''
+	if r_binary_path is None:
+		r_binary_path = check_R_path()
 		if r_binary_path is None:
-			print('[ERROR]: Unable to determine R path. Please use flag to specify.')
 			return 1
-		else:
-			print('[INFO]: R binary found')
-		
-	# now create temp files to store R commands and R input data
+
+	# now create a temp file to store the R input data
 	try:
 		r_datafile = tempfile.NamedTemporaryFile(delete=False, mode='w')
-		r_commandsfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
 	except IOError as err:
 		print('[ERROR]: Unable to open temporary files to write R commands: %s' % err)
 		return 1
-	
-	# Next, go through the FASTQ file record-by-record, calculate metrics, and write to R datafile
+
+	# Next, go through the reads, calculate metrics, and write to R datafile
+	for read in reads:
+		r_datafile.write(qa_row(read, ascii_offset, window_size))
+	r_datafile.close()
+
+	return plot_qa(r_datafile.name, title, output_file, r_binary_path, window_size)
+
+def main(fastq_file, output_file, r_binary_path=None, ascii_offset=33, window_size=15, errors=None):
+	errors = report(errors)
+	# First determine R binary path
+	r_binary_path = check_R_path(r_binary_path)
+	if r_binary_path is None:
+		return 1
 	with open(fastq_file, 'r') as infh:
 		print('[INFO]: Calculating QA metrics for "%s"' % fastq_file)
-		for header, sequence, quality in fastq_iterator(infh):
-			try:
-				read = FastqRecord(header, sequence, quality)
-			except IOError as err:
-				print('[ERROR]: Unable to handle "%s": %s' % (header, err))
-				continue
-			
-			# Want to calculate read length, GC%, median percentage
-			read_length = read.get_sequence_length()
-			gc = read.calculate_gc_percentage()
-			median = read.calculate_median_quality(ascii_offset=ascii_offset)
-			
-			r_datafile.write('%.2f\t%d\t%d' % (gc, median, read_length))
-			
-			# Now handle 3' end cross-sectional window
-			phreds = read.return_phred_scores(start=-window_size, ascii_offset=ascii_offset)
-			phred_size = len(phreds)
-			assert phred_size <= window_size, 'Window size incorrectly parsed'
-			if phred_size < window_size:
-				diff = window_size - phred_size
-				r_datafile.write('%s' % '\tNA' * diff)
-			for p in phreds:
-				r_datafile.write('\t%d' % p)
-			r_datafile.write('\n')
-			
-		r_datafile.close()
-		
+		status = qa_reads(fastq_records(infh, errors), os.path.basename(fastq_file), output_file, r_binary_path, ascii_offset, window_size)
+	errors.summary()
+	return status
+
+def plot_qa(r_datafile_name, title, output_file, r_binary_path, window_size=15):
+	'''Runs R over a data file of qa_row() lines to draw the QA graphs of the readset
+	title to output_file. The data file is removed afterwards.'''
+	try:
+		r_commandsfile = tempfile.NamedTemporaryFile(delete=False, mode='w')
+	except IOError as err:
+		print('[ERROR]: Unable to open temporary files to write R commands: %s' % err)
+		return 1
+
 	# Finally generate the string to write into the R commands file
 	r_commands = '''raw.data <- read.table('%s', header=F, sep='\\t')
 jpeg(file='%s', height=7016, width=4960, res=600)
@@ -118,17 +145,19 @@ axis(1, at=seq(0, %d, 10), lab=seq(-%d, 0, 10))
 axis(2, at=seq(0, y.max, 5))
 
 title(main=paste("%s total sequences:", length(raw.data[,1])), outer=T)
-dev.off()''' % (r_datafile.name, output_file, window_size+3, window_size, window_size, os.path.basename(fastq_file))
+dev.off()''' % (r_datafile_name, output_file, window_size+3, window_size, window_size, title)
 
 	r_commandsfile.write(r_commands)
 	r_commandsfile.close()
 	if (os.system('%s CMD BATCH %s' % (r_binary_path, r_commandsfile.name))) == 0:
-		print('[INFO]: QA graphs for "%s" written to "%s"' % (fastq_file, output_file))
+		print('[INFO]: QA graphs for "%s" written to "%s"' % (title, output_file))
 		try:
 			os.unlink(os.path.basename(r_commandsfile.name) + '.Rout')
 			os.unlink(r_commandsfile.name)
-			os.unlink(r_datafile.name)
+			os.unlink(r_datafile_name)
 		except OSError as err:
 			print('[ERROR]: Unable to complete clean up: %s' % err)
 	else:
-		print('[ERROR]: Execution of "%s" failed' % r_binary_path)
\ No newline at end of file
+		print('[ERROR]: Execution of "%s" failed' % r_binary_path)
+		return 1
+	return 0
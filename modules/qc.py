@@ -16,132 +16,154 @@
 # along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
 
 from fastq import *
+from checkpoint import Checkpoint, CheckpointInterval, open_outputs
+from error_report import report
 
-def main(forward_file, outfile_f, reverse_file=None, outfile_r=None, paired=False, ascii_offset=33, median_cutoff=20, length_cutoff=30):
-	with open(forward_file, 'r') as infh_f, open(outfile_f, 'w') as outfh_f:
+CounterNames = ('total_reads', 'for_passed', 'for_failed', 'for_recovered', 'both_passed', 'rev_failed', 'rev_recovered', 'both_failed')
+PassedCounters = ('for_passed', 'for_recovered', 'both_passed', 'rev_recovered')
+
+def _trim(read, length, ascii_offset, median_cutoff, length_cutoff):
+	# Removes bases from the 3' end until the median passes or the read is too short. Returns the length left
+	while True:
+		read.remove_nth_base(length)
+		length -= 1
+		if length < length_cutoff:
+			break
+		elif read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
+			break
+	return length
+
+def qc_read(read, ascii_offset=33, median_cutoff=20, length_cutoff=30):
+	'''Quality-controls a single-end FastqRecord, trimming its 3' end if its median
+	quality is below median_cutoff. Returns the counter of CounterNames it falls
+	under: for_passed, for_recovered (kept after trimming) or for_failed.'''
+	length = read.get_sequence_length()
+	if length < length_cutoff:
+		return 'for_failed'
+	if read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
+		return 'for_passed'
+	if _trim(read, length, ascii_offset, median_cutoff, length_cutoff) < length_cutoff:
+		return 'for_failed'
+	return 'for_recovered'
+
+def qc_pair(forward_read, reverse_read, ascii_offset=33, median_cutoff=20, length_cutoff=30):
+	'''Quality-controls a pair of FastqRecords, trimming whichever of them fails the
+	median cutoff if the other passes. Returns the counter of CounterNames it falls
+	under; the pair is kept if that is one of PassedCounters.'''
+	for_length = forward_read.get_sequence_length()
+	rev_length = reverse_read.get_sequence_length()
+	# First check read length > cutoff
+	if rev_length < length_cutoff:
+		return 'rev_failed'
+	if for_length < length_cutoff:
+		return 'for_failed'
+	# Secondly, check if the reads pass the median cutoff
+	if forward_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
+		if reverse_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
+			return 'both_passed'
+		# PE forward passed, reverse failed
+		if _trim(reverse_read, rev_length, ascii_offset, median_cutoff, length_cutoff) < length_cutoff:
+			return 'rev_failed'
+		return 'rev_recovered'
+	# if both forward and reverse fail initial check, probably a bad spot
+	if reverse_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
+		if _trim(forward_read, for_length, ascii_offset, median_cutoff, length_cutoff) < length_cutoff:
+			return 'for_failed'
+		return 'for_recovered'
+	return 'both_failed'
+
+def qc_reads(reads, paired=False, ascii_offset=33, median_cutoff=20, length_cutoff=30, counters=None):
+	'''Generator of the reads passing QC from an iterable of FastqRecords, or of
+	(forward, reverse) FastqRecord pairs if paired, trimmed where needed. Each read
+	is counted in the counters dictionary under total_reads and its qc_read() or
+	qc_pair() counter.'''
+	if counters is None:
+		counters = {}
+	for read in reads:
 		if paired is True:
-			infh_r = open(reverse_file, 'r')
-			outfh_r = open(outfile_r, 'w')
-			reverse_reads = fastq_iterator(infh_r)
+			counter = qc_pair(read[0], read[1], ascii_offset, median_cutoff, length_cutoff)
+		else:
+			counter = qc_read(read, ascii_offset, median_cutoff, length_cutoff)
+		counters['total_reads'] = counters.get('total_reads', 0) + 1
+		counters[counter] = counters.get(counter, 0) + 1
+		if counter in PassedCounters:
+			yield read
+
+def _reads(infh, checkpoint, offset, errors):
+	# Records of a FASTQ file, with the offset of the next record if checkpointing
+	if checkpoint is None:
+		return ((header, sequence, quality, None) for header, sequence, quality in fastq_iterator(infh, errors))
+	return fastq_offset_iterator(infh, offset, errors)
+
+def main(forward_file, outfile_f, reverse_file=None, outfile_r=None, paired=False, ascii_offset=33, median_cutoff=20, length_cutoff=30, checkpoint_file=None, resume=False, checkpoint_every=CheckpointInterval, errors=None):
+	'''Quality-controls a single or paired-end readset and returns a dict of the
+	summary counters printed at the end, or 1 if the paired files are out of step.
+	With checkpoint_file, a checkpoint is saved every checkpoint_every reads (and
+	removed at the end), and if resume is True the run carries on from the
+	checkpoint left by an earlier run that was killed. Malformed reads are counted in
+	the ErrorReport errors and summarised at the end.'''
+	errors = report(errors)
+	checkpoint = None
+	state = None
+	if checkpoint_file is not None:
+		parameters = {	'outputs': [outfile_f, outfile_r], 'paired': paired, 'ascii_offset': ascii_offset,
+						'median_cutoff': median_cutoff, 'length_cutoff': length_cutoff }
+		checkpoint = Checkpoint(checkpoint_file, [forward_file, reverse_file], parameters, checkpoint_every)
+		if resume is True:
+			state = checkpoint.load()
+			if state is None:
+				print('[WARNING]: No checkpoint found at "%s", starting from the first read' % checkpoint_file)
+			else:
+				errors.resume(state)
+	offset_f, offset_r = state['offsets'] if state is not None else (0, 0)
+	counters = state['counters'] if state is not None else {}
+	mode = 'r' if checkpoint is None else 'rb'
+	with open(forward_file, mode) as infh_f, open_outputs([outfile_f], state)[0] as outfh_f:
+		outputs = [outfh_f]
+		if paired is True:
+			infh_r = open(reverse_file, mode)
+			outfh_r = open_outputs([outfile_r], state)[0]
+			outputs.append(outfh_r)
+			reverse_reads = _reads(infh_r, checkpoint, offset_r, errors)
 		
-		total_reads = 0
-		for_passed = 0
-		for_failed = 0
-		for_recovered = 0
+		counters = dict([(name, counters.get(name, 0)) for name in CounterNames])
 		if paired is True:
-			both_passed = 0
-			rev_failed = 0
-			rev_recovered = 0
-			both_failed = 0
 			print('[INFO]: Performing PE QC on "%s" and "%s"' % (forward_file, reverse_file))
 		else:
 			print('[INFO]: Performing SE QC on "%s"' % forward_file)
+		if state is not None:
+			print('[INFO]: Resuming from read %d, as saved in checkpoint "%s"' % (counters['total_reads'] + 1, checkpoint_file))
 		# loop through the forward reads' generator, calling next() on the reverse reads one to keep in step.
-		for forward_head, forward_seq, forward_qual in fastq_iterator(infh_f):
-			total_reads += 1
+		for forward_head, forward_seq, forward_qual, forward_end in _reads(infh_f, checkpoint, offset_f, errors):
+			if checkpoint is not None and checkpoint.due(counters['total_reads']):
+				checkpoint.save(counters['total_reads'], [offset_f, offset_r], outputs + errors.outputs(), dict(counters, errors=errors.counts))
+			offset_f = forward_end
+			counters['total_reads'] += 1
 			try:
 				forward_read = FastqRecord(forward_head, forward_seq, forward_qual)
 			except IOError as err:
-				print('[ERROR]: Unable to handle "%s": %s' % (forward_head, err))
+				errors.error('invalid_read', 'Unable to handle "%s": %s' % (forward_head, err), forward_head, forward_seq, forward_qual)
 				continue
-			else:
-				for_length = forward_read.get_sequence_length()
 			if paired is True:
 				try:
-					reverse_head, reverse_seq, reverse_qual = next(reverse_reads)
+					reverse_head, reverse_seq, reverse_qual, offset_r = next(reverse_reads)
 					reverse_read = FastqRecord(reverse_head, reverse_seq, reverse_qual)
-				except IOError as e:
-					print('[ERROR]: Unable to handle "%s": %s' % (reverse_head, err))
+				except IOError as err:
+					errors.error('invalid_read', 'Unable to handle "%s": %s' % (reverse_head, err), reverse_head, reverse_seq, reverse_qual)
 					continue
 				except StopIteration as err:
 					print('[ERROR]: More reverse reads than forward reads!')
 					return 1
-				else:
-					rev_length = reverse_read.get_sequence_length()
-					# First check read length > cutoff
-					if rev_length < length_cutoff:
-						rev_failed += 1
-						continue
-			
-			if for_length < length_cutoff:
-				for_failed += 1
-				continue
-			
-			# Secondly, check if the read passes the median cutoff
-			if forward_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
-				if paired is True:
-					if reverse_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
-						both_passed += 1
-						# PE foward and reverse passed
-						forward_read.write_to_file(outfh_f)
-						reverse_read.write_to_file(outfh_r)
-					else:
-						# PE forward passed, reverse failed
-						# rev_length = reverse_read.get_sequence_length()
-						while True:
-							reverse_read.remove_nth_base(rev_length)
-							rev_length -= 1
-							if rev_length < length_cutoff:
-								break
-							elif reverse_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
-								break
-						# out of loop - either length failed or median passed.
-						if rev_length < length_cutoff:
-							rev_failed += 1
-							continue
-						else:
-							rev_recovered += 1
-							# PE forward passed reverse passed
-							forward_read.write_to_file(outfh_f)
-							reverse_read.write_to_file(outfh_r)
-				else:
-					# SE forward passed
-					for_passed += 1
-					forward_read.write_to_file(outfh_f)
-			
+				counter = qc_pair(forward_read, reverse_read, ascii_offset, median_cutoff, length_cutoff)
 			else:
-				# if both forward and reverse fail initial check, probably a bad spot
+				counter = qc_read(forward_read, ascii_offset, median_cutoff, length_cutoff)
+			counters[counter] += 1
+			if counter in PassedCounters:
+				forward_read.write_to_file(outfh_f)
 				if paired is True:
-					if reverse_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
-						# for_length = forward_read.get_sequence_length()
-						while True:
-							forward_read.remove_nth_base(for_length)
-							for_length -= 1
-							if for_length < length_cutoff:
-								break
-							elif forward_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
-								break
-						# out of loop - either length failed or median passed.
-						if for_length < length_cutoff:
-							for_failed += 1
-							continue
-						else:
-							for_recovered += 1
-							# PE forward passed reverse passed
-							forward_read.write_to_file(outfh_f)
-							reverse_read.write_to_file(outfh_r)
-					else:
-						both_failed += 1
-						continue
-				else:
-					# SE forward failed. Try to recover
-					for_length = forward_read.get_sequence_length()
-					while True:
-						forward_read.remove_nth_base(for_length)
-						for_length -= 1
-						if for_length < length_cutoff:
-							break
-						elif forward_read.calculate_median_quality(ascii_offset=ascii_offset) >= median_cutoff:
-							break
-					# out of loop - either length failed or median passed.
-					if for_length < length_cutoff:
-						for_failed += 1
-						continue
-					else:
-						for_recovered += 1
-						# PE forward passed reverse passed
-						forward_read.write_to_file(outfh_f)
+					reverse_read.write_to_file(outfh_r)
 
+		total_reads, for_passed, for_failed, for_recovered, both_passed, rev_failed, rev_recovered, both_failed = [counters[name] for name in CounterNames]
 		# Summary data
 		if paired is True:
 			total_passed = both_passed + for_recovered + rev_recovered
@@ -155,10 +177,23 @@ def main(forward_file, outfile_f, reverse_file=None, outfile_r=None, paired=Fals
 			print('[STATS]: Read pairs failed on both forward and reverse reads: %d (%.2f%%)' % (both_failed, (both_failed/total_reads)*100))
 			print('[STATS]: Read pairs failed on forward read: %d (%.2f%%)' % (for_failed, (for_failed/total_reads)*100))
 			print('[STATS]: Read pairs failed on reverse read: %d (%.2f%%)' % (rev_failed, (rev_failed/total_reads)*100))
+			stats = {	'total': total_reads, 'passed': total_passed, 'failed': total_failed,
+						'both_passed': both_passed, 'for_recovered': for_recovered, 'rev_recovered': rev_recovered,
+						'both_failed': both_failed, 'for_failed': for_failed, 'rev_failed': rev_failed }
 		else:
 			total_passed = for_passed + for_recovered
 			print('[TOTAL]: Reads in input file: %d' % total_reads)
 			print('[TOTAL]: Reads passed: %d (%.2f%%)' % (total_passed, (total_passed/total_reads)*100))
 			print('[STATS]: Reads passed without trimming: %d (%.2f%%)' % (for_passed, (for_passed/total_reads)*100))
 			print('[STATS]: Reads passed after trimming: %d (%.2f%%)' % (for_recovered, (for_recovered/total_reads)*100))
-			print('[TOTAL]: Reads failed: %d (%.2f%%)' % (for_failed, (for_failed/total_reads)*100))
\ No newline at end of file
+			print('[TOTAL]: Reads failed: %d (%.2f%%)' % (for_failed, (for_failed/total_reads)*100))
+			stats = {	'total': total_reads, 'passed': total_passed, 'failed': for_failed,
+						'for_passed': for_passed, 'for_recovered': for_recovered, 'for_failed': for_failed }
+
+	errors.summary()
+	if paired is True:
+		infh_r.close()
+		outfh_r.close()
+	if checkpoint is not None:
+		checkpoint.remove()
+	return stats
@@ -0,0 +1,157 @@
+'''Runs quality_control.py (and optionally the QA graphs) for many readsets, one
+sample per worker process. Samples that fail in a way a rerun could fix are
+retried and the per-sample read counters are merged into a single summary table
+for the run.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import qc, qa
+from error_report import ErrorReport
+
+SummaryColumns = ('SAMPLE', 'STATUS', 'ATTEMPTS', 'PAIRED', 'READS', 'PASSED', 'FAILED', 'PASSED_UNTRIMMED', 'PASSED_TRIMMED_F', 'PASSED_TRIMMED_R', 'FAILED_BOTH', 'FAILED_F', 'FAILED_R')
+CounterColumns = SummaryColumns[4:]
+NotRetriedErrors = (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError) # the same again on a rerun
+
+def parse_manifest(manifestfh, median_cutoff=None, length_cutoff=None):
+	'''Reads a tab-separated manifest of "sample \\t forward [\\t reverse [\\t median
+	[\\t length]]]" lines. Empty or missing cutoffs take the values given here.
+	Blank lines and lines starting with "#" are ignored.'''
+	samples = []
+	names = set()
+	for line in manifestfh:
+		line = line.rstrip("\r\n")
+		if line == '' or line.startswith('#'):
+			continue
+		split_line = line.split('\t')
+		if not 2 <= len(split_line) <= 5:
+			raise RuntimeError('Incorrect formatting in line:\n[ERROR]: "%s"\n[ERROR]: Must be formatted as "sample \\t forward [\\t reverse [\\t median [\\t length]]]"' % line)
+		if split_line[0] in names:
+			raise RuntimeError('Sample "%s" is present more than once' % split_line[0])
+		names.add(split_line[0])
+		split_line += [''] * (5 - len(split_line))
+		sample, forward_file, reverse_file, median, length = split_line
+		try:
+			median = int(median) if median != '' else median_cutoff
+			length = int(length) if length != '' else length_cutoff
+		except ValueError:
+			raise RuntimeError('Unable to parse the cutoffs of sample "%s"' % sample)
+		if median is None or length is None:
+			raise RuntimeError('No median or length cutoff given for sample "%s"' % sample)
+		samples.append((sample, forward_file, reverse_file if reverse_file != '' else None, median, length))
+	return samples
+
+def summary_counters(stats):
+	# Returns the READS to FAILED_R columns of the summary table from qc.main() counters
+	if 'both_passed' in stats:
+		return (stats['total'], stats['passed'], stats['failed'], stats['both_passed'], stats['for_recovered'], stats['rev_recovered'], stats['both_failed'], stats['for_failed'], stats['rev_failed'])
+	return (stats['total'], stats['passed'], stats['failed'], stats['for_passed'], stats['for_recovered'], 0, 0, stats['for_failed'], 0)
+
+def retryable(err):
+	'''Returns whether a sample that failed with err could pass on a rerun: system
+	errors such as a full disk or a network filesystem error, but not a missing or
+	unreadable input, or the IOErrors (without an errno) raised for malformed files'''
+	if isinstance(err, MemoryError):
+		return True
+	return isinstance(err, OSError) and err.errno is not None and not isinstance(err, NotRetriedErrors)
+
+def process_sample(sample, forward_file, reverse_file, median_cutoff, length_cutoff, outprefix, settings):
+	'''Quality-controls one sample to <outprefix>.<sample>.f.fq (and .r.fq if paired),
+	with QA graphs if settings['perform_qa'], logging to <outprefix>.<sample>.log.
+	Returns (status, counters, retry) where counters is None if QC failed and retry
+	is whether a rerun could pass. Failures that can't are marked "(not retried)".'''
+	sample_prefix = '%s.%s' % (outprefix, sample)
+	paired = reverse_file is not None
+	outfile_f = sample_prefix + '.f.fq'
+	outfile_r = sample_prefix + '.r.fq' if paired else None
+	try:
+		with open(sample_prefix + '.log', 'w') as logfh, contextlib.redirect_stdout(logfh):
+			# Each attempt at a sample counts its own malformed reads, even if it stops partway
+			errors = ErrorReport()
+			try:
+				stats = qc.main(forward_file, outfile_f, reverse_file, outfile_r, paired, settings['ascii_offset'], median_cutoff, length_cutoff, errors=errors)
+				if not isinstance(stats, dict):
+					return ('FAILED: forward and reverse reads out of step (not retried)', None, False)
+				status = 'OK'
+				if settings['perform_qa'] is True:
+					if qa.main(outfile_f, sample_prefix + '.f.jpg', settings['r_path'], settings['ascii_offset'], settings['end_length'], errors) != 0:
+						status = 'QA FAILED'
+					elif paired and qa.main(outfile_r, sample_prefix + '.r.jpg', settings['r_path'], settings['ascii_offset'], settings['end_length'], errors) != 0:
+						status = 'QA FAILED'
+			finally:
+				errors.summary()
+	except Exception as err: # Any failure is reported against the sample so that the rest still run
+		if retryable(err):
+			return ('FAILED: %s: %s' % (type(err).__name__, err), None, True)
+		return ('FAILED: %s: %s (not retried)' % (type(err).__name__, err), None, False)
+	return (status, summary_counters(stats), False)
+
+def _process_sample_star(args):
+	return process_sample(*args)
+
+def run_batch(samples, outprefix, processes=1, retries=1, ascii_offset=33, perform_qa=False, r_path=None, end_length=15):
+	'''Processes each (sample, forward, reverse, median, length) in samples across a
+	pool of processes, rerunning samples whose failure could pass on a rerun (see
+	retryable) up to retries more times. Returns the summary rows in manifest order.'''
+	settings = {	'ascii_offset': ascii_offset, 'perform_qa': perform_qa,
+					'r_path': r_path, 'end_length': end_length }
+	results = {}
+	attempts = {}
+	pending = list(samples)
+	pool = None
+	if processes > 1:
+		import multiprocessing
+		pool = multiprocessing.Pool(processes)
+	try:
+		for attempt in range(retries + 1):
+			jobs = [sample + (outprefix, settings) for sample in pending]
+			if pool is None:
+				outcomes = [process_sample(*job) for job in jobs]
+			else:
+				outcomes = pool.map(_process_sample_star, jobs)
+			failed = []
+			for sample, outcome in zip(pending, outcomes):
+				results[sample[0]] = outcome[:2]
+				attempts[sample[0]] = attempt + 1
+				if outcome[2] is True:
+					failed.append(sample)
+			if not failed:
+				break
+			pending = failed
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+	rows = []
+	for sample in samples:
+		status, counters = results[sample[0]]
+		rows.append((sample[0], status, attempts[sample[0]], 'Y' if sample[2] is not None else 'N') + (counters if counters is not None else (0,) * len(CounterColumns)))
+	return rows
+
+def merge_rows(rows):
+	'''Returns a TOTAL row summing the counters of the samples that passed QC'''
+	done = [row for row in rows if not row[1].startswith('FAILED')]
+	totals = [sum([row[i] for row in done]) for i in range(4, len(SummaryColumns))]
+	return ('TOTAL', '%d/%d' % (len(done), len(rows)), sum([row[2] for row in rows]), '-') + tuple(totals)
+
+def write_summary(outfh, rows):
+	outfh.write('\t'.join(SummaryColumns) + '\n')
+	for row in rows + [merge_rows(rows)]:
+		outfh.write('\t'.join([str(value) for value in row]) + '\n')
@@ -0,0 +1,167 @@
+'''Runs the readset_parser.py steps (SFF conversion, MID splitting, primer removal and
+QA) as a single pass over the reads. Reads move through the stages in batches of
+(MID, FastqRecord) pairs, a stage can send a read on to several MIDs, and only the
+readsets at the end of the pipeline are written to disk.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, tempfile
+from fastq import *
+import sff_to_fastq, split_mids_by_header, split_mids_by_sequence, qa
+from fastq_primer_remover import trim_primers
+
+BatchSize = 1000
+
+class FastqSink:
+	'''Writes the reads reaching it to a FASTQ file'''
+
+	def __init__(self, outfile):
+		self.outfile = outfile
+		self.count = 0
+		self._fh = open(outfile, 'w')
+
+	def write(self, read):
+		read.write_to_file(self._fh)
+		self.count += 1
+
+	def close(self):
+		self._fh.close()
+
+# --- END OF CLASS --- #
+
+class QaSink:
+	'''Writes the QA data (qa.qa_row) of the reads reaching it to a temporary file,
+	for plot() to draw the QA graphs of the readset fastq_file from'''
+
+	def __init__(self, fastq_file, graphfile, ascii_offset=33, window_size=15):
+		self.fastq_file = fastq_file
+		self.graphfile = graphfile
+		self.ascii_offset = ascii_offset
+		self.window_size = window_size
+		self.count = 0
+		self._fh = tempfile.NamedTemporaryFile(delete=False, mode='w')
+
+	def write(self, read):
+		self._fh.write(qa.qa_row(read, self.ascii_offset, self.window_size))
+		self.count += 1
+
+	def close(self):
+		self._fh.close()
+
+	def plot(self, r_binary_path):
+		print('[INFO]: Creating QA graphs of "%s"' % self.fastq_file)
+		return qa.plot_qa(self._fh.name, os.path.basename(self.fastq_file), self.graphfile, r_binary_path, self.window_size)
+
+	def discard(self):
+		# Removes the QA data file when no graphs are drawn from it
+		try:
+			os.unlink(self._fh.name)
+		except OSError:
+			pass
+
+# --- END OF CLASS --- #
+
+def read_records(infile):
+	'''Generator of FastqRecords from a FASTQ or SFF file'''
+	if infile.endswith('.sff') or infile.endswith('.SFF'):
+		for read in sff_to_fastq.sff_records(infile):
+			yield read
+		return
+	with open(infile, 'r') as infh:
+		for header, sequence, quality in fastq_iterator(infh):
+			yield FastqRecord(header, sequence, quality)
+
+def readset_records(readsets):
+	'''Generator of (MID, FastqRecord) pairs from a list of (MID, FASTQ file) readsets,
+	for run_pipeline() to take up from readsets written by an earlier run'''
+	for mid, infile in readsets:
+		for read in read_records(infile):
+			yield (mid, read)
+
+def header_mid_stage(mid_list, mid_counts):
+	'''Returns a stage giving each read the MID at the end of its header. Reads with
+	MIDs not in mid_list are dropped and the rest counted in mid_counts.'''
+	def stage(batch):
+		return list(split_mids_by_header.split_by_header([read for mid, read in batch], mid_list, mid_counts))
+	return stage
+
+def sequence_mid_stage(mid_list, tags, mid_counts):
+	'''Returns a stage sending each read on to every MID of mid_list whose tag (from
+	tags) it starts with, with the tag removed. Reads are counted in mid_counts.'''
+	def stage(batch):
+		return list(split_mids_by_sequence.split_by_sequence([read for mid, read in batch], tags, mid_list, mid_counts))
+	return stage
+
+def primer_stage(primers, primers_count, mids=None):
+	'''Returns a stage removing primers from the reads of mids (all reads if None) as
+	fastq_primer_remover does, counting them per MID in primers_count. Reads with no
+	bases left are dropped.'''
+	def stage(batch):
+		output = []
+		for mid, read in batch:
+			if mids is None or mid in mids:
+				read = trim_primers(read, primers, primers_count.setdefault(mid, {}))
+				if read.get_sequence_length() == 0:
+					continue
+			output.append((mid, read))
+		return output
+	return stage
+
+def tee_stage(sinks_for_mid, sinks):
+	'''Returns a stage writing the reads passing through it, unchanged, to the sink
+	returned by sinks_for_mid(MID) the first time that MID is seen. Sinks are kept in
+	the MID-keyed sinks dictionary for the caller to close.'''
+	def stage(batch):
+		for mid, read in batch:
+			if mid not in sinks:
+				sinks[mid] = sinks_for_mid(mid)
+			sinks[mid].write(read)
+		return batch
+	return stage
+
+def run_pipeline(records, stages, sinks_for_mid, batch_size=BatchSize, tagged=False):
+	'''Passes records through stages in batches of (MID, record) pairs, with a MID of
+	None to begin with (or that given if tagged, where records are already pairs),
+	and writes the pairs left at the end to the list of sinks returned by
+	sinks_for_mid(MID) the first time that MID is seen. Returns the closed sinks as
+	a MID-keyed dictionary.'''
+	sinks = {}
+
+	def flush(batch):
+		for stage in stages:
+			batch = stage(batch)
+		for mid, read in batch:
+			if mid not in sinks:
+				sinks[mid] = sinks_for_mid(mid)
+			for sink in sinks[mid]:
+				sink.write(read)
+
+	batch = []
+	try:
+		for read in records:
+			batch.append(read if tagged is True else (None, read))
+			if len(batch) >= batch_size:
+				flush(batch)
+				batch = []
+		flush(batch)
+	finally:
+		for mid_sinks in sinks.values():
+			for sink in mid_sinks:
+				sink.close()
+	return sinks
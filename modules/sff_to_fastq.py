@@ -35,6 +35,7 @@
 
 import struct
 import fastq as fastq_module
+from error_report import report
 
 def read_bin_fragment(struct_def, fileh, offset=0, data=None, byte_padding=None):
 	if data is None:
@@ -170,32 +171,47 @@ def read_sequence(header, fileh, fposition):
 
 	return data['read_header_length'] + bytes_read, data
 
-def main(sff_file, outfile):
-	with open(sff_file, 'rb') as sff_fh, open(outfile, 'w') as outfh:
-		print('[INFO]: Processing SFF file "%s"' % sff_file)
-		header_data = read_header(fileh=sff_fh)
-		key_seq = [h.decode("utf-8") for h in header_data['key_sequence']]
-		key_seq = ''.join(key_seq)
-		key_len = len(key_seq)
-		total_seqs = 0
-		num_with_key = 0
-		
-		for seq_data in sequences(fileh=sff_fh, header=header_data):
-			header = seq_data['name']
-			sequence = seq_data['bases']
-			try:
-				quality = fastq_module.convert_phred_to_ascii(seq_data['quality_scores'], 33)
-			except IOError as err:
-				print('[ERROR]: Ignoring sequence "%s": %e' % (header, err))
-				
-			if sequence.startswith(key_seq):
-				sequence = sequence[key_len:]
-				quality = quality[key_len:]
-				num_with_key += 1
-			fastq = fastq_module.FastqRecord(header, sequence, quality)
-			fastq.write_to_file(outfh)
-			total_seqs += 1
+def sff_reads(sff_fh, errors=None):
+	'''Generator of FastqRecords for the reads of an SFF file opened in binary mode,
+	with the key sequence removed from the start of those that have it. Reads with
+	out-of-range qualities are counted in the ErrorReport errors.'''
+	errors = report(errors)
+	header_data = read_header(fileh=sff_fh)
+	key_seq = [h.decode("utf-8") for h in header_data['key_sequence']]
+	key_seq = ''.join(key_seq)
+	key_len = len(key_seq)
+	total_seqs = 0
+	num_with_key = 0
+	
+	for seq_data in sequences(fileh=sff_fh, header=header_data):
+		header = seq_data['name']
+		sequence = seq_data['bases']
+		try:
+			quality = fastq_module.convert_phred_to_ascii(seq_data['quality_scores'], 33)
+		except IOError as err:
+			errors.error('invalid_quality', 'Ignoring sequence "%s": %s' % (header, err), header, sequence)
+			continue
+			
+		if sequence.startswith(key_seq):
+			sequence = sequence[key_len:]
+			quality = quality[key_len:]
+			num_with_key += 1
+		yield fastq_module.FastqRecord(header, sequence, quality)
+		total_seqs += 1
 			
 	print('[INFO]: %d total sequences in SFF file' % total_seqs )
 	print('[INFO]: %d had key sequence "%s" removed' % (num_with_key, key_seq) )
-	print('[INFO]: Sequences written to "%s"' % outfile)
\ No newline at end of file
+	errors.summary()
+
+def sff_records(sff_file, errors=None):
+	'''Generator of FastqRecords for the reads of an SFF file, as sff_reads()'''
+	with open(sff_file, 'rb') as sff_fh:
+		print('[INFO]: Processing SFF file "%s"' % sff_file)
+		for read in sff_reads(sff_fh, errors):
+			yield read
+
+def main(sff_file, outfile):
+	with open(outfile, 'w') as outfh:
+		for fastq in sff_records(sff_file):
+			fastq.write_to_file(outfh)
+	print('[INFO]: Sequences written to "%s"' % outfile)
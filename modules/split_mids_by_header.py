@@ -22,7 +22,30 @@ regex for EG #12/1 or #4/1 or #5/2
 import re, os
 from fastq import *
 
-def main(infile, outprefix, mid_list):
+_mid_regex = re.compile(r'#\d+/\d{1}$')
+
+def header_mid(header):
+	# Returns the MID number from a header ending "#<MID>/<read>", or None
+	match = _mid_regex.findall(header)
+	if not match:
+		return None
+	m = match[0].split('/') # EG m = ['#3', '1']
+	return int(m[0][1:])
+
+def split_by_header(reads, mid_list, mid_counts):
+	'''Generator of (MID, FastqRecord) pairs giving each of the FastqRecords reads the
+	MID at the end of its header. Reads with MIDs not in mid_list are dropped and the
+	rest counted in mid_counts.'''
+	for read in reads:
+		num = header_mid(read.get_header())
+		if num is None:
+			print('[INFO]: MID value not found in "%s"' % read.get_header())
+			continue
+		if num in mid_list:
+			mid_counts[num] = mid_counts.get(num, 0) + 1
+			yield (num, read)
+
+def main(infile, outprefix, mid_list, errors=None):
 	outhandles = {}
 	out_nums = {}
 	with open(infile, 'r') as infh:
@@ -34,21 +57,11 @@ def main(infile, outprefix, mid_list):
 			except IOError as err:
 				raise
 				
-		query = re.compile(r'#\d+/\d{1}$')
-		for header, sequence, quality in fastq_iterator(infh):
-			read = FastqRecord(header, sequence, quality)
-			match = query.findall(read.get_header())
-			if not match:
-				print('[INFO]: MID value not found in "%s"' % header)
-				continue
-			m = match[0].split('/') # EG m = ['#3', '1']
-			num = int(m[0][1:])
-			if num in mid_list:
-				read.write_to_file(outhandles[num])
-				out_nums[num] += 1
+		for num, read in split_by_header(fastq_records(infh, errors), mid_list, out_nums):
+			read.write_to_file(outhandles[num])
 				
 	for k, v in outhandles.items():
 		print('[INFO]: Sequences with MID %d: %d' % (k, out_nums[k]))
 		v.close()
 		if out_nums[k] == 0:
-			os.unlink('%s.%d.fq' % (outprefix, k))
\ No newline at end of file
+			os.unlink('%s.%d.fq' % (outprefix, k))
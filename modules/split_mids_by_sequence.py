@@ -22,10 +22,27 @@ provided as a file in the format "Number\tSequence". EG:
 # You should have received a copy of the GNU General Public License
 # along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
 
-import os
+import copy, os, sys
 from fastq import *
+from checkpoint import Checkpoint, CheckpointInterval, open_outputs
 
-def custom_tags_to_dict(infh):
+# Hard-coded 454 Rapid library MID tags
+RapidLibraryTags = {
+1: 'ACACGACGACT', 2: 'ACACGTAGTAT', 3: 'ACACTACTCGT', 4: 'ACGACACGTAT',
+5: 'ACGAGTAGACT', 6: 'ACGCGTCTAGT' ,7: 'ACGTACACACT', 8: 'ACGTACTGTGT',
+9: 'ACGTAGATCGT', 10:'ACTACGTCTCT', 11:'ACTATACGAGT', 12:'ACTCGCGTCGT',
+13:'AGACTCGACGT', 14:'AGTACGAGAGT', 15:'AGTACTACTAT', 16:'AGTAGACGTCT',
+17:'AGTCGTACACT', 18:'AGTGTAGTAGT', 19:'ATAGTATACGT', 20:'CAGTACGTACT',
+21:'CGACGACGCGT', 22:'CGACGAGTACT', 23:'CGATACTACGT', 24:'CGTACGTCGAT',
+25:'CTACTCGTAGT', 26:'GTACAGTACGT', 27:'GTCGTACGTAT', 28:'GTGTACGACGT',
+29:'ACACAGTGAGT', 30:'ACACTCATACT', 31:'ACAGACAGCGT', 32:'ACAGACTATAT',
+33:'ACAGAGACTCT', 34:'ACAGCTCGTGT', 35:'ACAGTGTCGAT', 36:'ACGAGCGCGCT',
+37:'ACGATGAGTGT', 38:'ACGCGAGAGAT', 39:'ACGCTCTCTCT', 40:'ACGTCGCTGAT',
+41:'ACGTCTAGCAT', 42:'ACTAGTGATAT', 43:'ACTCACACTGT', 44:'ACTCACTAGCT',
+45:'ACTCTATATAT', 46:'ACTGATCTCGT', 47:'ACTGCTGTACT', 48:'ACTGTAGCGCT'
+}
+
+def custom_tags_to_dict(custom_fh):
 	custom_dict = {}
 	for line in custom_fh:
 		line = line.rstrip("\r\n")
@@ -35,66 +52,92 @@ def custom_tags_to_dict(infh):
 		try:
 			mid_num = int(split_line[0])
 		except ValueError:
-			print('[ERROR]: Unable to convert "%s" into a MID number')
+			print('[ERROR]: Unable to convert "%s" into a MID number' % split_line[0])
 			raise
 		mid_seq = split_line[1]
 		if mid_seq in custom_dict.values():
-			raise RuntimeError('MID sequence "%s" is present more than once')
+			raise RuntimeError('MID sequence "%s" is present more than once' % mid_seq)
 		custom_dict[mid_num] = mid_seq
 	return custom_dict
 
-def main(infile, outprefix, mid_list, customfile=None):
+def mid_tags(customfile=None):
+	# Returns the MID number to tag sequence dictionary, from customfile if given
+	if customfile is None:
+		return RapidLibraryTags
+	with open(customfile, 'r') as customfh:
+		return custom_tags_to_dict(customfh)
+
+def sequence_mids(sequence, tags, mid_list):
+	# Returns the MIDs of mid_list whose tag the sequence starts with
+	return [mid for mid in mid_list if sequence.startswith(tags[mid])]
+
+def split_by_sequence(reads, tags, mid_list, mid_counts):
+	'''Generator of (MID, FastqRecord) pairs sending each of the FastqRecords reads on
+	to every MID of mid_list whose tag (from tags) it starts with, with the tag
+	removed. Reads are counted in mid_counts.'''
+	for read in reads:
+		for mid in sequence_mids(read.get_sequence(), tags, mid_list):
+			tagged = copy.copy(read)
+			tagged.remove_bases(0, len(tags[mid]))
+			mid_counts[mid] = mid_counts.get(mid, 0) + 1
+			yield (mid, tagged)
+
+def main(infile, outprefix, mid_list, customfile=None, checkpoint_file=None, resume=False, checkpoint_every=CheckpointInterval):
+	'''Splits a FASTQ file into <outprefix>.<MID>.fq readsets by the MID tag each read
+	starts with. With checkpoint_file, a checkpoint is saved every checkpoint_every
+	reads (and removed at the end), and if resume is True the run carries on from the
+	checkpoint left by an earlier run that was killed.'''
 	outhandles = {}
 	out_nums = {}
-	with open(infile, 'r') as infh:
-		
-		if customfile is not None:
-			try:
-				customfh = open(customfile, 'r')
-			except IOError as err:
-				print('[ERROR]: %s' % err)
-				sys.exit(2)
-			else:
-				tags = custom_tags_to_dict(customfh)
-				customfh.close()
-		else:
-			# Hard-coded 454 Rapid library MID tags
-			tags = {
-			1: 'ACACGACGACT', 2: 'ACACGTAGTAT', 3: 'ACACTACTCGT', 4: 'ACGACACGTAT',
-			5: 'ACGAGTAGACT', 6: 'ACGCGTCTAGT' ,7: 'ACGTACACACT', 8: 'ACGTACTGTGT',
-			9: 'ACGTAGATCGT', 10:'ACTACGTCTCT', 11:'ACTATACGAGT', 12:'ACTCGCGTCGT',
-			13:'AGACTCGACGT', 14:'AGTACGAGAGT', 15:'AGTACTACTAT', 16:'AGTAGACGTCT',
-			17:'AGTCGTACACT', 18:'AGTGTAGTAGT', 19:'ATAGTATACGT', 20:'CAGTACGTACT',
-			21:'CGACGACGCGT', 22:'CGACGAGTACT', 23:'CGATACTACGT', 24:'CGTACGTCGAT',
-			25:'CTACTCGTAGT', 26:'GTACAGTACGT', 27:'GTCGTACGTAT', 28:'GTGTACGACGT',
-			29:'ACACAGTGAGT', 30:'ACACTCATACT', 31:'ACAGACAGCGT', 32:'ACAGACTATAT',
-			33:'ACAGAGACTCT', 34:'ACAGCTCGTGT', 35:'ACAGTGTCGAT', 36:'ACGAGCGCGCT',
-			37:'ACGATGAGTGT', 38:'ACGCGAGAGAT', 39:'ACGCTCTCTCT', 40:'ACGTCGCTGAT',
-			41:'ACGTCTAGCAT', 42:'ACTAGTGATAT', 43:'ACTCACACTGT', 44:'ACTCACTAGCT',
-			45:'ACTCTATATAT', 46:'ACTGATCTCGT', 47:'ACTGCTGTACT', 48:'ACTGTAGCGCT'
-			}
+	checkpoint = None
+	state = None
+	if checkpoint_file is not None:
+		checkpoint = Checkpoint(checkpoint_file, [infile, customfile], {'outprefix': outprefix, 'mids': mid_list}, checkpoint_every)
+		if resume is True:
+			state = checkpoint.load()
+			if state is None:
+				print('[WARNING]: No checkpoint found at "%s", starting from the first read' % checkpoint_file)
+	with open(infile, 'r' if checkpoint is None else 'rb') as infh:
+		try:
+			tags = mid_tags(customfile)
+		except IOError as err:
+			print('[ERROR]: %s' % err)
+			sys.exit(2)
 		# "tags" now contains the MID and sequence as a dictionary
 		# Open the output filehandles. 0 is for sequences which can't be assigned a MID
 		try:
-			for mid in mid_list:
-				outfile = '%s.%d.fq' % (outprefix, mid)
-				outhandles[mid] = open(outfile, 'w')
+			outfiles = ['%s.%d.fq' % (outprefix, mid) for mid in mid_list]
+			for mid, outfh in zip(mid_list, open_outputs(outfiles, state)):
+				outhandles[mid] = outfh
 				out_nums[mid] = 0
 		except IOError as err:
 			raise
+		records = 0
+		offset = 0
+		if state is not None:
+			records = state['records']
+			offset = state['offsets'][0]
+			out_nums.update(dict(state['counters']))
+			print('[INFO]: Resuming from read %d, as saved in checkpoint "%s"' % (records + 1, checkpoint_file))
+		if checkpoint is None:
+			reads = ((header, sequence, quality, None) for header, sequence, quality in fastq_iterator(infh))
+		else:
+			reads = fastq_offset_iterator(infh, offset)
 				
 		# Loop through the FASTQ file and check if the sequence starts with the tag
 		# If it doesn't match, it is assigned to 0.
-		for header, sequence, quality in fastq_iterator(infh):
-			read = FastqRecord(header, sequence, quality)
-			for mid in mid_list:
-				if sequence.startswith(tags[mid]):
-					read.write_to_file(outhandles[mid], start=len(tags[mid]))
-					out_nums[mid] += 1
-					continue
+		for header, sequence, quality, end in reads:
+			if checkpoint is not None and checkpoint.due(records):
+				checkpoint.save(records, [offset], list(outhandles.values()), list(out_nums.items()))
+			offset = end
+			records += 1
+			for mid, read in split_by_sequence([FastqRecord(header, sequence, quality)], tags, mid_list, out_nums):
+				read.write_to_file(outhandles[mid])
 			
 	for k, v in outhandles.items():
 		print('[INFO]: Sequences with MID %d: %d' % (k, out_nums[k]))
 		v.close()
 		if out_nums[k] == 0:
-			os.unlink('%s.%d.fq' % (outprefix, k))
\ No newline at end of file
+			os.unlink('%s.%d.fq' % (outprefix, k))
+	if checkpoint is not None:
+		checkpoint.remove()
\ No newline at end of file
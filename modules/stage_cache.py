@@ -0,0 +1,105 @@
+'''Remembers the outputs of earlier runs of a stage so that a re-run with the same
+inputs and parameters can reuse them instead of doing the work again. A stage is
+keyed by a fingerprint of its input files (a SHA-256 of their contents, or their
+size and modification time in fast mode) and its parameters. Entries are dropped
+if any of their outputs have since been changed or removed.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib, json, os
+
+CacheVersion = 1 # increase when the cached outputs of a stage change format
+
+class StageCache:
+	'''The stage entries of a JSON cache file. With force, entries already in the file
+	are ignored (and replaced as stages are stored again).'''
+
+	def __init__(self, cachefile, fast=False, force=False):
+		self.cachefile = cachefile
+		self.fast = fast
+		self.entries = {}
+		self._fingerprints = {}
+		if force is False and os.path.exists(cachefile):
+			try:
+				with open(cachefile, 'r') as infh:
+					cached = json.load(infh)
+				if cached.get('version') == CacheVersion:
+					self.entries = cached['stages']
+			except (ValueError, KeyError):
+				print('[WARNING]: Ignoring unreadable stage cache "%s"' % cachefile)
+
+	def fingerprint(self, path):
+		'''Returns the fingerprint of an input file, or None if it doesn't exist'''
+		if path is None or not os.path.exists(path):
+			return None
+		if path not in self._fingerprints:
+			if self.fast is True:
+				self._fingerprints[path] = output_state(path)
+			else:
+				self._fingerprints[path] = file_hash(path)
+		return self._fingerprints[path]
+
+	def key(self, inputs, parameters):
+		'''Returns the key of a stage run on the list of input files with a dictionary
+		of JSON-serialisable parameters'''
+		keyed = {	'fast': self.fast, 'parameters': parameters,
+					'inputs': [(os.path.abspath(path), self.fingerprint(path)) for path in inputs if path is not None] }
+		return hashlib.sha256(json.dumps(keyed, sort_keys=True).encode()).hexdigest()
+
+	def lookup(self, stage, key):
+		'''Returns the data stored with the stage if its key matches and its outputs are
+		as they were left, otherwise None'''
+		entry = self.entries.get(stage)
+		if entry is None or entry['key'] != key:
+			return None
+		for path, state in entry['outputs'].items():
+			if output_state(path) != state:
+				return None
+		return entry['data']
+
+	def store(self, stage, key, outputs, data=None):
+		'''Records the outputs (list of files) of the stage and any JSON-serialisable
+		data needed to reuse them, and saves the cache file'''
+		self.entries[stage] = {	'key': key, 'data': data,
+								'outputs': dict([(path, output_state(path)) for path in outputs]) }
+		self.save()
+
+	def save(self):
+		# Written to a temporary file first so an interrupted run can't leave it half written
+		temporary = self.cachefile + '.tmp'
+		with open(temporary, 'w') as outfh:
+			json.dump({'version': CacheVersion, 'stages': self.entries}, outfh, indent=1)
+			outfh.write('\n')
+		os.replace(temporary, self.cachefile)
+
+# --- END OF CLASS --- #
+
+def file_hash(path):
+	sha = hashlib.sha256()
+	with open(path, 'rb') as infh:
+		for block in iter(lambda: infh.read(1 << 20), b''):
+			sha.update(block)
+	return sha.hexdigest()
+
+def output_state(path):
+	# Size and modification time of a file, or None if it doesn't exist
+	if not os.path.exists(path):
+		return None
+	stat = os.stat(path)
+	return [stat.st_size, stat.st_mtime_ns]
@@ -0,0 +1,158 @@
+'''Draws the depth and minority plots of the pileup_*_graph scripts as SVG pages
+without R. Positions are binned to the pixel width of the plot area (min, mean
+and max per bin) before drawing, so the size of a page does not depend on the
+length of the genome. Pages are rendered in parallel.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from array import array
+
+PageWidth = 4960 # same size as the R jpegs
+PageHeight = 7016
+MarginLeft = 400
+MarginRight = 100
+MarginTop = 150
+MarginBottom = 200
+FontSize = 60
+PlotWidth = PageWidth - MarginLeft - MarginRight
+MinorityColours = ('darkgreen', 'darkblue', 'darkgoldenrod', 'red') # A, C, G, T
+
+def bin_bounds(length, bins=PlotWidth):
+	'''Returns (start, end) indices splitting length positions into at most bins bins'''
+	bins = max(1, min(bins, length))
+	return [(length * b // bins, length * (b + 1) // bins) for b in range(bins)]
+
+def bin_values(values, start, end, bins=PlotWidth):
+	'''Returns (mins, means, maxs) arrays of values[start:end] binned to at most bins bins.
+	The arrays are empty if the range is.'''
+	mins = array('d')
+	means = array('d')
+	maxs = array('d')
+	if end <= start:
+		return (mins, means, maxs)
+	for first, last in bin_bounds(end - start, bins):
+		chunk = values[start+first:start+last]
+		mins.append(min(chunk))
+		means.append(sum(chunk) / len(chunk))
+		maxs.append(max(chunk))
+	return (mins, means, maxs)
+
+def upper_limit(max_value):
+	# Rounds the Y-axis maximum up in the same way as the R scripts
+	for step in (1000, 100, 10):
+		if max_value - step > 0:
+			return max_value + step - (max_value % step)
+	return max_value + 10 - (max_value % 10)
+
+def depth_panel(depths, start, end, first_label, title, y_max):
+	'''Returns a panel for render_pages() plotting depths[start:end]. Bins containing
+	an uncovered position are shaded grey.'''
+	n = end - start
+	total = sum(depths[start:end])
+	mean = total / n if n > 0 else 0.0
+	sd = math.sqrt(sum([(d - mean) ** 2 for d in depths[start:end]]) / (n - 1)) if n > 1 else 0.0
+	mins, means, maxs = bin_values(depths, start, end)
+	shaded = [m == 0 for m in mins]
+	title = '%s mean coverage: %.2f +/- %.2f' % (title, mean, sd)
+	return ('depth', title, first_label, n, y_max, shaded, (mins, means, maxs))
+
+def minority_panel(minorities, low_coverage, start, end, first_label, title, y_max):
+	'''Returns a panel for render_pages() plotting the mean A, C, G and T minority
+	frequencies of minorities[0-3][start:end] as stacked bars. Bins containing a
+	low-coverage position are shaded grey.'''
+	n = end - start
+	shaded = [m > 0 for m in bin_values(low_coverage, start, end)[2]]
+	stacks = [bin_values(column, start, end)[1] for column in minorities]
+	return ('minority', title, first_label, n, y_max, shaded, stacks)
+
+def _axes(x, y, width, height, first_label, n, y_max):
+	elements = ['<rect x="%d" y="%d" width="%d" height="%d" fill="none" stroke="black" stroke-width="4"/>' % (x, y, width, height)]
+	for t in range(11):
+		ty = y + height - height * t / 10
+		elements.append('<line x1="%d" y1="%.1f" x2="%d" y2="%.1f" stroke="black" stroke-width="3"/>' % (x - 25, ty, x, ty))
+		elements.append('<text x="%d" y="%.1f" font-size="%d" text-anchor="end">%s</text>' % (x - 35, ty + FontSize / 3, FontSize, '%g' % round(y_max * t / 10, 3)))
+	step = max(1, n // 20)
+	for p in range(0, n, step):
+		tx = x + width * p / n
+		elements.append('<line x1="%.1f" y1="%d" x2="%.1f" y2="%d" stroke="black" stroke-width="3"/>' % (tx, y + height, tx, y + height + 25))
+		elements.append('<text x="%.1f" y="%d" font-size="%d" text-anchor="middle">%d</text>' % (tx, y + height + 25 + FontSize, FontSize, first_label + p))
+	return elements
+
+def _render_panel(panel, x, y, width, height):
+	kind, title, first_label, n, y_max, shaded, data = panel
+	bins = len(shaded)
+	bin_width = width / bins if bins > 0 else width
+	y_max = y_max if y_max > 0 else 1
+	scale = height / y_max
+	elements = []
+	b = 0
+	while b < bins: # one grey rectangle per run of shaded bins
+		if shaded[b]:
+			first = b
+			while b < bins and shaded[b]:
+				b += 1
+			elements.append('<rect x="%.1f" y="%d" width="%.1f" height="%d" fill="#cccccc"/>' % (x + first * bin_width, y, (b - first) * bin_width, height))
+		b += 1
+	if kind == 'depth':
+		mins, means, maxs = data
+		top = ['%.1f,%.1f' % (x + (b + 0.5) * bin_width, y + height - min(v, y_max) * scale) for b, v in enumerate(maxs)]
+		bottom = ['%.1f,%.1f' % (x + (b + 0.5) * bin_width, y + height - min(v, y_max) * scale) for b, v in reversed(list(enumerate(mins)))]
+		line = ['%.1f,%.1f' % (x + (b + 0.5) * bin_width, y + height - min(v, y_max) * scale) for b, v in enumerate(means)]
+		elements.append('<polygon points="%s" fill="#9999ff" stroke="none"/>' % ' '.join(top + bottom))
+		elements.append('<polyline points="%s" fill="none" stroke="blue" stroke-width="3"/>' % ' '.join(line))
+		y_label = 'Read depth'
+	else:
+		base = [0.0] * bins
+		for column, colour in zip(data, MinorityColours):
+			for b, v in enumerate(column):
+				if v > 0:
+					elements.append('<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f" fill="%s"/>' % (x + b * bin_width, y + height - (base[b] + v) * scale, bin_width, v * scale, colour))
+					base[b] += v
+		for i, colour in enumerate(MinorityColours):
+			elements.append('<text x="%d" y="%d" font-size="%d" fill="%s">%s</text>' % (x + 20 + i * 120, y + FontSize + 10, FontSize, colour, 'ACGT'[i]))
+		y_label = 'Read frequency'
+	elements.append('<text x="%.1f" y="%d" font-size="%d" text-anchor="middle">%s</text>' % (x + width / 2, y - 30, FontSize, title.replace('&', '&amp;').replace('<', '&lt;')))
+	elements.append('<text x="%d" y="%.1f" font-size="%d" text-anchor="middle" transform="rotate(-90 %d %.1f)">%s</text>' % (x - 300, y + height / 2, FontSize, x - 300, y + height / 2, y_label))
+	return elements + _axes(x, y, width, height, first_label, n, y_max)
+
+def render_page(outfile, panels, num_graphs):
+	'''Writes panels (at most num_graphs) to outfile as one SVG page'''
+	slot = PageHeight / num_graphs
+	elements = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" font-family="sans-serif">' % (PageWidth, PageHeight),
+				'<rect width="100%" height="100%" fill="white"/>']
+	for i, panel in enumerate(panels):
+		elements.extend(_render_panel(panel, MarginLeft, slot * i + MarginTop, PlotWidth, slot - MarginTop - MarginBottom))
+	elements.append('</svg>')
+	with open(outfile, 'w') as outfh:
+		outfh.write('\n'.join(elements) + '\n')
+	return outfile
+
+def _render_page_star(args):
+	return render_page(*args)
+
+def render_pages(outpattern, panels, num_graphs, processes=1):
+	'''Splits panels into pages of num_graphs and writes each to outpattern % page
+	number (from 1). Returns the list of files written.'''
+	jobs = [(outpattern % (p // num_graphs + 1), panels[p:p+num_graphs], num_graphs) for p in range(0, len(panels), num_graphs)]
+	import multiprocessing
+	if processes <= 1 or len(jobs) <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+		return [render_page(*job) for job in jobs]
+	with multiprocessing.get_context('fork').Pool(min(processes, len(jobs))) as pool:
+		return pool.map(_render_page_star, jobs)
@@ -0,0 +1,99 @@
+'''Writes minority variants as VCF, streamed from the pileup one position at a time.
+Each record has the segment as its contig, the alleles other than the reference
+base above a frequency cutoff as ALT, and their frequencies, the depth, the majority
+base and the per-strand allele counts in the FORMAT fields of a single sample column,
+so that the files of many samples can be merged (eg with bcftools merge). Output can
+be bgzip-compressed for tabix.
+'''
+
+# Copyright 2010, 2011 Simon Watson
+#
+# This file is part of QUASR.
+#
+# QUASR is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUASR is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUASR.  If not, see <http://www.gnu.org/licenses/>.
+
+from pileup import *
+from minority import *
+
+VcfFormat = 'DP:AF:MAJ:ADF:ADR'
+VcfFormatHeader = (	'##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Number of bases passing the Phred cutoff">',
+					'##FORMAT=<ID=AF,Number=A,Type=Float,Description="Frequency of each ALT allele">',
+					'##FORMAT=<ID=MAJ,Number=1,Type=String,Description="Majority base">',
+					'##FORMAT=<ID=ADF,Number=R,Type=Integer,Description="Forward strand count of each allele">',
+					'##FORMAT=<ID=ADR,Number=R,Type=Integer,Description="Reverse strand count of each allele">' )
+
+def vcf_header(sample, contigs=()):
+	'''Returns the VCF header lines, with a column for sample. contigs is a list of
+	(name, length)'''
+	lines = ['##fileformat=VCFv4.2', '##source=QUASR']
+	lines.extend(['##contig=<ID=%s,length=%d>' % contig for contig in contigs])
+	lines.extend(VcfFormatHeader)
+	lines.append('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t%s' % sample)
+	return '\n'.join(lines) + '\n'
+
+def call_variants(positions, phred_cutoff=0, ascii_offset=33, frequency_cutoff=0.05, depth_cutoff=0, base_list='ACGT*', batch_size=10000):
+	'''Takes the positions yielded by pileup_iterator() and yields
+	(segment, position, reference base, ALT bases, count_bases() tuple,
+	count_strand_bases() tuples, majority base) for each position with a base other
+	than the reference above frequency_cutoff. Positions with depth_cutoff bases or
+	fewer are skipped. Bases are counted batch_size positions at a time.
+	'''
+	batch = []
+	for segment, position, reference_base, depth, reads, qualities in positions:
+		if reads == '':
+			continue
+		batch.append((segment, position, reference_base.upper(), parse_read_column(reads, qualities, reference_base, phred_cutoff, ascii_offset, position, True, segment)))
+		if len(batch) >= batch_size:
+			for variant in _batch_variants(batch, frequency_cutoff, depth_cutoff, base_list):
+				yield variant
+			batch = []
+	for variant in _batch_variants(batch, frequency_cutoff, depth_cutoff, base_list):
+		yield variant
+
+def _batch_variants(batch, frequency_cutoff, depth_cutoff, base_list):
+	# The call_variants() records of a batch of (segment, position, reference base, parsed bases)
+	variants = []
+	for (segment, position, reference_base, bases), counts in zip(batch, zip(*count_base_columns([row[3] for row in batch]))):
+		total = counts[-1]
+		if total == 0 or total <= depth_cutoff:
+			continue
+		alts = [base for base in base_list if base != reference_base and counts[PileupFile.CountedBases.index(base)] / total > frequency_cutoff]
+		if alts:
+			variants.append((segment, position, reference_base, alts, counts, count_strand_bases(bases), majority_base(counts, base_list)[0]))
+	return variants
+
+def format_variant(variant):
+	segment, position, reference_base, alts, counts, strands, majority = variant
+	alleles = [reference_base] + alts
+	indices = [PileupFile.CountedBases.index(base) if base in PileupFile.CountedBases else None for base in alleles]
+	forward = ','.join(['%d' % strands[0][i] if i is not None else '0' for i in indices])
+	reverse = ','.join(['%d' % strands[1][i] if i is not None else '0' for i in indices])
+	frequencies = ','.join(['%.4g' % (counts[i] / counts[-1]) for i in indices[1:]])
+	return '%s\t%d\t.\t%s\t%s\t.\t.\t.\t%s\t%d:%s:%s:%s:%s\n' % (segment, position, reference_base, ','.join(alts), VcfFormat, counts[-1], frequencies, majority, forward, reverse)
+
+def write_vcf(outfh, variants, batch_size=10000):
+	'''Writes the records from call_variants() batch_size at a time. outfh may be a
+	BgzfWriter. Returns the number of records written.'''
+	written = 0
+	batch = []
+	for variant in variants:
+		batch.append(format_variant(variant))
+		if len(batch) >= batch_size:
+			outfh.write(''.join(batch))
+			written += len(batch)
+			batch = []
+	if batch:
+		outfh.write(''.join(batch))
+		written += len(batch)
+	return written
@@ -27,6 +27,10 @@ import sys, getopt
 sys.path.append('/Users/sw10/Dropbox/Sanger/QUASR/QUASR_v6.09/modules/')
 try:
 	import qc, qa
+	from metrics import *
+	from profiling import StageProfiler
+	from checkpoint import CheckpointInterval
+	from error_report import ErrorReport, ErrorExamples
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -59,10 +63,22 @@ usage = '''[USAGE]: %s <options>
 -p   [File]\tPath to R binary for stats generation and graphing (--path)
 -e   [Integer]\tNumber of bases to graph 3' mean quality dropoff [15] (--end)
 
+--METRICS--
+-k   [File]\tWrite per-stage timing, throughput and memory metrics to a JSON file (--metrics)
+--profile [None]\tProfile each stage to <outprefix>.<stage>.pstats and .folded (collapsed stacks)
+
+--CHECKPOINTS--
+--checkpoint [Integer]\tReads between checkpoints saved to <outprefix>.checkpoint.json, 0 for none [100000]
+--resume [None]\tCarry on from the checkpoint left by a run that was killed
+
+--ERRORS--
+--max-errors [Integer]\tMalformed reads of each kind to report before only counting them [10]
+--rejected [None]\tWrite malformed reads to <outprefix>.rejected.tsv
+
 [NOTE]: Options with * are mandatory. All others are optional.''' % prog
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "hf:r:o:im:l:ge:p:", ["help", "forward=", "reverse=", "outprefix=", "illumina", "median=", "length=", "graphs", "end=", "path="])
+	opts, args = getopt.getopt(sys.argv[1:], "hf:r:o:im:l:ge:p:k:", ["help", "forward=", "reverse=", "outprefix=", "illumina", "median=", "length=", "graphs", "end=", "path=", "metrics=", "profile", "checkpoint=", "resume", "max-errors=", "rejected"])
 except getopt.GetoptError as err:
 	print(str(err))
 	print(usage)
@@ -78,6 +94,12 @@ perform_qa = False
 end_length = 15
 r_path = None
 paired = False
+metrics_file = None
+profile = False
+checkpoint_every = CheckpointInterval
+resume = False
+max_errors = ErrorExamples
+write_rejected = False
 
 for o,a in opts:
 	if o in ("-h", "--help"):
@@ -102,6 +124,18 @@ for o,a in opts:
 		median_cutoff = int(a)
 	elif o in ("-l", "--length"):
 		length_cutoff = int(a)
+	elif o in ("-k", "--metrics"):
+		metrics_file = a
+	elif o == "--profile":
+		profile = True
+	elif o == "--checkpoint":
+		checkpoint_every = int(a)
+	elif o == "--resume":
+		resume = True
+	elif o == "--max-errors":
+		max_errors = int(a)
+	elif o == "--rejected":
+		write_rejected = True
 	else:
 		assert False, "[ERROR]: Unhandled option"
 	
@@ -121,6 +155,15 @@ elif median_cutoff is None:
 elif length_cutoff is None:
 	print('[ERROR]: Length cutoff value must be specified')
 	sys.exit(2)
+elif checkpoint_every < 0:
+	print('[ERROR]: Number of reads between checkpoints cannot be negative')
+	sys.exit(2)
+elif resume is True and checkpoint_every == 0:
+	print('[ERROR]: Cannot resume a run without checkpoints')
+	sys.exit(2)
+elif max_errors < 0:
+	print('[ERROR]: Number of malformed reads to report cannot be negative')
+	sys.exit(2)
 
 if rev_file is not None:
 	paired = True
@@ -129,14 +172,38 @@ else:
 	outfile_r = None
 	
 outfile_f = outprefix + '.f.fq'
+checkpoint_file = outprefix + '.checkpoint.json' if checkpoint_every > 0 else None
+errors = ErrorReport(max_errors, outprefix + '.rejected.tsv' if write_rejected is True else None)
 
 print('[INFO]: Input parameters successfully parsed')
-qc.main(for_file, outfile_f, rev_file, outfile_r, paired, ascii_offset, median_cutoff, length_cutoff)
+metrics = Metrics(profiler=StageProfiler() if profile is True else None)
+with metrics.stage('qc') as stage:
+	try:
+		stats = qc.main(for_file, outfile_f, rev_file, outfile_r, paired, ascii_offset, median_cutoff, length_cutoff, checkpoint_file, resume, checkpoint_every, errors)
+	except RuntimeError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
+passed = 0
+if isinstance(stats, dict):
+	passed = stats['passed']
+	stage.count(stats['total'], passed, file_size(for_file) + file_size(rev_file), file_size(outfile_f) + file_size(outfile_r))
 
 if perform_qa is True:
 	graphfile_f = outprefix + '.f.jpg'
-	qa.main(outfile_f, graphfile_f, r_path, ascii_offset, end_length)
+	with metrics.stage('qa') as stage:
+		qa.main(outfile_f, graphfile_f, r_path, ascii_offset, end_length, errors)
+	stage.count(passed, bytes_read=file_size(outfile_f), bytes_written=file_size(graphfile_f))
 	
 	if paired is True:
 		graphfile_r = outprefix + '.r.jpg'
-		qa.main(outfile_r, graphfile_r, r_path, ascii_offset, end_length)
\ No newline at end of file
+		with metrics.stage('qa') as stage:
+			qa.main(outfile_r, graphfile_r, r_path, ascii_offset, end_length, errors)
+		stage.count(passed, bytes_read=file_size(outfile_r), bytes_written=file_size(graphfile_r))
+errors.close()
+
+if metrics_file is not None:
+	metrics.write_json(metrics_file)
+	print('[INFO]: Metrics written to "%s"' % metrics_file)
+if profile is True:
+	metrics.profiler.write(outprefix)
+	print('[INFO]: Stage profiles written to "%s.<stage>.pstats" and "%s.<stage>.folded"' % (outprefix, outprefix))
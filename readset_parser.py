@@ -5,6 +5,8 @@
 2) Split FASTQ by MID
 3) Remove primer or BAC sequences
 4) Create QA graphs
+The steps are run as one streaming pass over the reads (modules/readset_pipeline.py)
+and only the final readset of each MID is written.
 '''
 
 # Copyright 2010, 2011 Simon Watson
@@ -27,7 +29,11 @@
 import sys, getopt
 sys.path.append('/nfs/users/nfs_s/sw10/QUASR6/modules/')
 try:
-	import sff_to_fastq, qa, split_mids_by_header, split_mids_by_sequence, fastq_primer_remover
+	import qa, split_mids_by_sequence, fastq_primer_remover
+	from readset_pipeline import *
+	from metrics import *
+	from profiling import StageProfiler
+	from stage_cache import StageCache
 except ImportError:
 	print("[ERROR]: Path to QUASR modules not set in script. See 'docs/INSTALL' for more info")
 	sys.exit(1)
@@ -68,10 +74,21 @@ OR
 -p   [File]\tPath to R binary for stats generation and graphing (--path)
 -e   [Integer]\tNumber of bases to graph 3' mean quality dropoff [15] (--end)
 
-[NOTE]: Options with * are mandatory. Those with + are mandatory for that optional section.''' % prog
+--METRICS--
+-k   [File]\tWrite per-stage timing, throughput and memory metrics to a JSON file (--metrics)
+--profile [None]\tProfile each stage to <outprefix>.<stage>.pstats and .folded (collapsed stacks)
+
+--CACHING--
+--cache [None]\tReuse the readsets, or MID-split reads, of an earlier run with the same inputs and options
+--cache-fast [None]\tAs --cache, but tell input files are unchanged by size and time modified, not contents
+--force [None]\tIgnore and rebuild anything cached by earlier runs
+
+[NOTE]: Options with * are mandatory. Those with + are mandatory for that optional section.
+[NOTE]: The cache is kept in <outprefix>.cache.json, with MID-split reads in <outprefix>.cache.<MID>.fq
+        when primers are removed''' % prog
 
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "hf:o:im:c:dsrl:t:ga:p:e:", ["help", "infile=", "outprefix=", "illumina", "mids=", "customfile=", "header", "sequence", "remove", "primerlist=", "trimfile=", "graphs", "graphlist=", "path=", "end="])
+	opts, args = getopt.getopt(sys.argv[1:], "hf:o:im:c:dsrl:t:ga:p:e:k:", ["help", "infile=", "outprefix=", "illumina", "mids=", "customfile=", "header", "sequence", "remove", "primerlist=", "trimfile=", "graphs", "graphlist=", "path=", "end=", "metrics=", "profile", "cache", "cache-fast", "force"])
 except getopt.GetoptError as err:
 	print(str(err))
 	print(usage)
@@ -94,6 +111,10 @@ graph_list = None
 r_path = None
 ascii_offset = 33
 end_length = 15
+metrics_file = None
+profile = False
+cache_mode = None
+force = False
 
 for o,a in opts:
 	if o in ("-h", "--help"):
@@ -128,6 +149,16 @@ for o,a in opts:
 		end_length = int(a)
 	elif o in ("-p", "--path"):
 		r_path = a
+	elif o in ("-k", "--metrics"):
+		metrics_file = a
+	elif o == "--profile":
+		profile = True
+	elif o == "--cache":
+		cache_mode = 'hash'
+	elif o == "--cache-fast":
+		cache_mode = 'fast'
+	elif o == "--force":
+		force = True
 	else:
 		assert False, "[ERROR]: Unhandled option"
 	
@@ -163,6 +194,9 @@ elif primer_list is not None and mid_list is None:
 elif graph_list is not None and mid_list is None:
 	print('[ERROR]: Graph list cannot be parsed without a MID list')
 	sys.exit(2)
+elif force is True and cache_mode is None:
+	print('[ERROR]: "--force" only applies with "--cache" or "--cache-fast"')
+	sys.exit(2)
 
 
 def convert_csv_to_list(csv):
@@ -176,85 +210,180 @@ def convert_csv_to_list(csv):
 		return values
 
 
-# 1) Convert SFF to FASTQ
-if infile.endswith('.sff') or infile.endswith('.SFF'):
-	outfile = '%s.fq' % outprefix
-	print('[INFO]: Converting "%s" to "%s"' % (infile, outfile))
-	sff_to_fastq.main(infile, outfile)
-	infile = outfile
+def readset_name(mid):
+	# Output prefix of the final readset for a MID (None without MID splitting)
+	name = outprefix if mid is None else '%s.%d' % (outprefix, mid)
+	if remove_primers is True and (primer_list is None or mid in primer_list):
+		name += '.trim'
+	return name
 
-# 2) Split by MID
-if split_by_header is True or split_by_sequence is True:
+def sinks_for_mid(mid):
+	name = readset_name(mid)
+	sinks = []
+	if write_fastq is True:
+		sink = FastqSink(name + '.fq')
+		sink.write = metrics.timed_call('write_fastq', sink.write)
+		sinks.append(sink)
+	if perform_qa is True and (graph_list is None or mid in graph_list):
+		sink = QaSink(name + '.fq' if write_fastq is True or reused is not None else infile, name + '.jpg', ascii_offset, end_length)
+		sink.write = metrics.timed_call('qa_data', sink.write)
+		sinks.append(sink)
+	return sinks
+
+# Parse the MID subsets for each step
+if mid_list is not None:
 	try:
 		mid_list = convert_csv_to_list(mid_list)
 	except ValueError as err:
 		print('[ERROR]: Unable to parse MID list: %s' % err)
 		sys.exit(2)
+	if primer_list is not None:
+		try:
+			primer_list = convert_csv_to_list(primer_list)
+		except ValueError as err:
+			print('[ERROR]: Unable to parse primer list: %s' % err)
+			sys.exit(2)
+		primer_list = [g for g in primer_list if g in mid_list]
 	else:
-		print('[INFO]: Extracting MIDs ' + str(mid_list) + ' from "%s"' % infile)
-	
+		primer_list = mid_list
+	if graph_list is not None:
+		try:
+			graph_list = convert_csv_to_list(graph_list)
+		except ValueError as err:
+			print('[ERROR]: Unable to parse graph list: %s' % err)
+			sys.exit(2)
+		graph_list = [g for g in graph_list if g in mid_list]
+	else:
+		graph_list = mid_list
+
+if perform_qa is True:
+	r_path = qa.check_R_path(r_path)
+	if r_path is None:
+		print('[WARNING]: QA graphs will not be created')
+		perform_qa = False
+
+# 1) Convert SFF to FASTQ and 2) Split by MID
+metrics = Metrics(profiler=StageProfiler() if profile is True else None)
+stages = []
+mid_counts = {}
+if split_by_header is True:
+	print('[INFO]: Extracting MIDs ' + str(mid_list) + ' from "%s"' % infile)
+	stages.append(metrics.timed_stage('split_mids_by_header', header_mid_stage(mid_list, mid_counts)))
+elif split_by_sequence is True:
 	try:
-		if split_by_header is True:
-			pass
-			split_mids_by_header.main(infile, outprefix, mid_list)
-		elif split_by_sequence is True:
-			split_mids_by_sequence.main(infile, outprefix, mid_list, customfile)
-	except IOError as err:
+		tags = split_mids_by_sequence.mid_tags(customfile)
+	except (IOError, RuntimeError, ValueError) as err:
 		print('[ERROR]: %s' % err)
 		sys.exit(2)
-		
+	missing = [mid for mid in mid_list if mid not in tags]
+	if missing:
+		print('[ERROR]: No tag sequence for MIDs ' + str(missing))
+		sys.exit(2)
+	print('[INFO]: Extracting MIDs ' + str(mid_list) + ' from "%s"' % infile)
+	stages.append(metrics.timed_stage('split_mids_by_sequence', sequence_mid_stage(mid_list, tags, mid_counts)))
+
 # 3) Remove primer or BAC sequences
+primers_count = {}
 if remove_primers is True:
+	try:
+		with open(trimfile, 'r') as primerfh:
+			primers = fastq_primer_remover.parse_primerfile_to_regex(primerfh)
+	except IOError as err:
+		print('[ERROR]: %s' % err)
+		sys.exit(2)
 	if mid_list is not None:
-		if primer_list is not None:
-			try:
-				primer_list = convert_csv_to_list(graph_list)
-			except ValueError as err:
-				print('[ERROR]: Unable to parse primer list: %s' % err)
-				sys.exit(2)
-			primer_list = [g for g in primer_list if g in mid_list]
-		else:
-			primer_list = mid_list
 		print('[INFO]: Removing primer sequences from MIDs ' + str(primer_list))
-		for a in primer_list:
-			infile = '%s.%d.fq' % (outprefix, a)
-			p_outprefix = outprefix + '.' + str(a)
-			try:
-				fastq_primer_remover.main(infile, p_outprefix, trimfile)
-			except IOError as err:
-				print('[ERROR]: %s' % err)
-	else:
-		fastq_primer_remover.main(infile, outprefix, trimfile)
-		infile = outprefix + '.trim.fq'
+	split_stages = list(stages)
+	stages.append(metrics.timed_stage('primer_remover', primer_stage(primers, primers_count, primer_list)))
 
-# 4) Perform QA, if specified
+# 4) Perform QA, if specified, on the reads reaching the end of the pipeline
+write_fastq = len(stages) > 0 or infile.endswith('.sff') or infile.endswith('.SFF')
+if write_fastq is False and perform_qa is False:
+	sys.exit()
 if perform_qa is True:
 	if mid_list is not None:
-		if graph_list is not None:
-			try:
-				graph_list = convert_csv_to_list(graph_list)
-			except ValueError as err:
-				print('[ERROR]: Unable to parse graph list: %s' % err)
-				sys.exit(2)
-			graph_list = [g for g in graph_list if g in mid_list]
-		else:
-			graph_list = mid_list
 		print('[INFO]: Creating QA graphs for MIDs ' + str(graph_list))
-		for a in graph_list:
-			if remove_primers is True:
-				infile = '%s.%d.trim.fq' % (outprefix, a)
-				graphfile = '%s.%d.trim.jpg' % (outprefix, a)
-			else:
-				infile = '%s.%d.fq' % (outprefix, a)
-				graphfile = '%s.%d.jpg' % (outprefix, a)
-			try:
-				qa.main(infile, graphfile, r_path, ascii_offset, end_length)
-			except IOError as err:
-				print('[ERROR]: %s' % err)
 	else:
 		print('[INFO]: Creating QA graphs of "%s"' % infile)
-		if remove_primers is True:
-			graphfile = outprefix + '.trim.jpg'
-		else:
-			graphfile = outprefix + '.jpg'
-		qa.main(infile, graphfile, r_path, ascii_offset, end_length)
\ No newline at end of file
+
+# 5) Reuse the readsets, or MID-split reads, of an earlier run with the same inputs and options
+source = 'sff_to_fastq' if infile.endswith('.sff') or infile.endswith('.SFF') else 'fastq_iterator'
+records = read_records(infile)
+tagged = False
+cache = None
+reused = None
+split_sinks = {}
+cache_split = remove_primers is True and (len(split_stages) > 0 or source == 'sff_to_fastq')
+if cache_mode is not None and write_fastq is True:
+	with metrics.stage('cache_lookup'):
+		cache = StageCache(outprefix + '.cache.json', cache_mode == 'fast', force)
+		split_parameters = {'header': split_by_header, 'sequence': split_by_sequence, 'mids': mid_list}
+		split_key = cache.key([infile, customfile], split_parameters)
+		readsets_key = cache.key([infile, customfile, trimfile], dict(split_parameters, primers=remove_primers, primer_mids=primer_list))
+		reused = cache.lookup('readsets', readsets_key)
+		split = cache.lookup('split', split_key) if reused is None and cache_split is True else None
+	if reused is not None:
+		print('[INFO]: Reusing the readsets of an earlier run with the same input and options ("--force" to rebuild them)')
+		mid_counts = dict(reused['mid_counts'])
+		primers_count = dict([(mid, dict(counts)) for mid, counts in reused['primers_count']])
+		written = dict(reused['written'])
+		source, records, tagged, stages = 'cached_readsets', readset_records([(mid, readset_name(mid) + '.fq') for mid in written]), True, []
+		write_fastq = False
+	elif split is not None:
+		print('[INFO]: Reusing the MID-split reads of an earlier run with the same input and options ("--force" to rebuild them)')
+		mid_counts.update(dict(split['mid_counts']))
+		source, records, tagged, stages = 'cached_split', readset_records(split['readsets']), True, stages[len(split_stages):]
+	elif cache_split is True:
+		def split_sink(mid):
+			return FastqSink('%s.cache.%s.fq' % (outprefix, mid if mid is not None else 'all'))
+		stages.insert(len(split_stages), tee_stage(split_sink, split_sinks))
+
+sinks = {}
+try:
+	if write_fastq is True or perform_qa is True:
+		sinks = run_pipeline(metrics.timed_records(source, records), stages, sinks_for_mid, tagged=tagged)
+		metrics.stage(source).count(bytes_read=file_size(infile) if tagged is False else 0)
+except (IOError, RuntimeError) as err:
+	print('[ERROR]: %s' % err)
+	sys.exit(2)
+finally:
+	for sink in split_sinks.values():
+		sink.close()
+
+if cache is not None and reused is None:
+	if split_sinks:
+		cache.store('split', split_key, [sink.outfile for sink in split_sinks.values()], {	'mid_counts': list(mid_counts.items()),
+					'readsets': [(mid, sink.outfile) for mid, sink in split_sinks.items()] })
+	fastq_sinks = [(mid, sink) for mid in sinks for sink in sinks[mid] if isinstance(sink, FastqSink)]
+	cache.store('readsets', readsets_key, [sink.outfile for mid, sink in fastq_sinks], {	'mid_counts': list(mid_counts.items()),
+				'primers_count': [(mid, list(counts.items())) for mid, counts in primers_count.items()],
+				'written': [(mid, sink.count) for mid, sink in fastq_sinks] })
+
+for mid in (mid_list if mid_list is not None else []):
+	print('[INFO]: Sequences with MID %d: %d' % (mid, mid_counts.get(mid, 0)))
+for mid in (mid_list if mid_list is not None else [None]):
+	for key, value in primers_count.get(mid, {}).items():
+		print('[INFO]: "%s" removed from %d sequences in %s' % (key, value, readset_name(mid) + '.fq'))
+for mid in (mid_list if mid_list is not None else [None]):
+	if reused is not None and mid in written:
+		print('[INFO]: %d sequences written to "%s"' % (written[mid], readset_name(mid) + '.fq'))
+	if mid not in sinks:
+		if perform_qa is True and (graph_list is None or mid in graph_list):
+			print('[WARNING]: No sequences left in "%s.fq", QA graphs not created' % readset_name(mid))
+		continue
+	for sink in sinks[mid]:
+		if isinstance(sink, FastqSink):
+			print('[INFO]: %d sequences written to "%s"' % (sink.count, sink.outfile))
+			metrics.stage('write_fastq').count(records_out=sink.count, bytes_written=file_size(sink.outfile))
+			continue
+		with metrics.stage('qa') as stage:
+			if sink.plot(r_path) != 0:
+				sink.discard()
+		stage.count(sink.count, bytes_written=file_size(sink.graphfile))
+
+if metrics_file is not None:
+	metrics.write_json(metrics_file)
+	print('[INFO]: Metrics written to "%s"' % metrics_file)
+if profile is True:
+	metrics.profiler.write(outprefix)
+	print('[INFO]: Stage profiles written to "%s.<stage>.pstats" and "%s.<stage>.folded"' % (outprefix, outprefix))